@@ -0,0 +1,33 @@
+import asyncio
+
+from aiogram.types import Message
+
+
+ALBUM_WAIT = 0.5
+
+
+class AlbumBuffer:
+    def __init__(self, wait: float = ALBUM_WAIT) -> None:
+        self.wait = wait
+        self._groups: dict[tuple[int, str], list[Message]] = {}
+
+    async def collect(self, message: Message) -> list[Message] | None:
+        if message.media_group_id is None:
+            return [message]
+        key = (message.chat.id, message.media_group_id)
+        group = self._groups.get(key)
+        if group is not None:
+            group.append(message)
+            return None
+
+        # The first message of an album waits until the rest stop arriving
+        # and then handles the whole group; later ones only join the list.
+        group = self._groups[key] = [message]
+        try:
+            seen = 0
+            while seen != len(group):
+                seen = len(group)
+                await asyncio.sleep(self.wait)
+        finally:
+            self._groups.pop(key, None)
+        return sorted(group, key=lambda item: item.message_id)
@@ -0,0 +1,113 @@
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any
+
+from aiogram.dispatcher.event.handler import CallableObject
+from aiogram.filters import Filter
+from aiogram.filters.callback_data import CallbackData
+from aiogram.fsm.state import State
+from aiogram.types import CallbackQuery
+
+
+class RequestCb(CallbackData, prefix="req"):
+    action: str
+    request_id: int
+
+
+class ResponseCb(CallbackData, prefix="resp"):
+    action: str
+    target_id: int
+
+
+class SupplierCb(CallbackData, prefix="sup"):
+    action: str
+    request_id: int
+
+
+class CarouselCb(CallbackData, prefix="car"):
+    view: str
+    context: int
+    index: int
+
+
+class MediaCb(CallbackData, prefix="media"):
+    kind: str
+    item_id: int
+
+
+class AdminCb(CallbackData, prefix="admin"):
+    action: str
+    value: str
+
+
+@dataclass
+class _Route:
+    target: CallableObject
+    factory: type[CallbackData] | None
+    state: str | None
+
+
+class CallbackTable(Filter):
+    def __init__(self) -> None:
+        self._exact: dict[str, _Route] = {}
+        self._parsed: dict[str, _Route] = {}
+
+    def _add(self, table: dict[str, _Route], key: str, route: _Route) -> None:
+        if key in table:
+            raise RuntimeError(f"Callback {key!r} is already routed")
+        table[key] = route
+
+    def exact(self, *values: str, state: State | None = None) -> Callable:
+        def decorator(handler: Callable) -> Callable:
+            route = _Route(CallableObject(handler), None, state.state if state else None)
+            for value in values:
+                self._add(self._exact, value, route)
+            return handler
+
+        return decorator
+
+    def data(
+        self,
+        factory: type[CallbackData],
+        action: str | None = None,
+        state: State | None = None,
+    ) -> Callable:
+        # Factories with an action field are keyed by "prefix:action", others by prefix.
+        key = f"{factory.__prefix__}:{action}" if action else factory.__prefix__
+
+        def decorator(handler: Callable) -> Callable:
+            route = _Route(CallableObject(handler), factory, state.state if state else None)
+            self._add(self._parsed, key, route)
+            return handler
+
+        return decorator
+
+    def resolve(self, data: str) -> tuple[_Route, CallbackData | None] | None:
+        route = self._exact.get(data)
+        if route is not None:
+            return route, None
+        prefix, _, rest = data.partition(":")
+        route = self._parsed.get(f"{prefix}:{rest.partition(':')[0]}") or self._parsed.get(prefix)
+        if route is None:
+            return None
+        try:
+            return route, route.factory.unpack(data)
+        except (TypeError, ValueError):
+            return None
+
+    async def __call__(self, callback: CallbackQuery, raw_state: str | None = None) -> bool | dict[str, Any]:
+        if not callback.data:
+            return False
+        resolved = self.resolve(callback.data)
+        if resolved is None:
+            return False
+        route, callback_data = resolved
+        if route.state is not None and route.state != raw_state:
+            return False
+        return {"callback_target": route.target, "callback_data": callback_data}
+
+
+def handler_name(data: dict[str, Any]) -> str:
+    # Callback queries go through one table dispatcher; name the routed handler instead.
+    handler_object = data.get("callback_target") or data.get("handler")
+    return getattr(getattr(handler_object, "callback", None), "__name__", "?")
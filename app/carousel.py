@@ -0,0 +1,302 @@
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import InlineKeyboardMarkup, InputMediaDocument, InputMediaPhoto, Message
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import db, keyboards
+from app.callbacks import MediaCb
+from app.models import SupplierResponse, SupplyRequest, User
+from app.services import fits_caption, request_text_view, response_text_view, unpack_media
+
+
+VIEW_MY_REQUESTS = "mr"
+VIEW_RESPONSES = "rs"
+VIEW_RESPONSES_BY_PRICE = "rp"
+VIEW_RESPONSES_BY_ETA = "re"
+VIEW_OPEN_REQUESTS = "op"
+VIEW_NEW_REQUESTS = "nw"
+VIEW_MY_RESPONSES = "ms"
+
+PREFETCH_RADIUS = 1
+
+RESPONSE_VIEWS = (VIEW_RESPONSES, VIEW_RESPONSES_BY_PRICE, VIEW_RESPONSES_BY_ETA)
+RESPONSE_SORTS = (
+    (VIEW_RESPONSES, "Новые"),
+    (VIEW_RESPONSES_BY_PRICE, "Дешевле"),
+    (VIEW_RESPONSES_BY_ETA, "Быстрее"),
+)
+FEED_VIEWS = (VIEW_NEW_REQUESTS, VIEW_OPEN_REQUESTS)
+FEED_SORTS = ((VIEW_NEW_REQUESTS, "Новые"), (VIEW_OPEN_REQUESTS, "Все"))
+# Sorted views walk the (request_id, price_value) / (request_id, eta_days) indexes;
+# responses without a parsed value go last.
+_RESPONSE_ORDER = {
+    VIEW_RESPONSES: (SupplierResponse.id.desc(),),
+    VIEW_RESPONSES_BY_PRICE: (SupplierResponse.price_value.asc().nulls_last(), SupplierResponse.id),
+    VIEW_RESPONSES_BY_ETA: (SupplierResponse.eta_days.asc().nulls_last(), SupplierResponse.id),
+}
+
+
+@dataclass
+class CarouselItem:
+    text: str
+    media_items: list[dict]
+    item_kb: InlineKeyboardMarkup | None = None
+    media_callback: str | None = None
+
+
+@dataclass
+class CarouselView:
+    view: str
+    context: int
+    item_ids: list[int]
+    items: dict[int, CarouselItem] = field(default_factory=dict)
+
+
+class CarouselStore:
+    def __init__(self, maxsize: int = 10000) -> None:
+        self.maxsize = maxsize
+        self._views: OrderedDict[int, CarouselView] = OrderedDict()
+
+    def get(self, tg_id: int, view: str, context: int) -> CarouselView | None:
+        current = self._views.get(tg_id)
+        if current is None or current.view != view or current.context != context:
+            return None
+        self._views.move_to_end(tg_id)
+        return current
+
+    def set(self, tg_id: int, current: CarouselView) -> None:
+        self._views[tg_id] = current
+        self._views.move_to_end(tg_id)
+        while len(self._views) > self.maxsize:
+            self._views.popitem(last=False)
+
+    def drop(self, tg_id: int) -> None:
+        self._views.pop(tg_id, None)
+
+
+_MISSING_ITEM = CarouselItem(text="Запись больше недоступна.", media_items=[])
+
+
+async def _item_ids(session: AsyncSession, user: User, view: str, context: int) -> list[int]:
+    if view == VIEW_MY_REQUESTS:
+        stmt = (
+            select(SupplyRequest.id)
+            .where(SupplyRequest.consumer_id == user.id, SupplyRequest.status == "open")
+            .order_by(SupplyRequest.id.desc())
+        )
+    elif view in RESPONSE_VIEWS:
+        req = await session.get(SupplyRequest, context)
+        if not req or req.consumer_id != user.id:
+            return []
+        stmt = (
+            select(SupplierResponse.id)
+            .where(SupplierResponse.request_id == context)
+            .order_by(*_RESPONSE_ORDER[view])
+        )
+    elif view == VIEW_OPEN_REQUESTS:
+        if user.role != "supplier":
+            return []
+        stmt = (
+            select(SupplyRequest.id)
+            .where(SupplyRequest.status == "open")
+            .order_by(SupplyRequest.id.desc())
+        )
+    elif view == VIEW_NEW_REQUESTS:
+        if user.role != "supplier":
+            return []
+        seen = db.get_write_buffer().seen_requests(user)
+        stmt = (
+            select(SupplyRequest.id)
+            .where(SupplyRequest.status == "open", SupplyRequest.id > seen.watermark)
+            .order_by(SupplyRequest.id.desc())
+        )
+        ids = (await session.execute(stmt)).scalars().all()
+        return [item_id for item_id in ids if item_id not in seen]
+    elif view == VIEW_MY_RESPONSES:
+        stmt = (
+            select(SupplierResponse.id)
+            .where(SupplierResponse.supplier_id == user.id)
+            .order_by(SupplierResponse.id.desc())
+        )
+    else:
+        return []
+    return list((await session.execute(stmt)).scalars().all())
+
+
+async def _load_items(
+    session: AsyncSession,
+    view: str,
+    context: int,
+    ids: list[int],
+) -> dict[int, CarouselItem]:
+    items: dict[int, CarouselItem] = {}
+    if view in (VIEW_MY_REQUESTS, *FEED_VIEWS):
+        stmt = select(SupplyRequest).where(SupplyRequest.id.in_(ids))
+        for req in (await session.execute(stmt)).scalars():
+            item_kb = (
+                keyboards.my_request_item_kb(req.id)
+                if view == VIEW_MY_REQUESTS
+                else keyboards.supplier_request_kb(req.id)
+            )
+            items[req.id] = CarouselItem(
+                text=request_text_view(req),
+                media_items=unpack_media(req.photos_json),
+                item_kb=item_kb,
+                media_callback=MediaCb(kind="req", item_id=req.id).pack(),
+            )
+    elif view in RESPONSE_VIEWS:
+        stmt = select(SupplierResponse).where(SupplierResponse.id.in_(ids))
+        for resp in (await session.execute(stmt)).scalars():
+            items[resp.id] = CarouselItem(
+                text=response_text_view(resp),
+                media_items=unpack_media(resp.photos_json),
+                item_kb=keyboards.response_item_kb(resp.id, context),
+                media_callback=MediaCb(kind="resp", item_id=resp.id).pack(),
+            )
+    elif view == VIEW_MY_RESPONSES:
+        stmt = (
+            select(SupplierResponse, SupplyRequest)
+            .outerjoin(SupplyRequest, SupplyRequest.id == SupplierResponse.request_id)
+            .where(SupplierResponse.id.in_(ids))
+        )
+        for resp, req in (await session.execute(stmt)).all():
+            req_part = request_text_view(req) if req else "Заявка не найдена"
+            items[resp.id] = CarouselItem(
+                text=f"{req_part}\n\n{response_text_view(resp)}",
+                media_items=unpack_media(resp.photos_json),
+                media_callback=MediaCb(kind="resp", item_id=resp.id).pack(),
+            )
+    return items
+
+
+async def prefetch(session: AsyncSession, current: CarouselView, index: int) -> None:
+    total = len(current.item_ids)
+    window = {
+        current.item_ids[(index + offset) % total]
+        for offset in range(-PREFETCH_RADIUS, PREFETCH_RADIUS + 1)
+    }
+    missing = [item_id for item_id in window if item_id not in current.items]
+    if missing:
+        loaded = await _load_items(session, current.view, current.context, missing)
+        for item_id in missing:
+            current.items[item_id] = loaded.get(item_id, _MISSING_ITEM)
+    for item_id in list(current.items):
+        if item_id not in window:
+            current.items.pop(item_id)
+
+
+async def build_view(
+    session: AsyncSession,
+    store: CarouselStore,
+    user: User,
+    view: str,
+    context: int = 0,
+) -> CarouselView | None:
+    ids = await _item_ids(session, user, view, context)
+    if not ids:
+        store.drop(user.tg_id)
+        return None
+    current = CarouselView(view=view, context=context, item_ids=ids)
+    await prefetch(session, current, 0)
+    store.set(user.tg_id, current)
+    return current
+
+
+def _render(
+    current: CarouselView,
+    index: int,
+    with_exit: bool,
+) -> tuple[CarouselItem, dict | None, InlineKeyboardMarkup]:
+    item = current.items.get(current.item_ids[index], _MISSING_ITEM)
+    media = item.media_items[0] if item.media_items and fits_caption(item.text) else None
+    shows_all_media = bool(item.media_items) and (len(item.media_items) > 1 or media is None)
+    total = len(current.item_ids)
+    sort_row = None
+    if current.view in RESPONSE_VIEWS and total > 1:
+        sort_row = keyboards.sort_row(RESPONSE_SORTS, current.view, current.context)
+    elif current.view in FEED_VIEWS:
+        sort_row = keyboards.sort_row(FEED_SORTS, current.view, current.context)
+    reply_markup = keyboards.carousel_kb(
+        item.item_kb,
+        current.view,
+        current.context,
+        index,
+        total,
+        media_callback=item.media_callback if shows_all_media else None,
+        media_count=len(item.media_items),
+        with_exit=with_exit,
+        sort_row=sort_row,
+    )
+    return item, media, reply_markup
+
+
+def _input_media(media: dict, caption: str) -> InputMediaPhoto | InputMediaDocument:
+    if media.get("type") == "document":
+        return InputMediaDocument(media=media["file_id"], caption=caption)
+    return InputMediaPhoto(media=media["file_id"], caption=caption)
+
+
+async def _send(
+    bot: Bot,
+    chat_id: int,
+    item: CarouselItem,
+    media: dict | None,
+    reply_markup: InlineKeyboardMarkup,
+) -> None:
+    if media is None:
+        await bot.send_message(chat_id=chat_id, text=item.text, reply_markup=reply_markup)
+    elif media.get("type") == "document":
+        await bot.send_document(
+            chat_id=chat_id, document=media["file_id"], caption=item.text, reply_markup=reply_markup
+        )
+    else:
+        await bot.send_photo(
+            chat_id=chat_id, photo=media["file_id"], caption=item.text, reply_markup=reply_markup
+        )
+
+
+async def send_view(
+    bot: Bot,
+    chat_id: int,
+    current: CarouselView,
+    index: int = 0,
+    with_exit: bool = True,
+) -> None:
+    item, media, reply_markup = _render(current, index, with_exit)
+    await _send(bot, chat_id, item, media, reply_markup)
+
+
+async def edit_view(
+    bot: Bot,
+    message: Message,
+    current: CarouselView,
+    index: int,
+    with_exit: bool = True,
+) -> None:
+    item, media, reply_markup = _render(current, index, with_exit)
+    shows_media = bool(message.photo or message.document)
+    try:
+        if media is not None and shows_media:
+            await bot.edit_message_media(
+                chat_id=message.chat.id,
+                message_id=message.message_id,
+                media=_input_media(media, item.text),
+                reply_markup=reply_markup,
+            )
+        elif media is None and not shows_media:
+            await bot.edit_message_text(
+                chat_id=message.chat.id,
+                message_id=message.message_id,
+                text=item.text,
+                reply_markup=reply_markup,
+            )
+        else:
+            await bot.delete_message(chat_id=message.chat.id, message_id=message.message_id)
+            await _send(bot, message.chat.id, item, media, reply_markup)
+    except TelegramBadRequest as exc:
+        if "message is not modified" not in str(exc):
+            raise
@@ -0,0 +1,39 @@
+import json
+from collections.abc import Callable
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+loads: Callable[[str | bytes], Any]
+dumps: Callable[[Any], str]
+
+if orjson is not None:
+    BACKEND = "orjson"
+    loads = orjson.loads
+
+    def dumps(obj: Any) -> str:
+        return orjson.dumps(obj).decode()
+
+elif msgspec is not None:
+    BACKEND = "msgspec"
+    _encoder = msgspec.json.Encoder()
+    loads = msgspec.json.Decoder().decode
+
+    def dumps(obj: Any) -> str:
+        return _encoder.encode(obj).decode()
+
+else:
+    BACKEND = "json"
+    loads = json.loads
+
+    def dumps(obj: Any) -> str:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
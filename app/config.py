@@ -4,11 +4,88 @@ import os
 from dotenv import load_dotenv
 
 
+DEFAULT_DATABASE_URL = "sqlite+aiosqlite:///./data/bot.db"
+DEFAULT_RATE_LIMIT_ACTIONS = (
+    "menu:open_req=2/10,menu:my_req=2/10,menu:my_resp=2/10,"
+    "req:preview:confirm=1/5,sup:preview:confirm=1/5,admin:stats=2/10"
+)
+
+
 @dataclass
 class Settings:
     bot_token: str
     admin_ids: set[int]
     database_url: str
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_timeout: int = 30
+    db_pool_pre_ping: bool = True
+    db_statement_cache_size: int = 500
+    outbox_workers: int = 1
+    outbox_batch_size: int = 50
+    outbox_max_attempts: int = 5
+    outbox_retention_days: int = 7
+    event_queue_size: int = 1000
+    event_workers: int = 4
+    response_debounce_seconds: float = 10.0
+    response_debounce_max_seconds: float = 60.0
+    profiling_enabled: bool = False
+    slow_handler_ms: int = 500
+    loop_lag_ms: int = 100
+    profile_seconds: int = 30
+    shutdown_timeout: int = 25
+    state_path: str = "./data/state.json"
+    rate_limit_user_rate: float = 2.0
+    rate_limit_user_burst: int = 20
+    rate_limit_global_rate: float = 100.0
+    rate_limit_global_burst: int = 200
+    rate_limit_actions: str = DEFAULT_RATE_LIMIT_ACTIONS
+    send_rate: float = 25.0
+    send_burst: int = 30
+    record_updates_path: str = ""
+    bot_api_pool_size: int = 100
+    bot_api_keepalive: float = 30.0
+    bot_api_dns_ttl: int = 3600
+    bot_api_timeout: float = 60.0
+    bot_api_url: str = ""
+    bot_api_local: bool = False
+    snapshot_path: str = ""
+    snapshot_interval: int = 300
+    trace_path: str = ""
+    trace_sample_rate: float = 0.01
+    trace_slow_ms: int = 0
+
+
+def _env_int(name: str, default: int) -> int:
+    raw = os.getenv(name, "").strip()
+    if not raw:
+        return default
+    try:
+        return int(raw)
+    except ValueError as exc:
+        raise RuntimeError(f"{name} must be an integer") from exc
+
+
+def _env_float(name: str, default: float) -> float:
+    raw = os.getenv(name, "").strip()
+    if not raw:
+        return default
+    try:
+        return float(raw)
+    except ValueError as exc:
+        raise RuntimeError(f"{name} must be a number") from exc
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    raw = os.getenv(name, "").strip().lower()
+    if not raw:
+        return default
+    return raw in {"1", "true", "yes", "on"}
+
+
+def load_database_url() -> str:
+    load_dotenv()
+    return os.getenv("DATABASE_URL", DEFAULT_DATABASE_URL)
 
 
 def load_settings() -> Settings:
@@ -25,5 +102,47 @@ def load_settings() -> Settings:
         if value.isdigit():
             admin_ids.add(int(value))
 
-    database_url = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./data/bot.db")
-    return Settings(bot_token=token, admin_ids=admin_ids, database_url=database_url)
+    database_url = load_database_url()
+    return Settings(
+        bot_token=token,
+        admin_ids=admin_ids,
+        database_url=database_url,
+        db_pool_size=_env_int("DB_POOL_SIZE", 10),
+        db_max_overflow=_env_int("DB_MAX_OVERFLOW", 20),
+        db_pool_timeout=_env_int("DB_POOL_TIMEOUT", 30),
+        db_pool_pre_ping=_env_bool("DB_POOL_PRE_PING", True),
+        db_statement_cache_size=_env_int("DB_STATEMENT_CACHE_SIZE", 500),
+        outbox_workers=_env_int("OUTBOX_WORKERS", 1),
+        outbox_batch_size=_env_int("OUTBOX_BATCH_SIZE", 50),
+        outbox_max_attempts=_env_int("OUTBOX_MAX_ATTEMPTS", 5),
+        outbox_retention_days=_env_int("OUTBOX_RETENTION_DAYS", 7),
+        event_queue_size=_env_int("EVENT_QUEUE_SIZE", 1000),
+        event_workers=_env_int("EVENT_WORKERS", 4),
+        response_debounce_seconds=_env_float("RESPONSE_DEBOUNCE_SECONDS", 10.0),
+        response_debounce_max_seconds=_env_float("RESPONSE_DEBOUNCE_MAX_SECONDS", 60.0),
+        profiling_enabled=_env_bool("PROFILING_ENABLED", False),
+        slow_handler_ms=_env_int("SLOW_HANDLER_MS", 500),
+        loop_lag_ms=_env_int("LOOP_LAG_MS", 100),
+        profile_seconds=_env_int("PROFILE_SECONDS", 30),
+        shutdown_timeout=_env_int("SHUTDOWN_TIMEOUT", 25),
+        state_path=os.getenv("STATE_PATH", "./data/state.json"),
+        rate_limit_user_rate=_env_float("RATE_LIMIT_USER_RATE", 2.0),
+        rate_limit_user_burst=_env_int("RATE_LIMIT_USER_BURST", 20),
+        rate_limit_global_rate=_env_float("RATE_LIMIT_GLOBAL_RATE", 100.0),
+        rate_limit_global_burst=_env_int("RATE_LIMIT_GLOBAL_BURST", 200),
+        rate_limit_actions=os.getenv("RATE_LIMIT_ACTIONS", DEFAULT_RATE_LIMIT_ACTIONS),
+        send_rate=_env_float("SEND_RATE", 25.0),
+        send_burst=_env_int("SEND_BURST", 30),
+        record_updates_path=os.getenv("RECORD_UPDATES_PATH", "").strip(),
+        bot_api_pool_size=_env_int("BOT_API_POOL_SIZE", 100),
+        bot_api_keepalive=_env_float("BOT_API_KEEPALIVE", 30.0),
+        bot_api_dns_ttl=_env_int("BOT_API_DNS_TTL", 3600),
+        bot_api_timeout=_env_float("BOT_API_TIMEOUT", 60.0),
+        bot_api_url=os.getenv("BOT_API_URL", "").strip(),
+        bot_api_local=_env_bool("BOT_API_LOCAL", False),
+        snapshot_path=os.getenv("SNAPSHOT_PATH", "").strip(),
+        snapshot_interval=_env_int("SNAPSHOT_INTERVAL", 300),
+        trace_path=os.getenv("TRACE_PATH", "").strip(),
+        trace_sample_rate=_env_float("TRACE_SAMPLE_RATE", 0.01),
+        trace_slow_ms=_env_int("TRACE_SLOW_MS", 0),
+    )
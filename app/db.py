@@ -1,26 +1,95 @@
 from collections.abc import AsyncGenerator
 
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 
-from app.models import Base
+from app import migrations
+from app.writebehind import WriteBehindBuffer
 
 
 engine = None
 session_factory: async_sessionmaker[AsyncSession] | None = None
+write_buffer: WriteBehindBuffer | None = None
 
 
-def init_db(database_url: str) -> None:
-    global engine, session_factory
-    engine = create_async_engine(database_url, future=True)
+def is_postgres(database_url: str) -> bool:
+    return database_url.startswith("postgresql")
+
+
+def _sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
+
+def make_engine(
+    database_url: str,
+    pool_size: int = 10,
+    max_overflow: int = 20,
+    pool_timeout: int = 30,
+    pool_pre_ping: bool = True,
+    statement_cache_size: int = 500,
+) -> AsyncEngine:
+    if is_postgres(database_url):
+        return create_async_engine(
+            database_url,
+            future=True,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=pool_timeout,
+            pool_pre_ping=pool_pre_ping,
+            connect_args={
+                "statement_cache_size": statement_cache_size,
+                "prepared_statement_cache_size": statement_cache_size,
+            },
+        )
+
+    new_engine = create_async_engine(database_url, future=True)
+    if database_url.startswith("sqlite"):
+        event.listen(new_engine.sync_engine, "connect", _sqlite_pragmas)
+    return new_engine
+
+
+def init_db(
+    database_url: str,
+    pool_size: int = 10,
+    max_overflow: int = 20,
+    pool_timeout: int = 30,
+    pool_pre_ping: bool = True,
+    statement_cache_size: int = 500,
+) -> None:
+    global engine, session_factory, write_buffer
+    engine = make_engine(
+        database_url,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        pool_pre_ping=pool_pre_ping,
+        statement_cache_size=statement_cache_size,
+    )
     session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    write_buffer = WriteBehindBuffer(session_factory)
 
 
-async def create_tables() -> None:
+async def check_schema() -> None:
     if engine is None:
         raise RuntimeError("Database engine is not initialized.")
 
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    async with engine.connect() as conn:
+        version = await conn.run_sync(migrations.current_version)
+    if version < migrations.LATEST_VERSION:
+        raise RuntimeError(
+            f"Database schema is at version {version}, expected {migrations.LATEST_VERSION}. "
+            "Run `python -m app.migrations` first."
+        )
+
+
+def get_write_buffer() -> WriteBehindBuffer:
+    if write_buffer is None:
+        raise RuntimeError("Write-behind buffer is not initialized.")
+    return write_buffer
 
 
 async def get_session() -> AsyncGenerator[AsyncSession, None]:
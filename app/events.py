@@ -0,0 +1,100 @@
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from typing import Any
+
+
+logger = logging.getLogger(__name__)
+
+EVENT_QUEUE_SIZE = 1000
+
+
+@dataclass(frozen=True)
+class RequestCreated:
+    request_id: int
+
+
+@dataclass(frozen=True)
+class ResponseCreated:
+    request_id: int
+    response_id: int
+
+
+@dataclass(frozen=True)
+class RequestClosed:
+    request_id: int
+
+
+@dataclass(frozen=True)
+class ResponseSelected:
+    request_id: int
+    response_id: int
+
+
+Subscriber = Callable[[Any], Awaitable[None]]
+
+
+@dataclass
+class _Subscription:
+    name: str
+    handler: Subscriber
+    queue: asyncio.Queue
+    workers: int
+
+
+class EventBus:
+    def __init__(self, queue_size: int = EVENT_QUEUE_SIZE) -> None:
+        self.queue_size = queue_size
+        self._subscriptions: dict[type, list[_Subscription]] = {}
+
+    def subscribe(self, event_type: type, handler: Subscriber, workers: int = 1) -> None:
+        subscription = _Subscription(
+            name=getattr(getattr(handler, "func", handler), "__name__", repr(handler)),
+            handler=handler,
+            queue=asyncio.Queue(maxsize=self.queue_size),
+            workers=max(1, workers),
+        )
+        self._subscriptions.setdefault(event_type, []).append(subscription)
+
+    @property
+    def pending(self) -> int:
+        return sum(
+            item.queue.qsize() for items in self._subscriptions.values() for item in items
+        )
+
+    async def publish(self, event: Any) -> None:
+        # A full queue makes the publisher wait, so a slow subscriber throttles
+        # writers instead of growing memory without bound.
+        for subscription in self._subscriptions.get(type(event), ()):
+            await subscription.queue.put(event)
+
+    async def _consume(self, subscription: _Subscription) -> None:
+        while True:
+            event = await subscription.queue.get()
+            try:
+                await subscription.handler(event)
+            except Exception:
+                logger.exception("Event subscriber %s failed on %r", subscription.name, event)
+            finally:
+                subscription.queue.task_done()
+
+    async def run(self) -> None:
+        await asyncio.gather(
+            *(
+                self._consume(subscription)
+                for items in self._subscriptions.values()
+                for subscription in items
+                for _ in range(subscription.workers)
+            )
+        )
+
+    async def drain(self, timeout: float) -> bool:
+        queues = [item.queue for items in self._subscriptions.values() for item in items]
+        if not queues:
+            return True
+        try:
+            await asyncio.wait_for(asyncio.gather(*(queue.join() for queue in queues)), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
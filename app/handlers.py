@@ -1,30 +1,60 @@
 from __future__ import annotations
 
+from datetime import datetime
+from typing import TYPE_CHECKING
+from uuid import uuid4
+
 from aiogram import F, Router
+from aiogram.dispatcher.event.handler import CallableObject
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
-from aiogram.types import CallbackQuery, Message
+from aiogram.types import BufferedInputFile, CallbackQuery, InlineQuery, Message
 from sqlalchemy import func, select
-
-from app import db, keyboards
+from sqlalchemy.exc import IntegrityError
+
+from app import carousel, db, keyboards
+from app.albums import AlbumBuffer
+from app.callbacks import AdminCb, CallbackTable, CarouselCb, MediaCb, RequestCb, ResponseCb, SupplierCb
+from app.carousel import CarouselStore
+from app.events import EventBus, RequestClosed, RequestCreated, ResponseCreated, ResponseSelected
+from app.inline import (
+    INLINE_CACHE_TTL,
+    InlineResultCache,
+    build_page,
+    normalize_query,
+    search_open_requests,
+)
 from app.models import SupplierResponse, SupplyRequest, User
+from app.parsing import PRICE_TBD, parse_eta_days, parse_price
 from app.services import (
     ProcessGate,
+    draft_idempotency_key,
+    enqueue_outbox,
     flush_user_queue,
     get_or_create_user,
+    has_responded,
     normalize_phone,
-    notify_consumer_about_response,
-    notify_supplier_about_request,
     pack_media,
-    request_text_view,
+    reachable_users,
     response_text_view,
     send_media_and_text,
+    send_media_group,
     unpack_media,
     user_contact_view,
 )
 from app.states import AdminState, ConsumerRequestState, RegistrationState, SupplierResponseState
 
+if TYPE_CHECKING:
+    from app.profiling import Profiler
+    from app.snapshots import SqliteSnapshotter
+
 router = Router()
+callbacks = CallbackTable()
+
+
+@router.callback_query(callbacks)
+async def dispatch_callback(callback: CallbackQuery, callback_target: CallableObject, **data) -> None:
+    await callback_target.call(callback, **data)
 
 
 def _sf():
@@ -33,6 +63,39 @@ def _sf():
     return db.session_factory
 
 
+def _mark_feed_seen(tg_id: int, view: carousel.CarouselView, index: int) -> None:
+    if view.view in carousel.FEED_VIEWS:
+        db.get_write_buffer().mark_seen(tg_id, [view.item_ids[index]])
+
+
+def media_item(message: Message) -> dict:
+    if message.photo:
+        return {"type": "photo", "file_id": message.photo[-1].file_id}
+    return {"type": "document", "file_id": message.document.file_id}
+
+
+async def add_draft_media(
+    message: Message,
+    state: FSMContext,
+    albums: AlbumBuffer,
+    key: str,
+    done_callback: str,
+) -> None:
+    messages = await albums.collect(message)
+    if messages is None:
+        return
+    new_items = [media_item(item) for item in messages]
+    data = await state.get_data()
+    await state.update_data({key: data.get(key, []) + new_items})
+    if len(new_items) > 1:
+        text = f"Добавлено вложений: {len(new_items)}. Можно отправить еще или нажать Готово."
+    elif new_items[0]["type"] == "photo":
+        text = "Фото добавлено. Можно отправить еще или нажать Готово."
+    else:
+        text = "Файл добавлен. Можно отправить еще или нажать Готово."
+    await message.answer(text, reply_markup=keyboards.done_kb(done_callback))
+
+
 async def send_main_menu(message: Message, user: User) -> None:
     await message.answer("Меню:", reply_markup=keyboards.menu_kb(user.role))
 
@@ -96,14 +159,14 @@ async def reg_phone_input(message: Message, state: FSMContext) -> None:
     )
 
 
-@router.callback_query(F.data == "reg:edit")
+@callbacks.exact("reg:edit")
 async def reg_edit(callback: CallbackQuery, state: FSMContext) -> None:
     await callback.answer()
     await state.set_state(RegistrationState.waiting_phone)
     await callback.message.answer("Введите номер телефона еще раз.")
 
 
-@router.callback_query(F.data == "reg:confirm")
+@callbacks.exact("reg:confirm")
 async def reg_confirm(callback: CallbackQuery, state: FSMContext) -> None:
     await callback.answer()
     data = await state.get_data()
@@ -125,7 +188,7 @@ async def reg_confirm(callback: CallbackQuery, state: FSMContext) -> None:
     await state.clear()
 
 
-@router.callback_query(F.data == "menu:refresh")
+@callbacks.exact("menu:refresh")
 async def menu_refresh(callback: CallbackQuery) -> None:
     await callback.answer()
     async with _sf()() as session:
@@ -134,7 +197,7 @@ async def menu_refresh(callback: CallbackQuery) -> None:
             await send_main_menu_cb(callback, user)
 
 
-@router.callback_query(F.data == "menu:create_req")
+@callbacks.exact("menu:create_req")
 async def menu_create_request(callback: CallbackQuery, state: FSMContext, gate: ProcessGate) -> None:
     await callback.answer()
     async with _sf()() as session:
@@ -146,7 +209,7 @@ async def menu_create_request(callback: CallbackQuery, state: FSMContext, gate:
     await gate.set_busy(callback.from_user.id, "consumer_create_request", 300)
     await state.clear()
     await state.set_state(ConsumerRequestState.waiting_text)
-    await state.update_data(request_photos=[])
+    await state.update_data(request_photos=[], draft_id=uuid4().hex)
     await callback.message.answer("Что нужно вам? Введите текст заявки.")
 
 
@@ -164,31 +227,12 @@ async def consumer_request_text(message: Message, state: FSMContext) -> None:
     )
 
 
-@router.message(ConsumerRequestState.waiting_photos, F.photo)
-async def consumer_request_add_photo(message: Message, state: FSMContext) -> None:
-    data = await state.get_data()
-    items = data.get("request_photos", [])
-    items.append({"type": "photo", "file_id": message.photo[-1].file_id})
-    await state.update_data(request_photos=items)
-    await message.answer(
-        "Фото добавлено. Можно отправить еще или нажать Готово.",
-        reply_markup=keyboards.done_kb("req:photos_done"),
-    )
-
-
-@router.message(ConsumerRequestState.waiting_photos, F.document)
-async def consumer_request_add_doc(message: Message, state: FSMContext) -> None:
-    data = await state.get_data()
-    items = data.get("request_photos", [])
-    items.append({"type": "document", "file_id": message.document.file_id})
-    await state.update_data(request_photos=items)
-    await message.answer(
-        "Файл добавлен. Можно отправить еще или нажать Готово.",
-        reply_markup=keyboards.done_kb("req:photos_done"),
-    )
+@router.message(ConsumerRequestState.waiting_photos, F.photo | F.document)
+async def consumer_request_add_media(message: Message, state: FSMContext, albums: AlbumBuffer) -> None:
+    await add_draft_media(message, state, albums, "request_photos", "req:photos_done")
 
 
-@router.callback_query(F.data == "req:photos_done")
+@callbacks.exact("req:photos_done")
 async def consumer_request_preview(callback: CallbackQuery, state: FSMContext) -> None:
     await callback.answer()
     data = await state.get_data()
@@ -210,7 +254,7 @@ async def consumer_request_preview(callback: CallbackQuery, state: FSMContext) -
     await state.set_state(ConsumerRequestState.preview)
 
 
-@router.callback_query(F.data == "req:preview:edit")
+@callbacks.exact("req:preview:edit")
 async def consumer_request_edit(callback: CallbackQuery, state: FSMContext) -> None:
     await callback.answer()
     await state.set_state(ConsumerRequestState.waiting_text)
@@ -218,7 +262,7 @@ async def consumer_request_edit(callback: CallbackQuery, state: FSMContext) -> N
     await callback.message.answer("Введите текст заявки заново.")
 
 
-@router.callback_query(F.data == "req:preview:cancel")
+@callbacks.exact("req:preview:cancel")
 async def consumer_request_cancel(callback: CallbackQuery, state: FSMContext, gate: ProcessGate) -> None:
     await callback.answer()
     await state.clear()
@@ -227,8 +271,10 @@ async def consumer_request_cancel(callback: CallbackQuery, state: FSMContext, ga
         await flush_user_queue(callback.bot, gate, session, callback.from_user.id)
 
 
-@router.callback_query(F.data == "req:preview:confirm")
-async def consumer_request_confirm(callback: CallbackQuery, state: FSMContext, gate: ProcessGate) -> None:
+@callbacks.exact("req:preview:confirm")
+async def consumer_request_confirm(
+    callback: CallbackQuery, state: FSMContext, gate: ProcessGate, events: EventBus
+) -> None:
     await callback.answer()
     data = await state.get_data()
     text = data.get("request_text")
@@ -238,34 +284,53 @@ async def consumer_request_confirm(callback: CallbackQuery, state: FSMContext, g
         await state.clear()
         return
 
+    idempotency_key = draft_idempotency_key(callback.from_user.id, data)
     async with _sf()() as session:
         user = await get_or_create_user(session, callback.from_user)
+        stmt = select(SupplyRequest.id).where(SupplyRequest.idempotency_key == idempotency_key)
+        if (await session.execute(stmt)).first():
+            await callback.message.answer("Эта заявка уже отправлена.")
+            await state.clear()
+            return
+
         request = SupplyRequest(
             consumer_id=user.id,
             text=text,
+            search_text=normalize_query(text),
             photos_json=pack_media(photos),
             status="open",
+            idempotency_key=idempotency_key,
         )
         session.add(request)
-        user.sent_requests_count += 1
-        await session.commit()
-        await session.refresh(request)
-
-        stmt = select(User).where(User.role == "supplier", User.is_registered == 1)
-        suppliers = (await session.execute(stmt)).scalars().all()
+        try:
+            await session.flush()
+            stmt = select(User.tg_id).where(
+                User.role == "supplier", User.is_registered == 1, reachable_users()
+            )
+            supplier_ids = (await session.execute(stmt)).scalars().all()
+            await enqueue_outbox(session, "new_request", supplier_ids, {"request_id": request.id})
+            await session.commit()
+        except IntegrityError:
+            await session.rollback()
+            await callback.message.answer("Эта заявка уже отправлена.")
+            await state.clear()
+            return
+        db.get_write_buffer().add_sent_requests(user.id)
+        await events.publish(RequestCreated(request.id))
 
         await callback.message.answer("Заявка отправлена.")
         await send_main_menu_cb(callback, user)
 
-        for supplier in suppliers:
-            await notify_supplier_about_request(callback.bot, gate, supplier.tg_id, request)
-
         await flush_user_queue(callback.bot, gate, session, callback.from_user.id)
     await state.clear()
 
 
-@router.callback_query(F.data == "menu:my_req")
-async def consumer_my_requests(callback: CallbackQuery, gate: ProcessGate) -> None:
+@callbacks.exact("menu:my_req")
+async def consumer_my_requests(
+    callback: CallbackQuery,
+    gate: ProcessGate,
+    carousels: CarouselStore,
+) -> None:
     await callback.answer()
 
     async with _sf()() as session:
@@ -274,61 +339,43 @@ async def consumer_my_requests(callback: CallbackQuery, gate: ProcessGate) -> No
             await callback.message.answer("Действие доступно только потребителю.")
             return
         await gate.set_busy(callback.from_user.id, "consumer_view_requests", 300)
-        stmt = (
-            select(SupplyRequest)
-            .where(SupplyRequest.consumer_id == user.id, SupplyRequest.status == "open")
-            .order_by(SupplyRequest.id.desc())
-        )
-        requests = (await session.execute(stmt)).scalars().all()
-        if not requests:
-            await callback.message.answer("Открытых заявок нет.")
-        for req in requests:
-            await send_media_and_text(
-                callback.bot,
-                callback.from_user.id,
-                request_text_view(req),
-                unpack_media(req.photos_json),
-                keyboards.my_request_item_kb(req.id),
-            )
+        view = await carousel.build_view(session, carousels, user, carousel.VIEW_MY_REQUESTS)
+    if view is None:
         await callback.message.answer(
-            "Вы просматриваете заявки. Нажмите Выйти для возврата в обычный режим.",
+            "Открытых заявок нет.",
             reply_markup=keyboards.exit_process_kb(),
         )
+        return
+    await carousel.send_view(callback.bot, callback.from_user.id, view)
 
 
-@router.callback_query(F.data.startswith("req:view:"))
-async def consumer_view_responses(callback: CallbackQuery) -> None:
+@callbacks.data(RequestCb, "view")
+async def consumer_view_responses(
+    callback: CallbackQuery, callback_data: RequestCb, carousels: CarouselStore
+) -> None:
     await callback.answer()
-    req_id = int(callback.data.split(":")[2])
+    req_id = callback_data.request_id
     async with _sf()() as session:
         user = await get_or_create_user(session, callback.from_user)
         req = await session.get(SupplyRequest, req_id)
         if not req or req.consumer_id != user.id:
             await callback.message.answer("Заявка не найдена.")
             return
-        stmt = (
-            select(SupplierResponse)
-            .where(SupplierResponse.request_id == req_id)
-            .order_by(SupplierResponse.id.desc())
+        view = await carousel.build_view(
+            session, carousels, user, carousel.VIEW_RESPONSES, req_id
         )
-        responses = (await session.execute(stmt)).scalars().all()
-        if not responses:
-            await callback.message.answer("Откликов пока нет.")
-            return
-        for resp in responses:
-            await send_media_and_text(
-                callback.bot,
-                callback.from_user.id,
-                response_text_view(resp),
-                unpack_media(resp.photos_json),
-                keyboards.response_item_kb(resp.id, req_id),
-            )
+    if view is None:
+        await callback.message.answer("Откликов пока нет.")
+        return
+    await carousel.send_view(callback.bot, callback.from_user.id, view, with_exit=False)
 
 
-@router.callback_query(F.data.startswith("req:close:"))
-async def consumer_close_request(callback: CallbackQuery) -> None:
+@callbacks.data(RequestCb, "close")
+async def consumer_close_request(
+    callback: CallbackQuery, callback_data: RequestCb, events: EventBus
+) -> None:
     await callback.answer()
-    req_id = int(callback.data.split(":")[2])
+    req_id = callback_data.request_id
     async with _sf()() as session:
         user = await get_or_create_user(session, callback.from_user)
         req = await session.get(SupplyRequest, req_id)
@@ -337,13 +384,16 @@ async def consumer_close_request(callback: CallbackQuery) -> None:
             return
         req.status = "closed"
         await session.commit()
-        await callback.message.answer("Заявка закрыта, прием откликов остановлен.")
+    await events.publish(RequestClosed(req_id))
+    await callback.message.answer("Заявка закрыта, прием откликов остановлен.")
 
 
-@router.callback_query(F.data.startswith("resp:stop:"))
-async def consumer_stop_responses(callback: CallbackQuery) -> None:
+@callbacks.data(ResponseCb, "stop")
+async def consumer_stop_responses(
+    callback: CallbackQuery, callback_data: ResponseCb, events: EventBus
+) -> None:
     await callback.answer()
-    req_id = int(callback.data.split(":")[2])
+    req_id = callback_data.target_id
     async with _sf()() as session:
         user = await get_or_create_user(session, callback.from_user)
         req = await session.get(SupplyRequest, req_id)
@@ -352,13 +402,16 @@ async def consumer_stop_responses(callback: CallbackQuery) -> None:
             return
         req.status = "closed"
         await session.commit()
-        await callback.message.answer("Заявка закрыта и удалена из приема откликов.")
+    await events.publish(RequestClosed(req_id))
+    await callback.message.answer("Заявка закрыта и удалена из приема откликов.")
 
 
-@router.callback_query(F.data.startswith("resp:contact:"))
-async def consumer_contact_supplier(callback: CallbackQuery) -> None:
+@callbacks.data(ResponseCb, "contact")
+async def consumer_contact_supplier(
+    callback: CallbackQuery, callback_data: ResponseCb, events: EventBus
+) -> None:
     await callback.answer()
-    response_id = int(callback.data.split(":")[2])
+    response_id = callback_data.target_id
     async with _sf()() as session:
         user = await get_or_create_user(session, callback.from_user)
         response = await session.get(SupplierResponse, response_id)
@@ -376,57 +429,52 @@ async def consumer_contact_supplier(callback: CallbackQuery) -> None:
 
         response.status = "selected"
         await session.commit()
-
         contact = user_contact_view(supplier)
-        await callback.message.answer(
-            f"Контакт поставщика:\n{contact}\n\nОтклик:\n{response_text_view(response)}"
-        )
-
-        consumer_contact = user_contact_view(user)
-        await callback.bot.send_message(
-            chat_id=supplier.tg_id,
-            text=(
-                "Ваш отклик выбрали!\n\n"
-                f"{request_text_view(req)}\n\n{response_text_view(response)}\n\n"
-                f"Контакт потребителя: {consumer_contact}"
-            ),
-        )
+        text = f"Контакт поставщика:\n{contact}\n\nОтклик:\n{response_text_view(response)}"
+    await events.publish(ResponseSelected(req.id, response_id))
+    await callback.message.answer(text)
 
 
-@router.callback_query(F.data == "menu:open_req")
-async def supplier_open_requests(callback: CallbackQuery, gate: ProcessGate) -> None:
+@callbacks.exact("menu:open_req")
+async def supplier_open_requests(
+    callback: CallbackQuery,
+    gate: ProcessGate,
+    carousels: CarouselStore,
+) -> None:
     await callback.answer()
     async with _sf()() as session:
         user = await get_or_create_user(session, callback.from_user)
         if user.role != "supplier":
             await callback.message.answer("Действие доступно только поставщику.")
             return
-        stmt = (
-            select(SupplyRequest)
-            .where(SupplyRequest.status == "open")
-            .order_by(SupplyRequest.id.desc())
-        )
-        requests = (await session.execute(stmt)).scalars().all()
-        if not requests:
+        view = await carousel.build_view(session, carousels, user, carousel.VIEW_NEW_REQUESTS)
+        if view is None:
+            stmt = select(func.count(), func.max(SupplyRequest.id)).where(SupplyRequest.status == "open")
+            open_count, last_id = (await session.execute(stmt)).one()
+    write_buffer = db.get_write_buffer()
+    if view is None:
+        if not open_count:
             await callback.message.answer("Открытых заявок нет.")
             return
-        await gate.set_busy(callback.from_user.id, "supplier_view_open", 600)
-        for req in requests:
-            await send_media_and_text(
-                callback.bot,
-                callback.from_user.id,
-                request_text_view(req),
-                unpack_media(req.photos_json),
-                keyboards.supplier_request_kb(req.id),
-            )
+        write_buffer.mark_seen(callback.from_user.id, up_to=last_id)
         await callback.message.answer(
-            "Вы просматриваете открытые заявки. Нажмите Выйти для возврата в режим приема.",
-            reply_markup=keyboards.exit_process_kb(),
+            "Новых заявок нет.",
+            reply_markup=keyboards.show_all_kb(carousel.VIEW_OPEN_REQUESTS, open_count),
         )
+        return
+    # Every open request older than the oldest unseen one has been seen already.
+    write_buffer.mark_seen(callback.from_user.id, up_to=view.item_ids[-1] - 1)
+    await gate.set_busy(callback.from_user.id, "supplier_view_open", 600)
+    await carousel.send_view(callback.bot, callback.from_user.id, view)
+    _mark_feed_seen(callback.from_user.id, view, 0)
 
 
-@router.callback_query(F.data == "menu:my_resp")
-async def supplier_my_responses(callback: CallbackQuery, gate: ProcessGate) -> None:
+@callbacks.exact("menu:my_resp")
+async def supplier_my_responses(
+    callback: CallbackQuery,
+    gate: ProcessGate,
+    carousels: CarouselStore,
+) -> None:
     await callback.answer()
     async with _sf()() as session:
         user = await get_or_create_user(session, callback.from_user)
@@ -434,65 +482,145 @@ async def supplier_my_responses(callback: CallbackQuery, gate: ProcessGate) -> N
             await callback.message.answer("Действие доступно только поставщику.")
             return
         await gate.set_busy(callback.from_user.id, "supplier_view_my_responses", 600)
-        stmt = (
-            select(SupplierResponse)
-            .where(SupplierResponse.supplier_id == user.id)
-            .order_by(SupplierResponse.id.desc())
-        )
-        responses = (await session.execute(stmt)).scalars().all()
-        if not responses:
-            await callback.message.answer("Откликов пока нет.")
-        for resp in responses:
-            req = await session.get(SupplyRequest, resp.request_id)
-            req_part = request_text_view(req) if req else "Заявка не найдена"
-            text = f"{req_part}\n\n{response_text_view(resp)}"
-            await send_media_and_text(
-                callback.bot,
-                callback.from_user.id,
-                text,
-                unpack_media(resp.photos_json),
-                None,
-            )
+        view = await carousel.build_view(session, carousels, user, carousel.VIEW_MY_RESPONSES)
+    if view is None:
         await callback.message.answer(
-            "Просмотр завершен. Нажмите Выйти для возврата в обычный режим.",
+            "Откликов пока нет.",
             reply_markup=keyboards.exit_process_kb(),
         )
+        return
+    await carousel.send_view(callback.bot, callback.from_user.id, view)
+
+
+@callbacks.exact("car:noop")
+async def carousel_noop(callback: CallbackQuery) -> None:
+    await callback.answer()
+
+
+@callbacks.data(CarouselCb)
+async def carousel_navigate(
+    callback: CallbackQuery, callback_data: CarouselCb, carousels: CarouselStore
+) -> None:
+    await callback.answer()
+    view_name = callback_data.view
+    context = callback_data.context
+    index = callback_data.index
+    async with _sf()() as session:
+        view = carousels.get(callback.from_user.id, view_name, context)
+        if view is None:
+            user = await get_or_create_user(session, callback.from_user)
+            view = await carousel.build_view(session, carousels, user, view_name, context)
+            if view is None:
+                await callback.message.answer("Список пуст.")
+                return
+        index %= len(view.item_ids)
+        if view.item_ids[index] not in view.items:
+            await carousel.prefetch(session, view, index)
+        await carousel.edit_view(
+            callback.bot,
+            callback.message,
+            view,
+            index,
+            with_exit=view_name not in carousel.RESPONSE_VIEWS,
+        )
+        _mark_feed_seen(callback.from_user.id, view, index)
+        await carousel.prefetch(session, view, index)
+
+
+@callbacks.data(MediaCb)
+async def show_all_media(callback: CallbackQuery, callback_data: MediaCb) -> None:
+    await callback.answer()
+    kind = callback_data.kind
+    async with _sf()() as session:
+        user = await get_or_create_user(session, callback.from_user)
+        media_items: list[dict] = []
+        if kind == "req":
+            req = await session.get(SupplyRequest, callback_data.item_id)
+            if req and (req.consumer_id == user.id or user.role == "supplier"):
+                media_items = unpack_media(req.photos_json)
+        elif kind == "resp":
+            resp = await session.get(SupplierResponse, callback_data.item_id)
+            req = await session.get(SupplyRequest, resp.request_id) if resp else None
+            if resp and req and user.id in (resp.supplier_id, req.consumer_id):
+                media_items = unpack_media(resp.photos_json)
+    if not media_items:
+        await callback.bot.send_message(chat_id=callback.from_user.id, text="Вложения не найдены.")
+        return
+    await send_media_group(callback.bot, callback.from_user.id, media_items)
+
+
+@router.inline_query()
+async def supplier_inline_search(inline_query: InlineQuery, inline_cache: InlineResultCache) -> None:
+    async with _sf()() as session:
+        stmt = select(User.role, User.is_registered).where(User.tg_id == inline_query.from_user.id)
+        row = (await session.execute(stmt)).first()
+        if not row or row.role != "supplier" or not row.is_registered:
+            await inline_query.answer([], cache_time=60, is_personal=True)
+            return
+
+        query = normalize_query(inline_query.query)
+        offset = inline_query.offset
+        page = inline_cache.get(query, offset)
+        if page is None:
+            before_id = int(offset) if offset.isdigit() else None
+            requests = await search_open_requests(session, query, before_id)
+            page = build_page(requests)
+            inline_cache.set(query, offset, page)
+
+    results, next_offset = page
+    await inline_query.answer(
+        results,
+        cache_time=INLINE_CACHE_TTL,
+        is_personal=True,
+        next_offset=next_offset,
+    )
 
 
-@router.callback_query(F.data.startswith("sup:reply:"))
+@callbacks.data(SupplierCb, "reply")
 async def supplier_start_response(
     callback: CallbackQuery,
+    callback_data: SupplierCb,
     state: FSMContext,
     gate: ProcessGate,
 ) -> None:
     await callback.answer()
-    request_id = int(callback.data.split(":")[2])
+    request_id = callback_data.request_id
     async with _sf()() as session:
         user = await get_or_create_user(session, callback.from_user)
         if user.role != "supplier":
-            await callback.message.answer("Только поставщик может откликнуться.")
+            await callback.bot.send_message(
+                chat_id=callback.from_user.id, text="Только поставщик может откликнуться."
+            )
             return
         req = await session.get(SupplyRequest, request_id)
         if not req or req.status != "open":
-            await callback.message.answer("Эта заявка уже закрыта.")
+            await callback.bot.send_message(
+                chat_id=callback.from_user.id, text="Эта заявка уже закрыта."
+            )
+            return
+        if await has_responded(session, req.id, user.id):
+            await callback.bot.send_message(
+                chat_id=callback.from_user.id, text="Вы уже откликнулись на эту заявку."
+            )
             return
     await gate.set_busy(callback.from_user.id, "supplier_make_response", 600)
     await state.clear()
     await state.set_state(SupplierResponseState.waiting_price)
     await state.update_data(response_request_id=request_id, response_photos=[])
-    await callback.message.answer(
-        "Укажите цену в цифрах (тенге).",
+    await callback.bot.send_message(
+        chat_id=callback.from_user.id,
+        text="Укажите цену в цифрах (тенге).",
         reply_markup=keyboards.supplier_price_kb(),
     )
 
 
-@router.callback_query(F.data == "sup:price_tbd")
+@callbacks.exact("sup:price_tbd")
 async def supplier_price_tbd(callback: CallbackQuery, state: FSMContext) -> None:
     await callback.answer()
     current = await state.get_state()
     if current != SupplierResponseState.waiting_price.state:
         return
-    await state.update_data(response_price="Цена уточняется")
+    await state.update_data(response_price=PRICE_TBD, response_price_value=None)
     await state.set_state(SupplierResponseState.waiting_eta)
     await callback.message.answer("Укажите ориентировочный срок поставки (текстом).")
 
@@ -503,7 +631,7 @@ async def supplier_price_input(message: Message, state: FSMContext) -> None:
     if not value:
         await message.answer("Введите цену или используйте кнопку 'цена уточняется'.")
         return
-    await state.update_data(response_price=value)
+    await state.update_data(response_price=value, response_price_value=parse_price(value))
     await state.set_state(SupplierResponseState.waiting_eta)
     await message.answer("Укажите ориентировочный срок поставки (текстом).")
 
@@ -514,7 +642,7 @@ async def supplier_eta_input(message: Message, state: FSMContext) -> None:
     if not value:
         await message.answer("Введите срок поставки.")
         return
-    await state.update_data(response_eta=value)
+    await state.update_data(response_eta=value, response_eta_days=parse_eta_days(value))
     await state.set_state(SupplierResponseState.waiting_description)
     await message.answer("Укажите описание отклика.")
 
@@ -533,31 +661,12 @@ async def supplier_description_input(message: Message, state: FSMContext) -> Non
     )
 
 
-@router.message(SupplierResponseState.waiting_photos, F.photo)
-async def supplier_add_photo(message: Message, state: FSMContext) -> None:
-    data = await state.get_data()
-    photos = data.get("response_photos", [])
-    photos.append({"type": "photo", "file_id": message.photo[-1].file_id})
-    await state.update_data(response_photos=photos)
-    await message.answer(
-        "Фото добавлено. Можно отправить еще или нажать Готово.",
-        reply_markup=keyboards.done_kb("sup:photos_done"),
-    )
+@router.message(SupplierResponseState.waiting_photos, F.photo | F.document)
+async def supplier_add_media(message: Message, state: FSMContext, albums: AlbumBuffer) -> None:
+    await add_draft_media(message, state, albums, "response_photos", "sup:photos_done")
 
 
-@router.message(SupplierResponseState.waiting_photos, F.document)
-async def supplier_add_document(message: Message, state: FSMContext) -> None:
-    data = await state.get_data()
-    photos = data.get("response_photos", [])
-    photos.append({"type": "document", "file_id": message.document.file_id})
-    await state.update_data(response_photos=photos)
-    await message.answer(
-        "Файл добавлен. Можно отправить еще или нажать Готово.",
-        reply_markup=keyboards.done_kb("sup:photos_done"),
-    )
-
-
-@router.callback_query(F.data == "sup:photos_done")
+@callbacks.exact("sup:photos_done")
 async def supplier_response_preview(callback: CallbackQuery, state: FSMContext) -> None:
     await callback.answer()
     data = await state.get_data()
@@ -579,7 +688,7 @@ async def supplier_response_preview(callback: CallbackQuery, state: FSMContext)
     await state.set_state(SupplierResponseState.preview)
 
 
-@router.callback_query(F.data == "sup:preview:edit")
+@callbacks.exact("sup:preview:edit")
 async def supplier_response_edit(callback: CallbackQuery, state: FSMContext) -> None:
     await callback.answer()
     await state.set_state(SupplierResponseState.waiting_price)
@@ -590,7 +699,7 @@ async def supplier_response_edit(callback: CallbackQuery, state: FSMContext) ->
     )
 
 
-@router.callback_query(F.data == "sup:preview:cancel")
+@callbacks.exact("sup:preview:cancel")
 async def supplier_response_cancel(callback: CallbackQuery, state: FSMContext, gate: ProcessGate) -> None:
     await callback.answer()
     await state.clear()
@@ -599,8 +708,10 @@ async def supplier_response_cancel(callback: CallbackQuery, state: FSMContext, g
         await flush_user_queue(callback.bot, gate, session, callback.from_user.id)
 
 
-@router.callback_query(F.data == "sup:preview:confirm")
-async def supplier_response_confirm(callback: CallbackQuery, state: FSMContext, gate: ProcessGate) -> None:
+@callbacks.exact("sup:preview:confirm")
+async def supplier_response_confirm(
+    callback: CallbackQuery, state: FSMContext, gate: ProcessGate, events: EventBus
+) -> None:
     await callback.answer()
     data = await state.get_data()
     request_id = data.get("response_request_id")
@@ -622,35 +733,39 @@ async def supplier_response_confirm(callback: CallbackQuery, state: FSMContext,
             await state.clear()
             return
 
+        if await has_responded(session, req.id, user.id):
+            await callback.message.answer("Вы уже откликнулись на эту заявку.")
+            await state.clear()
+            return
+
         response = SupplierResponse(
             request_id=req.id,
             supplier_id=user.id,
             price_text=price,
             eta_text=eta,
+            price_value=data.get("response_price_value"),
+            eta_days=data.get("response_eta_days"),
             description=desc,
             photos_json=pack_media(photos),
             status="pending",
         )
         session.add(response)
-        await session.commit()
-        await session.refresh(response)
-
-        consumer = await session.get(User, req.consumer_id)
-        if consumer:
-            await notify_consumer_about_response(
-                callback.bot,
-                gate,
-                consumer.tg_id,
-                req,
-                response,
-            )
+        try:
+            await session.commit()
+        except IntegrityError:
+            await session.rollback()
+            await callback.message.answer("Вы уже откликнулись на эту заявку.")
+            await state.clear()
+            return
+
+        await events.publish(ResponseCreated(req.id, response.id))
         await callback.message.answer("Отклик отправлен.")
         await send_main_menu_cb(callback, user)
         await flush_user_queue(callback.bot, gate, session, callback.from_user.id)
     await state.clear()
 
 
-@router.callback_query(F.data == "menu:exit_process")
+@callbacks.exact("menu:exit_process")
 async def exit_process(callback: CallbackQuery, state: FSMContext, gate: ProcessGate) -> None:
     await callback.answer()
     await state.clear()
@@ -659,8 +774,12 @@ async def exit_process(callback: CallbackQuery, state: FSMContext, gate: Process
     await callback.message.answer("Вы вернулись в обычный режим.")
 
 
-@router.callback_query(F.data == "admin:stats")
-async def admin_stats(callback: CallbackQuery, admin_ids: set[int]) -> None:
+@callbacks.exact("admin:stats")
+async def admin_stats(
+    callback: CallbackQuery,
+    admin_ids: set[int],
+    snapshotter: SqliteSnapshotter | None,
+) -> None:
     await callback.answer()
     async with _sf()() as session:
         user = await get_or_create_user(session, callback.from_user)
@@ -683,19 +802,34 @@ async def admin_stats(callback: CallbackQuery, admin_ids: set[int]) -> None:
         responses_total = (
             await session.execute(select(func.count()).select_from(SupplierResponse))
         ).scalar_one()
-
+        blocked_stmt = (
+            select(User.role, func.count()).where(User.blocked_at.is_not(None)).group_by(User.role)
+        )
+        blocked_by_role = dict((await session.execute(blocked_stmt)).all())
+
+    snapshot_line = ""
+    if snapshotter is not None:
+        age = snapshotter.age
+        snapshot_line = (
+            "- Снапшот БД: еще не создан\n"
+            if age is None
+            else f"- Снапшот БД: {age:.0f} сек. назад\n"
+        )
     await callback.message.answer(
         "Статистика:\n"
         f"- Пользователей: {users_total}\n"
         f"- Потребителей: {consumers}\n"
         f"- Поставщиков: {suppliers}\n"
         f"- Заявок: {requests_total}\n"
-        f"- Откликов: {responses_total}\n\n"
+        f"- Откликов: {responses_total}\n"
+        f"- Заблокировали бота: {sum(blocked_by_role.values())} "
+        f"(поставщиков: {blocked_by_role.get('supplier', 0)})\n"
+        f"{snapshot_line}\n"
         "Количество заявок по каждому пользователю хранится в users.sent_requests_count."
     )
 
 
-@router.callback_query(F.data == "admin:set_role")
+@callbacks.exact("admin:set_role")
 async def admin_set_role_start(callback: CallbackQuery, state: FSMContext, admin_ids: set[int]) -> None:
     await callback.answer()
     async with _sf()() as session:
@@ -721,21 +855,22 @@ async def admin_set_role_tg_input(message: Message, state: FSMContext) -> None:
     )
 
 
-@router.callback_query(AdminState.waiting_set_role_name, F.data == "admin:set_role:cancel")
+@callbacks.exact("admin:set_role:cancel", state=AdminState.waiting_set_role_name)
 async def admin_set_role_cancel(callback: CallbackQuery, state: FSMContext) -> None:
     await callback.answer()
     await state.clear()
     await callback.message.answer("Смена роли отменена.")
 
 
-@router.callback_query(AdminState.waiting_set_role_name, F.data.startswith("admin:set_role:"))
+@callbacks.data(AdminCb, "set_role", state=AdminState.waiting_set_role_name)
 async def admin_set_role_name_input(
     callback: CallbackQuery,
+    callback_data: AdminCb,
     state: FSMContext,
     admin_ids: set[int],
 ) -> None:
     await callback.answer()
-    role = callback.data.split(":")[3]
+    role = callback_data.value
     if role not in {"consumer", "supplier", "admin"}:
         await callback.message.answer("Некорректная роль.")
         return
@@ -766,7 +901,7 @@ async def admin_set_role_name_input(
     await state.clear()
 
 
-@router.callback_query(F.data == "admin:broadcast")
+@callbacks.exact("admin:broadcast")
 async def admin_broadcast_start(callback: CallbackQuery, state: FSMContext, admin_ids: set[int]) -> None:
     await callback.answer()
     async with _sf()() as session:
@@ -792,20 +927,43 @@ async def admin_broadcast_input(message: Message, state: FSMContext, admin_ids:
             await state.clear()
             return
 
-        stmt = select(User).where(User.is_registered == 1)
-        users = (await session.execute(stmt)).scalars().all()
+        stmt = select(User.tg_id).where(User.is_registered == 1, reachable_users())
+        tg_ids = (await session.execute(stmt)).scalars().all()
+        queued = await enqueue_outbox(session, "broadcast", tg_ids, {"text": text})
+        await session.commit()
 
-    sent = 0
-    for user in users:
-        try:
-            await message.bot.send_message(chat_id=user.tg_id, text=f"Рассылка:\n\n{text}")
-            sent += 1
-        except Exception:
-            continue
-    await message.answer(f"Рассылка завершена. Отправлено: {sent}")
+    await message.answer(f"Рассылка поставлена в очередь. Получателей: {queued}")
     await state.clear()
 
 
+@callbacks.exact("admin:profile")
+async def admin_profile(
+    callback: CallbackQuery,
+    admin_ids: set[int],
+    profiler: Profiler | None,
+) -> None:
+    await callback.answer()
+    async with _sf()() as session:
+        user = await get_or_create_user(session, callback.from_user)
+        if not _require_admin(user, admin_ids):
+            await callback.message.answer("Нет доступа.")
+            return
+    if profiler is None:
+        await callback.message.answer("Профилирование выключено. Включите PROFILING_ENABLED=1.")
+        return
+    if profiler.running:
+        await callback.message.answer("Профилирование уже запущено.")
+        return
+
+    await callback.message.answer(f"Сбор профиля: {profiler.capture_seconds} сек.")
+    report = await profiler.capture()
+    filename = f"profile-{datetime.utcnow():%Y%m%d-%H%M%S}.txt"
+    await callback.message.answer_document(
+        BufferedInputFile(report, filename=filename),
+        caption="Профиль готов.",
+    )
+
+
 @router.message()
 async def fallback(message: Message) -> None:
     async with _sf()() as session:
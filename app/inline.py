@@ -0,0 +1,97 @@
+import time
+from collections import OrderedDict
+
+from aiogram.types import InlineQueryResultArticle, InputTextMessageContent
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import keyboards
+from app.events import EventBus, RequestClosed, RequestCreated
+from app.models import SupplyRequest
+from app.services import request_text_view, unpack_media
+
+
+INLINE_PAGE_SIZE = 20
+INLINE_CACHE_TTL = 15
+DESCRIPTION_LIMIT = 120
+
+InlinePage = tuple[list[InlineQueryResultArticle], str]
+
+
+class InlineResultCache:
+    def __init__(self, ttl: float = INLINE_CACHE_TTL, maxsize: int = 1024) -> None:
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._items: OrderedDict[tuple[str, str], tuple[float, InlinePage]] = OrderedDict()
+
+    def get(self, query: str, offset: str) -> InlinePage | None:
+        key = (query, offset)
+        entry = self._items.get(key)
+        if entry is None:
+            return None
+        expires, page = entry
+        if expires < time.monotonic():
+            self._items.pop(key, None)
+            return None
+        return page
+
+    def set(self, query: str, offset: str, page: InlinePage) -> None:
+        key = (query, offset)
+        self._items[key] = (time.monotonic() + self.ttl, page)
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        self._items.clear()
+
+
+def subscribe_cache_invalidation(events: EventBus, cache: InlineResultCache) -> None:
+    async def invalidate_inline_cache(event: RequestCreated | RequestClosed) -> None:
+        cache.clear()
+
+    events.subscribe(RequestCreated, invalidate_inline_cache)
+    events.subscribe(RequestClosed, invalidate_inline_cache)
+
+
+def normalize_query(raw: str) -> str:
+    # SQLite's lower() and LIKE fold only ASCII, so search runs against a
+    # casefolded copy of the text kept in supply_requests.search_text.
+    return " ".join(raw.split()).casefold()
+
+
+async def search_open_requests(
+    session: AsyncSession,
+    query: str,
+    before_id: int | None,
+    limit: int = INLINE_PAGE_SIZE,
+) -> list[SupplyRequest]:
+    stmt = select(SupplyRequest).where(SupplyRequest.status == "open")
+    if before_id is not None:
+        stmt = stmt.where(SupplyRequest.id < before_id)
+    if query:
+        stmt = stmt.where(SupplyRequest.search_text.contains(query, autoescape=True))
+    stmt = stmt.order_by(SupplyRequest.id.desc()).limit(limit)
+    return list((await session.execute(stmt)).scalars().all())
+
+
+def build_page(requests: list[SupplyRequest], limit: int = INLINE_PAGE_SIZE) -> InlinePage:
+    results = []
+    for req in requests:
+        media_count = len(unpack_media(req.photos_json))
+        description = " ".join(req.text.split())
+        if len(description) > DESCRIPTION_LIMIT:
+            description = description[: DESCRIPTION_LIMIT - 1] + "…"
+        if media_count:
+            description = f"📎 {media_count} · {description}"
+        results.append(
+            InlineQueryResultArticle(
+                id=str(req.id),
+                title=f"Заявка #{req.id}",
+                description=description,
+                input_message_content=InputTextMessageContent(message_text=request_text_view(req)),
+                reply_markup=keyboards.inline_request_kb(req.id, media_count),
+            )
+        )
+    next_offset = str(requests[-1].id) if len(requests) == limit else ""
+    return results, next_offset
@@ -1,6 +1,100 @@
+from collections import OrderedDict
+from collections.abc import Callable
+from functools import wraps
+
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 
+from app.callbacks import AdminCb, CarouselCb, MediaCb, RequestCb, ResponseCb, SupplierCb
+
+
+class _FrozenRows(list):
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("Cached keyboard markups are read-only, build a new markup instead")
+
+    append = extend = insert = pop = remove = clear = sort = reverse = _read_only
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _read_only
+
+    def __reduce__(self):
+        return type(self), (list(self),)
+
+
+class FrozenInlineKeyboardButton(InlineKeyboardButton, frozen=True):
+    pass
+
+
+class FrozenInlineKeyboardMarkup(InlineKeyboardMarkup, frozen=True):
+    pass
+
+
+def freeze_markup(markup: InlineKeyboardMarkup) -> FrozenInlineKeyboardMarkup:
+    rows = _FrozenRows(
+        _FrozenRows(FrozenInlineKeyboardButton.model_construct(**dict(button)) for button in row)
+        for row in markup.inline_keyboard
+    )
+    return FrozenInlineKeyboardMarkup.model_construct(inline_keyboard=rows)
+
+
+class KeyboardCache:
+    # Cached markups are shared between callers and their JSON is serialized
+    # once when they enter the cache, so they are frozen: build a new markup
+    # (copying rows with list(row)) instead of changing one.
+    def __init__(self, maxsize: int = 4096) -> None:
+        self.maxsize = maxsize
+        self._by_key: OrderedDict[tuple, InlineKeyboardMarkup] = OrderedDict()
+        self._payloads: dict[int, tuple[InlineKeyboardMarkup, str]] = {}
+
+    def pin(self, markup: InlineKeyboardMarkup) -> InlineKeyboardMarkup:
+        markup = freeze_markup(markup)
+        self._payloads[id(markup)] = (markup, markup.model_dump_json(exclude_none=True))
+        return markup
+
+    def get(self, key: tuple, build: Callable[[], InlineKeyboardMarkup]) -> InlineKeyboardMarkup:
+        markup = self._by_key.get(key)
+        if markup is not None:
+            self._by_key.move_to_end(key)
+            return markup
+        markup = self.pin(build())
+        self._by_key[key] = markup
+        if len(self._by_key) > self.maxsize:
+            _, evicted = self._by_key.popitem(last=False)
+            self._payloads.pop(id(evicted), None)
+        return markup
+
+    def payload(self, markup: InlineKeyboardMarkup) -> str | None:
+        entry = self._payloads.get(id(markup))
+        if entry is None or entry[0] is not markup:
+            return None
+        return entry[1]
+
+
+_cache = KeyboardCache()
+
+
+def _static(builder: Callable[[], InlineKeyboardMarkup]) -> Callable[[], InlineKeyboardMarkup]:
+    markup = _cache.pin(builder())
 
+    @wraps(builder)
+    def wrapper() -> InlineKeyboardMarkup:
+        return markup
+
+    return wrapper
+
+
+def _memoized(builder: Callable[..., InlineKeyboardMarkup]) -> Callable[..., InlineKeyboardMarkup]:
+    @wraps(builder)
+    def wrapper(*args) -> InlineKeyboardMarkup:
+        return _cache.get((builder.__name__, *args), lambda: builder(*args))
+
+    return wrapper
+
+
+def markup_payload(markup) -> str | None:
+    if not isinstance(markup, InlineKeyboardMarkup):
+        return None
+    return _cache.payload(markup)
+
+
+@_static
 def start_phone_confirm_kb() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(
         inline_keyboard=[
@@ -12,6 +106,7 @@ def start_phone_confirm_kb() -> InlineKeyboardMarkup:
     )
 
 
+@_memoized
 def menu_kb(role: str) -> InlineKeyboardMarkup:
     rows: list[list[InlineKeyboardButton]] = []
     if role == "consumer":
@@ -25,6 +120,11 @@ def menu_kb(role: str) -> InlineKeyboardMarkup:
         rows.extend(
             [
                 [InlineKeyboardButton(text="Открытые заявки", callback_data="menu:open_req")],
+                [
+                    InlineKeyboardButton(
+                        text="Поиск заявок", switch_inline_query_current_chat=""
+                    )
+                ],
                 [InlineKeyboardButton(text="Мои отклики", callback_data="menu:my_resp")],
             ]
         )
@@ -32,12 +132,14 @@ def menu_kb(role: str) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=rows)
 
 
+@_memoized
 def done_kb(callback: str) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(
         inline_keyboard=[[InlineKeyboardButton(text="Готово", callback_data=callback)]]
     )
 
 
+@_static
 def request_preview_kb() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(
         inline_keyboard=[
@@ -48,50 +150,167 @@ def request_preview_kb() -> InlineKeyboardMarkup:
     )
 
 
-def my_request_item_kb(request_id: int) -> InlineKeyboardMarkup:
+@_memoized
+def show_all_kb(view: str, count: int) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(
         inline_keyboard=[
             [
                 InlineKeyboardButton(
-                    text="Просмотреть отклики", callback_data=f"req:view:{request_id}"
+                    text=f"Показать все ({count})",
+                    callback_data=CarouselCb(view=view, context=0, index=0).pack(),
                 )
-            ],
+            ]
+        ]
+    )
+
+
+@_memoized
+def responses_digest_kb(counts: tuple[tuple[int, int], ...]) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(
+        inline_keyboard=[
             [
                 InlineKeyboardButton(
-                    text="Закрыть заявку", callback_data=f"req:close:{request_id}"
+                    text=f"Отклики по заявке #{request_id} ({count})",
+                    callback_data=RequestCb(action="view", request_id=request_id).pack(),
                 )
-            ],
+            ]
+            for request_id, count in counts
         ]
     )
 
 
-def response_item_kb(response_id: int, request_id: int) -> InlineKeyboardMarkup:
+@_memoized
+def my_request_item_kb(request_id: int) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(
         inline_keyboard=[
             [
                 InlineKeyboardButton(
-                    text="Связаться с поставщиком",
-                    callback_data=f"resp:contact:{response_id}",
+                    text="Просмотреть отклики",
+                    callback_data=RequestCb(action="view", request_id=request_id).pack(),
                 )
             ],
             [
                 InlineKeyboardButton(
-                    text="Приостановить отклики по этой заявке",
-                    callback_data=f"resp:stop:{request_id}",
+                    text="Закрыть заявку",
+                    callback_data=RequestCb(action="close", request_id=request_id).pack(),
                 )
             ],
         ]
     )
 
 
-def supplier_request_kb(request_id: int) -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
-        inline_keyboard=[
-            [InlineKeyboardButton(text="Откликнуться", callback_data=f"sup:reply:{request_id}")]
+def _all_media_row(media_callback: str, media_count: int) -> list[InlineKeyboardButton]:
+    return [InlineKeyboardButton(text=f"Все вложения ({media_count})", callback_data=media_callback)]
+
+
+@_memoized
+def response_item_kb(response_id: int, request_id: int, media_count: int = 0) -> InlineKeyboardMarkup:
+    rows = [
+        [
+            InlineKeyboardButton(
+                text="Связаться с поставщиком",
+                callback_data=ResponseCb(action="contact", target_id=response_id).pack(),
+            )
+        ],
+        [
+            InlineKeyboardButton(
+                text="Приостановить отклики по этой заявке",
+                callback_data=ResponseCb(action="stop", target_id=request_id).pack(),
+            )
+        ],
+    ]
+    if media_count:
+        rows.append(_all_media_row(MediaCb(kind="resp", item_id=response_id).pack(), media_count))
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+@_memoized
+def supplier_request_kb(request_id: int, media_count: int = 0) -> InlineKeyboardMarkup:
+    rows = [
+        [
+            InlineKeyboardButton(
+                text="Откликнуться",
+                callback_data=SupplierCb(action="reply", request_id=request_id).pack(),
+            )
         ]
-    )
+    ]
+    if media_count:
+        rows.append(_all_media_row(MediaCb(kind="req", item_id=request_id).pack(), media_count))
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+def sort_row(
+    sorts: tuple[tuple[str, str], ...], current_view: str, context: int
+) -> list[InlineKeyboardButton]:
+    return [
+        InlineKeyboardButton(
+            text=f"• {label}" if view == current_view else label,
+            callback_data=CarouselCb(view=view, context=context, index=0).pack(),
+        )
+        for view, label in sorts
+    ]
 
 
+def carousel_kb(
+    item_kb: InlineKeyboardMarkup | None,
+    view: str,
+    context: int,
+    index: int,
+    total: int,
+    media_callback: str | None = None,
+    media_count: int = 0,
+    with_exit: bool = True,
+    sort_row: list[InlineKeyboardButton] | None = None,
+) -> InlineKeyboardMarkup:
+    rows: list[list[InlineKeyboardButton]] = []
+    if item_kb is not None:
+        rows.extend(list(row) for row in item_kb.inline_keyboard)
+    if media_callback:
+        rows.append(_all_media_row(media_callback, media_count))
+    if sort_row:
+        rows.append(sort_row)
+    if total > 1:
+        rows.append(
+            [
+                InlineKeyboardButton(
+                    text="◀",
+                    callback_data=CarouselCb(view=view, context=context, index=(index - 1) % total).pack(),
+                ),
+                InlineKeyboardButton(text=f"{index + 1}/{total}", callback_data="car:noop"),
+                InlineKeyboardButton(
+                    text="▶",
+                    callback_data=CarouselCb(view=view, context=context, index=(index + 1) % total).pack(),
+                ),
+            ]
+        )
+    if with_exit:
+        rows.append([InlineKeyboardButton(text="Выйти", callback_data="menu:exit_process")])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+@_memoized
+def inline_request_kb(request_id: int, media_count: int) -> InlineKeyboardMarkup:
+    rows = [
+        [
+            InlineKeyboardButton(
+                text="Откликнуться",
+                callback_data=SupplierCb(action="reply", request_id=request_id).pack(),
+            )
+        ]
+    ]
+    if media_count:
+        rows.append(
+            [
+                InlineKeyboardButton(
+                    text=f"Вложения ({media_count})",
+                    callback_data=MediaCb(kind="req", item_id=request_id).pack(),
+                )
+            ]
+        )
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+@_static
 def supplier_price_kb() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(
         inline_keyboard=[
@@ -105,6 +324,7 @@ def supplier_price_kb() -> InlineKeyboardMarkup:
     )
 
 
+@_static
 def supplier_preview_kb() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(
         inline_keyboard=[
@@ -115,28 +335,44 @@ def supplier_preview_kb() -> InlineKeyboardMarkup:
     )
 
 
+@_static
 def exit_process_kb() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(
         inline_keyboard=[[InlineKeyboardButton(text="Выйти", callback_data="menu:exit_process")]]
     )
 
 
+@_static
 def admin_menu_kb() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(
         inline_keyboard=[
             [InlineKeyboardButton(text="Статистика", callback_data="admin:stats")],
             [InlineKeyboardButton(text="Назначить роль", callback_data="admin:set_role")],
             [InlineKeyboardButton(text="Рассылка", callback_data="admin:broadcast")],
+            [InlineKeyboardButton(text="Профилирование", callback_data="admin:profile")],
         ]
     )
 
 
+@_static
 def admin_set_role_kb() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(
         inline_keyboard=[
-            [InlineKeyboardButton(text="Потребитель", callback_data="admin:set_role:consumer")],
-            [InlineKeyboardButton(text="Поставщик", callback_data="admin:set_role:supplier")],
-            [InlineKeyboardButton(text="Админ", callback_data="admin:set_role:admin")],
+            [
+                InlineKeyboardButton(
+                    text="Потребитель", callback_data=AdminCb(action="set_role", value="consumer").pack()
+                )
+            ],
+            [
+                InlineKeyboardButton(
+                    text="Поставщик", callback_data=AdminCb(action="set_role", value="supplier").pack()
+                )
+            ],
+            [
+                InlineKeyboardButton(
+                    text="Админ", callback_data=AdminCb(action="set_role", value="admin").pack()
+                )
+            ],
             [InlineKeyboardButton(text="Отмена", callback_data="admin:set_role:cancel")],
         ]
     )
@@ -0,0 +1,91 @@
+import asyncio
+import logging
+import os
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from app import codec
+
+
+logger = logging.getLogger(__name__)
+
+
+class InFlightTracker(BaseMiddleware):
+    def __init__(self) -> None:
+        self.in_flight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        self.in_flight += 1
+        self._idle.clear()
+        try:
+            return await handler(event, data)
+        finally:
+            self.in_flight -= 1
+            if not self.in_flight:
+                self._idle.set()
+
+    async def drain(self, timeout: float) -> bool:
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout=max(0.0, timeout))
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+
+class ReadinessGate(BaseMiddleware):
+    def __init__(self) -> None:
+        self.failed = False
+        self._ready = asyncio.Event()
+
+    def open(self) -> None:
+        self._ready.set()
+
+    def fail(self) -> None:
+        self.failed = True
+        self._ready.set()
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        # Updates fetched before startup checks finish wait here, and none of
+        # them reaches a handler if the checks fail.
+        await self._ready.wait()
+        if self.failed:
+            return None
+        return await handler(event, data)
+
+
+def save_state(path: str, data: dict) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as fh:
+        fh.write(codec.dumps(data))
+    os.replace(tmp_path, path)
+
+
+def load_state(path: str) -> dict | None:
+    try:
+        with open(path, encoding="utf-8") as fh:
+            data = codec.loads(fh.read())
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError):
+        logger.exception("Failed to read state snapshot %s", path)
+        return None
+    os.remove(path)
+    return data
@@ -6,38 +6,253 @@ from aiogram import Bot, Dispatcher
 
 from app.config import load_settings
 from app import db
+from app.albums import AlbumBuffer
+from app.carousel import CarouselStore
+from app.events import EventBus
+from app.inline import InlineResultCache, subscribe_cache_invalidation
 from app.handlers import router
-from app.services import ProcessGate, timeout_watcher
+from app.lifecycle import InFlightTracker, ReadinessGate, load_state, save_state
+from app.ratelimit import RateLimitMiddleware, parse_action_quotas
+from app.scheduler import PrioritySendMiddleware, SendScheduler
+from app.services import (
+    ProcessGate,
+    ResponseDebouncer,
+    outbox_worker,
+    purge_outbox,
+    subscribe_notifications,
+    timeout_watcher,
+)
+from app.session import BlockedChatMiddleware, BotSession
+from app.snapshots import SqliteSnapshotter, sqlite_path
+from app.tracing import (
+    ApiSpanMiddleware,
+    HandlerSpanMiddleware,
+    JsonlExporter,
+    Tracer,
+    install_db_tracing,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+async def _cancel(tasks: list[asyncio.Task]) -> None:
+    for task in tasks:
+        task.cancel()
+    for task in tasks:
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
 
 
 async def main() -> None:
     logging.basicConfig(level=logging.INFO)
     settings = load_settings()
 
-    db.init_db(settings.database_url)
-    await db.create_tables()
+    db.init_db(
+        settings.database_url,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_pre_ping=settings.db_pool_pre_ping,
+        statement_cache_size=settings.db_statement_cache_size,
+    )
 
-    bot = Bot(token=settings.bot_token)
+    session = BotSession(
+        limit=settings.bot_api_pool_size,
+        keepalive_timeout=settings.bot_api_keepalive,
+        dns_cache_ttl=settings.bot_api_dns_ttl,
+        timeout=settings.bot_api_timeout,
+        api_url=settings.bot_api_url,
+        api_local=settings.bot_api_local,
+    )
+    bot = Bot(token=settings.bot_token, session=session)
+    send_scheduler = SendScheduler(rate=settings.send_rate, burst=settings.send_burst)
+    bot.session.middleware(PrioritySendMiddleware(send_scheduler))
+    bot.session.middleware(BlockedChatMiddleware(db.get_write_buffer()))
     dp = Dispatcher()
     dp.include_router(router)
+    schema_ready = ReadinessGate()
+    dp.update.outer_middleware(schema_ready)
+    trace_exporter = None
+    if settings.trace_path:
+        trace_exporter = JsonlExporter(settings.trace_path)
+        dp.update.outer_middleware(
+            Tracer(
+                trace_exporter,
+                sample_rate=settings.trace_sample_rate,
+                slow_ms=settings.trace_slow_ms,
+            )
+        )
+        handler_spans = HandlerSpanMiddleware()
+        router.message.middleware(handler_spans)
+        router.callback_query.middleware(handler_spans)
+        router.inline_query.middleware(handler_spans)
+        bot.session.middleware(ApiSpanMiddleware())
+        install_db_tracing(db.engine)
+    recorder = None
+    if settings.record_updates_path:
+        from app.replay import UpdateRecorder
+
+        recorder = UpdateRecorder(settings.record_updates_path)
+        dp.update.outer_middleware(recorder)
+    in_flight = InFlightTracker()
+    dp.update.outer_middleware(in_flight)
+    rate_limit = RateLimitMiddleware(
+        user_rate=settings.rate_limit_user_rate,
+        user_burst=settings.rate_limit_user_burst,
+        global_rate=settings.rate_limit_global_rate,
+        global_burst=settings.rate_limit_global_burst,
+        action_quotas=parse_action_quotas(settings.rate_limit_actions),
+        idempotent_actions={"req:preview:confirm", "sup:preview:confirm"},
+    )
+    dp.message.outer_middleware(rate_limit)
+    dp.callback_query.outer_middleware(rate_limit)
 
     gate = ProcessGate()
+    snapshot = load_state(settings.state_path)
+    if snapshot:
+        await gate.restore(snapshot.get("gate", {}))
+        logger.info("Restored process gate state from %s", settings.state_path)
+
+    events = EventBus(queue_size=settings.event_queue_size)
+    inline_cache = InlineResultCache()
+    debouncer = ResponseDebouncer(
+        bot,
+        gate,
+        db.session_factory,
+        window=settings.response_debounce_seconds,
+        max_delay=settings.response_debounce_max_seconds,
+    )
+    subscribe_notifications(events, bot, debouncer, db.session_factory, workers=settings.event_workers)
+    subscribe_cache_invalidation(events, inline_cache)
+
+    write_buffer = db.get_write_buffer()
+    background_tasks: list[asyncio.Task] = [
+        asyncio.create_task(write_buffer.run()),
+        asyncio.create_task(events.run()),
+    ]
+    worker_tasks: list[asyncio.Task] = []
+    stop_workers = asyncio.Event()
+    schema_error: Exception | None = None
 
-    watcher_task = None
-    if db.session_factory is not None:
-        watcher_task = asyncio.create_task(timeout_watcher(bot, gate, db.session_factory))
+    async def start_workers(dispatcher: Dispatcher) -> None:
+        nonlocal schema_error
+        try:
+            await db.check_schema()
+        except Exception as exc:
+            schema_error = exc
+            schema_ready.fail()
+            await dispatcher.stop_polling()
+            return
+        schema_ready.open()
+        if db.session_factory is None:
+            return
+        background_tasks.append(
+            asyncio.create_task(timeout_watcher(bot, gate, db.session_factory))
+        )
+        background_tasks.append(
+            asyncio.create_task(
+                purge_outbox(db.session_factory, retention=settings.outbox_retention_days * 86400)
+            )
+        )
+        for _ in range(max(1, settings.outbox_workers)):
+            worker_tasks.append(
+                asyncio.create_task(
+                    outbox_worker(
+                        bot,
+                        gate,
+                        db.session_factory,
+                        batch_size=settings.outbox_batch_size,
+                        stop=stop_workers,
+                        max_attempts=settings.outbox_max_attempts,
+                    )
+                )
+            )
+
+    @dp.startup()
+    async def on_startup(dispatcher: Dispatcher) -> None:
+        # The schema check runs next to the first getUpdates instead of delaying it;
+        # updates received meanwhile wait on schema_ready.
+        background_tasks.append(asyncio.create_task(start_workers(dispatcher)))
+
+    snapshotter = None
+    if settings.snapshot_path:
+        database_path = sqlite_path(settings.database_url)
+        if database_path is None:
+            logger.warning("SNAPSHOT_PATH is set, but snapshots are only supported for SQLite")
+        else:
+            snapshotter = SqliteSnapshotter(
+                database_path, settings.snapshot_path, interval=settings.snapshot_interval
+            )
+            background_tasks.append(asyncio.create_task(snapshotter.run()))
+
+    profiler = None
+    if settings.profiling_enabled:
+        from app.profiling import (
+            ApiCallStatsMiddleware,
+            LoopLagMonitor,
+            Profiler,
+            SlowHandlerMiddleware,
+            install_db_hooks,
+        )
+
+        lag_monitor = LoopLagMonitor(threshold_ms=settings.loop_lag_ms)
+        profiler = Profiler(lag_monitor, capture_seconds=settings.profile_seconds)
+        install_db_hooks(db.engine)
+        bot.session.middleware(ApiCallStatsMiddleware())
+        slow_handler_middleware = SlowHandlerMiddleware(settings.slow_handler_ms)
+        router.message.middleware(slow_handler_middleware)
+        router.callback_query.middleware(slow_handler_middleware)
+        background_tasks.append(asyncio.create_task(lag_monitor.run()))
 
     try:
         await dp.start_polling(
             bot,
             gate=gate,
+            carousels=CarouselStore(),
+            albums=AlbumBuffer(),
+            inline_cache=inline_cache,
+            events=events,
             admin_ids=settings.admin_ids,
+            profiler=profiler,
+            snapshotter=snapshotter,
+            close_bot_session=False,
         )
     finally:
-        if watcher_task:
-            watcher_task.cancel()
-            with contextlib.suppress(asyncio.CancelledError):
-                await watcher_task
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.shutdown_timeout
+
+        if not await in_flight.drain(deadline - loop.time()):
+            logger.warning("Shutdown deadline hit with %s handlers in flight", in_flight.in_flight)
+        if not await events.drain(max(0.0, deadline - loop.time())):
+            logger.warning("Shutdown deadline hit with %s events undelivered", events.pending)
+        try:
+            await asyncio.wait_for(debouncer.close(), max(0.0, deadline - loop.time()))
+        except asyncio.TimeoutError:
+            logger.warning("Shutdown deadline hit with %s response notifications pending", debouncer.pending)
+
+        stop_workers.set()
+        if worker_tasks:
+            _, pending_workers = await asyncio.wait(
+                worker_tasks, timeout=max(0.0, deadline - loop.time())
+            )
+            if pending_workers:
+                logger.warning("Shutdown deadline hit, interrupting outbox workers")
+        await _cancel(worker_tasks + background_tasks)
+        await send_scheduler.close()
+
+        await write_buffer.flush()
+        save_state(settings.state_path, {"gate": await gate.snapshot()})
+        if recorder is not None:
+            recorder.close()
+        if trace_exporter is not None:
+            trace_exporter.close()
+        await bot.session.close()
+        if db.engine is not None:
+            await db.engine.dispose()
+
+    if schema_error is not None:
+        raise schema_error
 
 
 if __name__ == "__main__":
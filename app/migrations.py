@@ -0,0 +1,466 @@
+import asyncio
+import logging
+import math
+import re
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    Text,
+    inspect,
+    text,
+)
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.config import load_database_url
+
+
+logger = logging.getLogger(__name__)
+
+VERSION_TABLE = "schema_migrations"
+BACKFILL_BATCH = 500
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    upgrade: Callable[[Connection], None]
+    # Non-transactional migrations run in autocommit mode, one statement at a time.
+    # Index builds use it so Postgres can build CONCURRENTLY and SQLite holds
+    # the write lock only for a single CREATE INDEX.
+    transactional: bool = True
+
+
+def create_index(
+    conn: Connection,
+    name: str,
+    table: str,
+    columns: list[str],
+    unique: bool = False,
+) -> None:
+    unique_sql = "UNIQUE " if unique else ""
+    columns_sql = ", ".join(columns)
+    if conn.dialect.name == "postgresql":
+        # A failed CONCURRENTLY build leaves an INVALID index behind; drop it so
+        # IF NOT EXISTS does not mistake it for a finished one.
+        invalid = conn.execute(
+            text(
+                "SELECT 1 FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid "
+                "WHERE c.relname = :name AND NOT i.indisvalid"
+            ),
+            {"name": name},
+        ).first()
+        if invalid:
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+        conn.execute(
+            text(
+                f"CREATE {unique_sql}INDEX CONCURRENTLY IF NOT EXISTS {name} "
+                f"ON {table} ({columns_sql})"
+            )
+        )
+    else:
+        conn.execute(
+            text(f"CREATE {unique_sql}INDEX IF NOT EXISTS {name} ON {table} ({columns_sql})")
+        )
+
+
+def add_column(conn: Connection, table: str, column: Column) -> None:
+    existing = {col["name"] for col in inspect(conn).get_columns(table)}
+    if column.name in existing:
+        return
+    column_type = column.type.compile(dialect=conn.dialect)
+    null_sql = "" if column.nullable else " NOT NULL"
+    default_sql = f" DEFAULT {column.server_default.arg}" if column.server_default is not None else ""
+    conn.execute(
+        text(f"ALTER TABLE {table} ADD COLUMN {column.name} {column_type}{default_sql}{null_sql}")
+    )
+
+
+def _initial_schema(conn: Connection) -> None:
+    # Frozen copy of the schema that create_all used to produce, so databases
+    # created before migrations existed are recognized as version 1.
+    metadata = MetaData()
+    Table(
+        "users",
+        metadata,
+        Column("id", Integer, primary_key=True, autoincrement=True),
+        Column("tg_id", BigInteger, nullable=False),
+        Column("username", String(255), nullable=True),
+        Column("full_name", String(255), nullable=True),
+        Column("phone", String(50), nullable=True),
+        Column("role", String(30), nullable=False),
+        Column("is_registered", Integer, nullable=False),
+        Column("sent_requests_count", Integer, nullable=False),
+        Column("created_at", DateTime, nullable=False),
+        Index("ix_users_tg_id", "tg_id", unique=True),
+    )
+    Table(
+        "supply_requests",
+        metadata,
+        Column("id", Integer, primary_key=True, autoincrement=True),
+        Column("consumer_id", Integer, ForeignKey("users.id"), nullable=False),
+        Column("text", Text, nullable=False),
+        Column("photos_json", Text, nullable=False),
+        Column("status", String(20), nullable=False),
+        Column("created_at", DateTime, nullable=False),
+        Index("ix_supply_requests_consumer_id", "consumer_id"),
+    )
+    Table(
+        "supplier_responses",
+        metadata,
+        Column("id", Integer, primary_key=True, autoincrement=True),
+        Column("request_id", Integer, ForeignKey("supply_requests.id"), nullable=False),
+        Column("supplier_id", Integer, ForeignKey("users.id"), nullable=False),
+        Column("price_text", String(255), nullable=False),
+        Column("eta_text", String(255), nullable=False),
+        Column("description", Text, nullable=False),
+        Column("photos_json", Text, nullable=False),
+        Column("status", String(20), nullable=False),
+        Column("created_at", DateTime, nullable=False),
+        Index("ix_supplier_responses_request_id", "request_id"),
+        Index("ix_supplier_responses_supplier_id", "supplier_id"),
+    )
+    metadata.create_all(conn)
+
+
+def _feed_indexes(conn: Connection) -> None:
+    create_index(conn, "ix_supply_requests_status_id", "supply_requests", ["status", "id"])
+    create_index(
+        conn,
+        "ix_supply_requests_consumer_status_id",
+        "supply_requests",
+        ["consumer_id", "status", "id"],
+    )
+    create_index(conn, "ix_users_role_registered", "users", ["role", "is_registered"])
+
+
+def _outbox(conn: Connection) -> None:
+    metadata = MetaData()
+    Table(
+        "outbox",
+        metadata,
+        Column("id", Integer, primary_key=True, autoincrement=True),
+        Column("kind", String(30), nullable=False),
+        Column("tg_id", BigInteger, nullable=False),
+        Column("payload_json", Text, nullable=False),
+        Column("status", String(20), nullable=False),
+        Column("attempts", Integer, nullable=False),
+        Column("created_at", DateTime, nullable=False),
+        Column("claimed_at", DateTime, nullable=True),
+        Index("ix_outbox_status_id", "status", "id"),
+    )
+    metadata.create_all(conn)
+
+
+def _request_idempotency(conn: Connection) -> None:
+    add_column(conn, "supply_requests", Column("idempotency_key", String(64), nullable=True))
+    # Keep one response per (request, supplier) so the unique index can be built:
+    # the selected one if any, otherwise the earliest.
+    result = conn.execute(
+        text(
+            "DELETE FROM supplier_responses WHERE id <> ("
+            "SELECT keep.id FROM supplier_responses keep "
+            "WHERE keep.request_id = supplier_responses.request_id "
+            "AND keep.supplier_id = supplier_responses.supplier_id "
+            "ORDER BY CASE WHEN keep.status = 'selected' THEN 0 ELSE 1 END, keep.id LIMIT 1)"
+        )
+    )
+    if result.rowcount:
+        logger.info("Removed %s duplicate supplier responses", result.rowcount)
+
+
+def _unique_keys(conn: Connection) -> None:
+    create_index(
+        conn,
+        "ux_supply_requests_idempotency_key",
+        "supply_requests",
+        ["idempotency_key"],
+        unique=True,
+    )
+    create_index(
+        conn,
+        "ux_supplier_responses_request_supplier",
+        "supplier_responses",
+        ["request_id", "supplier_id"],
+        unique=True,
+    )
+
+
+def _users_blocked_at(conn: Connection) -> None:
+    add_column(conn, "users", Column("blocked_at", DateTime, nullable=True))
+    create_index(conn, "ix_users_blocked_at", "users", ["blocked_at"])
+
+
+# Frozen copies of the app.parsing functions each backfill used, so changes to
+# the parser do not rewrite what a historical migration produces.
+_NUMBER_V1 = r"(?>\d+(?:[ \u00a0]\d{3})*(?:[.,]\d+)?)"
+_PRICE_MULTIPLIERS_V1 = {"млн": 1_000_000, "тыс": 1000, "т.": 1000, "к": 1000, "k": 1000}
+_PRICE_TERM_V1 = rf"({_NUMBER_V1})(?:\s*(млн|тыс|т\.|к|k)(?!\w))?"
+_PRICE_RE_V1 = re.compile(_PRICE_TERM_V1, re.IGNORECASE)
+_PRICE_RE_V2 = re.compile(
+    rf"{_PRICE_TERM_V1}(?:\s*(?:тг|тенге|₸)\.?)?(?:\s*(?:[-–—]|до)\s*{_PRICE_TERM_V1})?",
+    re.IGNORECASE,
+)
+_ETA_RE_V1 = re.compile(
+    rf"({_NUMBER_V1})(?:\s*[-–—]\s*({_NUMBER_V1}))?\s*(час|ч\b|д|сут|раб|нед|мес)?",
+    re.IGNORECASE,
+)
+_ETA_RE_V2 = re.compile(
+    rf"({_NUMBER_V1})(?:\s*[-–—]\s*({_NUMBER_V1}))?\s*(мин|час|ч\b|д|сут|раб|нед|мес)?",
+    re.IGNORECASE,
+)
+_ETA_UNITS_V1 = {"час": 1 / 24, "ч": 1 / 24, "д": 1, "сут": 1, "раб": 1, "нед": 7, "мес": 30}
+_ETA_UNITS_V2 = {"мин": 1 / 1440, **_ETA_UNITS_V1}
+_ETA_WORDS_V1 = {"сегодня": 0, "послезавтра": 2, "завтра": 1, "неделя": 7, "месяц": 30}
+
+
+def _number_v1(raw: str) -> float:
+    return float(raw.replace(" ", "").replace("\u00a0", "").replace(",", "."))
+
+
+def _parse_price_v1(raw: str) -> int | None:
+    if raw.strip() == "Цена уточняется":
+        return None
+    match = _PRICE_RE_V1.search(raw)
+    if match is None:
+        return None
+    multiplier = _PRICE_MULTIPLIERS_V1.get((match.group(2) or "").lower(), 1)
+    return round(_number_v1(match.group(1)) * multiplier)
+
+
+def _parse_price_v2(raw: str) -> int | None:
+    if raw.strip() == "Цена уточняется":
+        return None
+    match = _PRICE_RE_V2.search(raw)
+    if match is None:
+        return None
+    low, low_unit, high, high_unit = match.groups()
+    high_unit = (high_unit or "").lower()
+    low_unit = (low_unit or "").lower() or high_unit
+    value = _number_v1(low) * _PRICE_MULTIPLIERS_V1.get(low_unit, 1)
+    if high is not None:
+        value = max(value, _number_v1(high) * _PRICE_MULTIPLIERS_V1.get(high_unit, 1))
+    return round(value)
+
+
+def _parse_eta_days_v1(raw: str) -> int | None:
+    return _parse_eta_days(raw, _ETA_RE_V1, _ETA_UNITS_V1)
+
+
+def _parse_eta_days_v2(raw: str) -> int | None:
+    return _parse_eta_days(raw, _ETA_RE_V2, _ETA_UNITS_V2)
+
+
+def _parse_eta_days(raw: str, pattern: re.Pattern, units: dict[str, float]) -> int | None:
+    text = raw.lower()
+    match = pattern.search(text)
+    if match is None:
+        for word, days in _ETA_WORDS_V1.items():
+            if word in text:
+                return days
+        return None
+    value = _number_v1(match.group(2) or match.group(1))
+    unit = (match.group(3) or "д").lower()
+    return math.ceil(value * units[unit])
+
+
+def _response_sort_keys(conn: Connection) -> None:
+    add_column(conn, "supplier_responses", Column("price_value", BigInteger, nullable=True))
+    add_column(conn, "supplier_responses", Column("eta_days", Integer, nullable=True))
+    # Backfill in short batches so each UPDATE holds the write lock briefly.
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            text(
+                "SELECT id, price_text, eta_text FROM supplier_responses "
+                "WHERE id > :last_id ORDER BY id LIMIT :limit"
+            ),
+            {"last_id": last_id, "limit": BACKFILL_BATCH},
+        ).all()
+        if not rows:
+            break
+        conn.execute(
+            text("UPDATE supplier_responses SET price_value = :price, eta_days = :eta WHERE id = :id"),
+            [
+                {
+                    "id": row.id,
+                    "price": _parse_price_v1(row.price_text),
+                    "eta": _parse_eta_days_v1(row.eta_text),
+                }
+                for row in rows
+            ],
+        )
+        last_id = rows[-1].id
+    create_index(
+        conn, "ix_supplier_responses_request_price", "supplier_responses", ["request_id", "price_value"]
+    )
+    create_index(
+        conn, "ix_supplier_responses_request_eta", "supplier_responses", ["request_id", "eta_days"]
+    )
+
+
+def _users_seen_requests(conn: Connection) -> None:
+    add_column(
+        conn, "users", Column("seen_request_id", Integer, nullable=False, server_default="0")
+    )
+    add_column(conn, "users", Column("seen_request_extra", Text, nullable=True))
+
+
+def _request_search_text(conn: Connection) -> None:
+    add_column(
+        conn,
+        "supply_requests",
+        Column("search_text", Text, nullable=False, server_default=text("''")),
+    )
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            text(
+                "SELECT id, text FROM supply_requests "
+                "WHERE id > :last_id ORDER BY id LIMIT :limit"
+            ),
+            {"last_id": last_id, "limit": BACKFILL_BATCH},
+        ).all()
+        if not rows:
+            break
+        # Frozen copy of app.inline.normalize_query as of this migration.
+        conn.execute(
+            text("UPDATE supply_requests SET search_text = :search_text WHERE id = :id"),
+            [{"id": row.id, "search_text": " ".join(row.text.split()).casefold()} for row in rows],
+        )
+        last_id = rows[-1].id
+
+
+def _outbox_retries(conn: Connection) -> None:
+    add_column(conn, "outbox", Column("next_attempt_at", DateTime, nullable=True))
+
+
+def _response_sort_keys_reparse(conn: Connection) -> None:
+    # Ranges like "от 100 до 200 тыс" were stored by their first number and
+    # ETAs in minutes as days.
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            text(
+                "SELECT id, price_text, eta_text, price_value, eta_days FROM supplier_responses "
+                "WHERE id > :last_id ORDER BY id LIMIT :limit"
+            ),
+            {"last_id": last_id, "limit": BACKFILL_BATCH},
+        ).all()
+        if not rows:
+            break
+        changed = []
+        for row in rows:
+            price = _parse_price_v2(row.price_text)
+            eta = _parse_eta_days_v2(row.eta_text)
+            if (price, eta) != (row.price_value, row.eta_days):
+                changed.append({"id": row.id, "price": price, "eta": eta})
+        if changed:
+            conn.execute(
+                text(
+                    "UPDATE supplier_responses SET price_value = :price, eta_days = :eta "
+                    "WHERE id = :id"
+                ),
+                changed,
+            )
+        last_id = rows[-1].id
+
+
+MIGRATIONS: list[Migration] = [
+    Migration(1, "initial_schema", _initial_schema),
+    Migration(2, "feed_indexes", _feed_indexes, transactional=False),
+    Migration(3, "outbox", _outbox),
+    Migration(4, "request_idempotency", _request_idempotency),
+    Migration(5, "unique_keys", _unique_keys, transactional=False),
+    Migration(6, "users_blocked_at", _users_blocked_at, transactional=False),
+    Migration(7, "response_sort_keys", _response_sort_keys, transactional=False),
+    Migration(8, "users_seen_requests", _users_seen_requests),
+    Migration(9, "request_search_text", _request_search_text, transactional=False),
+    Migration(10, "outbox_retries", _outbox_retries),
+    Migration(11, "response_sort_keys_reparse", _response_sort_keys_reparse, transactional=False),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def _ensure_version_table(conn: Connection) -> None:
+    metadata = MetaData()
+    Table(
+        VERSION_TABLE,
+        metadata,
+        Column("version", Integer, primary_key=True, autoincrement=False),
+        Column("name", String(255), nullable=False),
+        Column("applied_at", DateTime, nullable=False),
+    )
+    metadata.create_all(conn)
+
+
+def current_version(conn: Connection) -> int:
+    if not inspect(conn).has_table(VERSION_TABLE):
+        return 0
+    value = conn.execute(text(f"SELECT MAX(version) FROM {VERSION_TABLE}")).scalar()
+    return int(value or 0)
+
+
+def _record(conn: Connection, migration: Migration) -> None:
+    conn.execute(
+        text(
+            f"INSERT INTO {VERSION_TABLE} (version, name, applied_at) "
+            "VALUES (:version, :name, :applied_at)"
+        ),
+        {"version": migration.version, "name": migration.name, "applied_at": datetime.utcnow()},
+    )
+
+
+async def migrate(engine: AsyncEngine) -> list[int]:
+    async with engine.begin() as conn:
+        await conn.run_sync(_ensure_version_table)
+        version = await conn.run_sync(current_version)
+
+    applied: list[int] = []
+    for migration in MIGRATIONS:
+        if migration.version <= version:
+            continue
+        logger.info("Applying migration %s_%s", migration.version, migration.name)
+        if migration.transactional:
+            async with engine.begin() as conn:
+                await conn.run_sync(migration.upgrade)
+                await conn.run_sync(_record, migration)
+        else:
+            async with engine.connect() as conn:
+                conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+                await conn.run_sync(migration.upgrade)
+                await conn.run_sync(_record, migration)
+        applied.append(migration.version)
+    return applied
+
+
+async def main() -> None:
+    from app.db import make_engine
+
+    logging.basicConfig(level=logging.INFO)
+    engine = make_engine(load_database_url())
+    try:
+        applied = await migrate(engine)
+    finally:
+        await engine.dispose()
+    if applied:
+        logger.info("Database migrated to version %s", applied[-1])
+    else:
+        logger.info("Database is up to date (version %s)", LATEST_VERSION)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import BigInteger, DateTime, ForeignKey, Integer, String, Text
+from sqlalchemy import BigInteger, DateTime, ForeignKey, Index, Integer, String, Text
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
 
@@ -10,6 +10,10 @@ class Base(DeclarativeBase):
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        Index("ix_users_role_registered", "role", "is_registered"),
+        Index("ix_users_blocked_at", "blocked_at"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     tg_id: Mapped[int] = mapped_column(BigInteger, unique=True, index=True)
@@ -19,6 +23,9 @@ class User(Base):
     role: Mapped[str] = mapped_column(String(30), default="consumer")
     is_registered: Mapped[int] = mapped_column(Integer, default=0)
     sent_requests_count: Mapped[int] = mapped_column(Integer, default=0)
+    blocked_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    seen_request_id: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    seen_request_extra: Mapped[str | None] = mapped_column(Text, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
     requests: Mapped[list["SupplyRequest"]] = relationship(
@@ -31,12 +38,19 @@ class User(Base):
 
 class SupplyRequest(Base):
     __tablename__ = "supply_requests"
+    __table_args__ = (
+        Index("ix_supply_requests_status_id", "status", "id"),
+        Index("ix_supply_requests_consumer_status_id", "consumer_id", "status", "id"),
+        Index("ux_supply_requests_idempotency_key", "idempotency_key", unique=True),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     consumer_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
     text: Mapped[str] = mapped_column(Text)
+    search_text: Mapped[str] = mapped_column(Text, default="", server_default="")
     photos_json: Mapped[str] = mapped_column(Text, default="[]")
     status: Mapped[str] = mapped_column(String(20), default="open")  # open/closed
+    idempotency_key: Mapped[str | None] = mapped_column(String(64), nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
     consumer: Mapped[User] = relationship(back_populates="requests", foreign_keys=[consumer_id])
@@ -45,12 +59,19 @@ class SupplyRequest(Base):
 
 class SupplierResponse(Base):
     __tablename__ = "supplier_responses"
+    __table_args__ = (
+        Index("ux_supplier_responses_request_supplier", "request_id", "supplier_id", unique=True),
+        Index("ix_supplier_responses_request_price", "request_id", "price_value"),
+        Index("ix_supplier_responses_request_eta", "request_id", "eta_days"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     request_id: Mapped[int] = mapped_column(ForeignKey("supply_requests.id"), index=True)
     supplier_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
     price_text: Mapped[str] = mapped_column(String(255))
     eta_text: Mapped[str] = mapped_column(String(255))
+    price_value: Mapped[int | None] = mapped_column(BigInteger, nullable=True)  # tenge
+    eta_days: Mapped[int | None] = mapped_column(Integer, nullable=True)
     description: Mapped[str] = mapped_column(Text)
     photos_json: Mapped[str] = mapped_column(Text, default="[]")
     status: Mapped[str] = mapped_column(String(20), default="pending")  # pending/selected
@@ -58,3 +79,18 @@ class SupplierResponse(Base):
 
     request: Mapped[SupplyRequest] = relationship(back_populates="responses")
     supplier: Mapped[User] = relationship(back_populates="responses", foreign_keys=[supplier_id])
+
+
+class OutboxMessage(Base):
+    __tablename__ = "outbox"
+    __table_args__ = (Index("ix_outbox_status_id", "status", "id"),)
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    kind: Mapped[str] = mapped_column(String(30))  # new_request/broadcast/responses
+    tg_id: Mapped[int] = mapped_column(BigInteger)
+    payload_json: Mapped[str] = mapped_column(Text, default="{}")
+    status: Mapped[str] = mapped_column(String(20), default="pending")  # pending/processing/sent/failed/blocked
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    claimed_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    next_attempt_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
@@ -0,0 +1,67 @@
+import math
+import re
+
+
+PRICE_TBD = "Цена уточняется"
+
+# Atomic, so a failed match after the number cannot split "150 000" into "150".
+_NUMBER = r"(?>\d+(?:[ \u00a0]\d{3})*(?:[.,]\d+)?)"
+# The multiplier must end the word ("20к", not "20кг"); any other suffix
+# such as "тг", "тенге" or "₸" may follow the number directly.
+_PRICE_TERM = rf"({_NUMBER})(?:\s*(млн|тыс|т\.|к|k)(?!\w))?"
+_CURRENCY = r"(?:\s*(?:тг|тенге|₸)\.?)?"
+_PRICE_RE = re.compile(
+    rf"{_PRICE_TERM}{_CURRENCY}(?:\s*(?:[-–—]|до)\s*{_PRICE_TERM})?", re.IGNORECASE
+)
+_PRICE_MULTIPLIERS = {"млн": 1_000_000, "тыс": 1000, "т.": 1000, "к": 1000, "k": 1000}
+
+_ETA_RE = re.compile(
+    rf"({_NUMBER})(?:\s*[-–—]\s*({_NUMBER}))?\s*(мин|час|ч\b|д|сут|раб|нед|мес)?",
+    re.IGNORECASE,
+)
+_ETA_UNITS = {
+    "мин": 1 / 1440,
+    "час": 1 / 24,
+    "ч": 1 / 24,
+    "д": 1,
+    "сут": 1,
+    "раб": 1,
+    "нед": 7,
+    "мес": 30,
+}
+_ETA_WORDS = {"сегодня": 0, "послезавтра": 2, "завтра": 1, "неделя": 7, "месяц": 30}
+
+
+def _number(raw: str) -> float:
+    return float(raw.replace(" ", "").replace("\u00a0", "").replace(",", "."))
+
+
+def parse_price(raw: str) -> int | None:
+    if raw.strip() == PRICE_TBD:
+        return None
+    # A range like "от 100 до 200 тыс" counts by its upper bound, as ETAs do;
+    # a multiplier after the second number applies to the whole range.
+    match = _PRICE_RE.search(raw)
+    if match is None:
+        return None
+    low, low_unit, high, high_unit = match.groups()
+    high_unit = (high_unit or "").lower()
+    low_unit = (low_unit or "").lower() or high_unit
+    value = _number(low) * _PRICE_MULTIPLIERS.get(low_unit, 1)
+    if high is not None:
+        value = max(value, _number(high) * _PRICE_MULTIPLIERS.get(high_unit, 1))
+    return round(value)
+
+
+def parse_eta_days(raw: str) -> int | None:
+    # A range like "3-5 дней" counts by its upper bound.
+    text = raw.lower()
+    match = _ETA_RE.search(text)
+    if match is None:
+        for word, days in _ETA_WORDS.items():
+            if word in text:
+                return days
+        return None
+    value = _number(match.group(2) or match.group(1))
+    unit = (match.group(3) or "д").lower()
+    return math.ceil(value * _ETA_UNITS[unit])
@@ -0,0 +1,186 @@
+import asyncio
+import contextlib
+import cProfile
+import io
+import logging
+import pstats
+import time
+from collections.abc import Awaitable, Callable, Iterator
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import CallbackQuery, Message, TelegramObject
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.callbacks import handler_name
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CallStats:
+    db_calls: int = 0
+    db_time: float = 0.0
+    api_calls: int = 0
+    api_time: float = 0.0
+
+
+_current_stats: ContextVar[CallStats | None] = ContextVar("profiling_call_stats", default=None)
+
+
+@contextlib.contextmanager
+def collect_call_stats() -> Iterator[CallStats]:
+    stats = CallStats()
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+def install_db_hooks(engine: AsyncEngine) -> None:
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany) -> None:
+        conn.info.setdefault("profiling_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany) -> None:
+        _record(conn.info["profiling_started"].pop())
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(context) -> None:
+        # A failed statement never reaches after_cursor_execute.
+        stack = context.connection.info.get("profiling_started") if context.connection else None
+        if stack:
+            _record(stack.pop())
+
+    def _record(started: float) -> None:
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.db_calls += 1
+            stats.db_time += time.perf_counter() - started
+
+
+class ApiCallStatsMiddleware(BaseRequestMiddleware):
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Any:
+        stats = _current_stats.get()
+        if stats is None:
+            return await make_request(bot, method)
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        finally:
+            stats.api_calls += 1
+            stats.api_time += time.perf_counter() - started
+
+
+def _describe_event(event: TelegramObject) -> str:
+    if isinstance(event, CallbackQuery):
+        return f"callback {event.data!r}"
+    if isinstance(event, Message):
+        if event.text and event.text.startswith("/"):
+            return f"command {event.text.split()[0]!r}"
+        return f"message {event.content_type}"
+    return type(event).__name__
+
+
+class SlowHandlerMiddleware(BaseMiddleware):
+    def __init__(self, threshold_ms: int) -> None:
+        self.threshold = threshold_ms / 1000
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        with collect_call_stats() as stats:
+            started = time.perf_counter()
+            try:
+                return await handler(event, data)
+            finally:
+                elapsed = time.perf_counter() - started
+                if elapsed >= self.threshold:
+                    logger.warning(
+                        "Slow handler %s (%s): %.0f ms total, db %d calls / %.0f ms, "
+                        "api %d calls / %.0f ms",
+                        handler_name(data),
+                        _describe_event(event),
+                        elapsed * 1000,
+                        stats.db_calls,
+                        stats.db_time * 1000,
+                        stats.api_calls,
+                        stats.api_time * 1000,
+                    )
+
+
+class LoopLagMonitor:
+    def __init__(self, interval: float = 0.5, threshold_ms: int = 100) -> None:
+        self.interval = interval
+        self.threshold = threshold_ms / 1000
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+    def reset_max(self) -> float:
+        value, self.max_lag = self.max_lag, 0.0
+        return value
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - started - self.interval)
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            if lag >= self.threshold:
+                logger.warning("Event loop lag %.0f ms", lag * 1000)
+
+
+class Profiler:
+    def __init__(self, lag_monitor: LoopLagMonitor, capture_seconds: int = 30) -> None:
+        self.lag_monitor = lag_monitor
+        self.capture_seconds = capture_seconds
+        self._running = False
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    async def capture(self, seconds: int | None = None) -> bytes:
+        if self._running:
+            raise RuntimeError("Profiler is already running.")
+        seconds = seconds or self.capture_seconds
+        self._running = True
+        self.lag_monitor.reset_max()
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profile.disable()
+            self._running = False
+
+        stream = io.StringIO()
+        stream.write(
+            f"Capture window: {seconds} s\n"
+            f"Max event loop lag: {self.lag_monitor.reset_max() * 1000:.0f} ms\n\n"
+        )
+        stats = pstats.Stats(profile, stream=stream)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(80)
+        stats.sort_stats(pstats.SortKey.TIME).print_stats(40)
+        return stream.getvalue().encode()
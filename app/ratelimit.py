@@ -0,0 +1,145 @@
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, TelegramObject, User
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens: float, updated: float) -> None:
+        self.tokens = tokens
+        self.updated = updated
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        rate: float,
+        burst: float,
+        idle_ttl: float = 600.0,
+        maxsize: int = 100_000,
+    ) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.idle_ttl = idle_ttl
+        self.maxsize = maxsize
+        self._buckets: OrderedDict[Hashable, TokenBucket] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def _evict(self, now: float) -> None:
+        # Buckets are kept in last-use order, so idle ones are always at the front.
+        while self._buckets:
+            key, bucket = next(iter(self._buckets.items()))
+            if bucket.updated >= now - self.idle_ttl and len(self._buckets) <= self.maxsize:
+                break
+            self._buckets.pop(key)
+
+    def allow(self, key: Hashable, cost: float = 1.0, now: float | None = None) -> bool:
+        now = time.monotonic() if now is None else now
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(self.burst, now)
+            self._buckets[key] = bucket
+        else:
+            bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+            bucket.updated = now
+            self._buckets.move_to_end(key)
+        self._evict(now)
+        if bucket.tokens < cost:
+            return False
+        bucket.tokens -= cost
+        return True
+
+
+class RecentKeys:
+    def __init__(self, ttl: float, maxsize: int = 100_000) -> None:
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._expires: OrderedDict[Hashable, float] = OrderedDict()
+
+    def seen(self, key: Hashable, now: float | None = None) -> bool:
+        now = time.monotonic() if now is None else now
+        while self._expires:
+            oldest_key, expires = next(iter(self._expires.items()))
+            if expires > now and len(self._expires) < self.maxsize:
+                break
+            self._expires.pop(oldest_key)
+        if key in self._expires:
+            return True
+        self._expires[key] = now + self.ttl
+        return False
+
+
+def parse_action_quotas(raw: str) -> dict[str, tuple[int, float]]:
+    quotas: dict[str, tuple[int, float]] = {}
+    for part in raw.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        action, _, quota = part.rpartition("=")
+        count, _, seconds = quota.partition("/")
+        if not action or not count.isdigit() or not seconds:
+            raise RuntimeError(f"Invalid rate limit quota: {part!r}")
+        quotas[action.strip()] = (int(count), float(seconds))
+    return quotas
+
+
+class RateLimitMiddleware(BaseMiddleware):
+    def __init__(
+        self,
+        user_rate: float,
+        user_burst: float,
+        global_rate: float,
+        global_burst: float,
+        action_quotas: dict[str, tuple[int, float]] | None = None,
+        idempotent_actions: set[str] | None = None,
+        idempotency_ttl: float = 10.0,
+    ) -> None:
+        self.users = RateLimiter(user_rate, user_burst)
+        self.global_limiter = RateLimiter(global_rate, global_burst)
+        self.actions = {
+            action: RateLimiter(count / seconds, count, idle_ttl=max(seconds, 60.0))
+            for action, (count, seconds) in (action_quotas or {}).items()
+        }
+        self.idempotent_actions = idempotent_actions or set()
+        self.recent_confirms = RecentKeys(idempotency_ttl)
+
+    def _allowed(self, event: TelegramObject, user: User) -> bool:
+        if not self.global_limiter.allow(None) or not self.users.allow(user.id):
+            return False
+        if isinstance(event, CallbackQuery) and event.data:
+            limiter = self.actions.get(event.data)
+            if limiter is not None and not limiter.allow(user.id):
+                return False
+        return True
+
+    def _is_duplicate(self, event: TelegramObject, user: User) -> bool:
+        if not isinstance(event, CallbackQuery) or event.data not in self.idempotent_actions:
+            return False
+        message_id = event.message.message_id if event.message else event.inline_message_id
+        return self.recent_confirms.seen((user.id, message_id, event.data))
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        user: User | None = data.get("event_from_user")
+        if user is None:
+            return await handler(event, data)
+        if not self._allowed(event, user):
+            if isinstance(event, CallbackQuery):
+                await event.answer("Слишком часто. Подождите немного.")
+            return None
+        if self._is_duplicate(event, user):
+            if isinstance(event, CallbackQuery):
+                await event.answer("Уже обрабатывается.")
+            return None
+        return await handler(event, data)
@@ -0,0 +1,345 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import defaultdict
+from collections.abc import Awaitable, Callable
+from datetime import datetime
+from typing import Any
+
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import Chat, Message, TelegramObject, Update, User
+
+from app import db, migrations
+from app.albums import AlbumBuffer
+from app.callbacks import handler_name
+from app.carousel import CarouselStore
+from app.events import EventBus
+from app.handlers import router
+from app.inline import InlineResultCache, subscribe_cache_invalidation
+from app.profiling import ApiCallStatsMiddleware, collect_call_stats, install_db_hooks
+from app.services import ProcessGate, ResponseDebouncer, outbox_worker, subscribe_notifications
+from app.snapshots import sqlite_path
+
+
+logger = logging.getLogger(__name__)
+
+REPLAY_DATABASE_URL = "sqlite+aiosqlite:///./data/replay.db"
+# Scaled copies of a user get ids shifted by this step, far above real Telegram ids.
+ID_STRIDE = 10**13
+_USER_KEYS = {"from", "chat", "user", "sender_chat"}
+
+
+class UpdateRecorder(BaseMiddleware):
+    def __init__(self, path: str) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._fh = open(path, "a", encoding="utf-8")
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        record = {
+            "ts": time.time(),
+            "update": event.model_dump(mode="json", exclude_none=True, by_alias=True),
+        }
+        self._fh.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._fh.flush()
+        return await handler(event, data)
+
+    def close(self) -> None:
+        self._fh.close()
+
+
+class ReplaySession(BaseSession):
+    def __init__(self, latency: float = 0.0) -> None:
+        super().__init__()
+        self.latency = latency
+        self.calls: dict[str, int] = defaultdict(int)
+        self._message_id = 0
+
+    def _message(self, method: TelegramMethod[Any]) -> Message:
+        self._message_id += 1
+        chat_id = getattr(method, "chat_id", None)
+        return Message(
+            message_id=self._message_id,
+            date=datetime.now(),
+            chat=Chat(id=chat_id if isinstance(chat_id, int) else 0, type="private"),
+        )
+
+    async def make_request(
+        self,
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+        timeout: int | None = None,
+    ) -> TelegramType:
+        self.calls[method.__api_method__] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        returning = method.__returning__
+        if returning is Message:
+            return self._message(method)
+        if getattr(returning, "__origin__", None) is list:
+            return [self._message(method)]
+        if returning is User:
+            return User(id=0, is_bot=True, first_name="replay")
+        return True
+
+    async def stream_content(self, *args: Any, **kwargs: Any):
+        yield b""
+
+    async def close(self) -> None:
+        pass
+
+
+def remap_ids(data: Any, copy_index: int, parent_key: str | None = None) -> Any:
+    if not copy_index:
+        return data
+    shift = copy_index * ID_STRIDE
+    if isinstance(data, dict):
+        remapped = {}
+        for key, value in data.items():
+            if key == "id" and parent_key in _USER_KEYS and isinstance(value, int):
+                remapped[key] = value + shift if value > 0 else value - shift
+            elif key in ("user_id", "chat_id") and isinstance(value, int):
+                remapped[key] = value + shift
+            else:
+                remapped[key] = remap_ids(value, copy_index, key)
+        return remapped
+    if isinstance(data, list):
+        return [remap_ids(item, copy_index, parent_key) for item in data]
+    return data
+
+
+def load_records(path: str) -> list[tuple[float, dict]]:
+    records = []
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if "update" in record:
+                records.append((float(record.get("ts", 0.0)), record["update"]))
+            else:
+                records.append((0.0, record))
+    records.sort(key=lambda item: item[0])
+    return records
+
+
+class HandlerStats(BaseMiddleware):
+    def __init__(self) -> None:
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.db_calls: dict[str, int] = defaultdict(int)
+        self.api_calls: dict[str, int] = defaultdict(int)
+        self.errors = 0
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        name = handler_name(data)
+        with collect_call_stats() as stats:
+            started = time.perf_counter()
+            try:
+                return await handler(event, data)
+            except Exception:
+                self.errors += 1
+                raise
+            finally:
+                self.latencies[name].append(time.perf_counter() - started)
+                self.db_calls[name] += stats.db_calls
+                self.api_calls[name] += stats.api_calls
+
+
+def _user_id(update: Update) -> int | None:
+    from_user = getattr(update.event, "from_user", None)
+    return from_user.id if from_user is not None else None
+
+
+async def _feed_user_updates(
+    dp: Dispatcher,
+    bot: Bot,
+    queue: asyncio.Queue,
+    context: dict[str, Any],
+) -> None:
+    while True:
+        update = await queue.get()
+        if update is None:
+            return
+        try:
+            await dp.feed_update(bot, update, **context)
+        except Exception:
+            logger.debug("Replayed update %s failed", update.update_id, exc_info=True)
+
+
+def _percentile(values: list[float], q: float) -> float:
+    index = min(len(values) - 1, max(0, round(q * len(values)) - 1))
+    return values[index]
+
+
+def format_report(stats: HandlerStats, session: ReplaySession, updates: int, elapsed: float) -> str:
+    lines = [
+        f"Updates: {updates} in {elapsed:.1f} s ({updates / max(elapsed, 1e-9):.0f}/s), "
+        f"handler errors: {stats.errors}",
+        "",
+        f"{'handler':<32} {'calls':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} "
+        f"{'db/call':>8} {'api/call':>8}",
+    ]
+    for name, values in sorted(stats.latencies.items(), key=lambda item: -len(item[1])):
+        values = sorted(values)
+        count = len(values)
+        lines.append(
+            f"{name:<32} {count:>7} "
+            f"{_percentile(values, 0.50) * 1000:>8.1f} "
+            f"{_percentile(values, 0.95) * 1000:>8.1f} "
+            f"{_percentile(values, 0.99) * 1000:>8.1f} "
+            f"{values[-1] * 1000:>8.1f} "
+            f"{stats.db_calls[name] / count:>8.1f} "
+            f"{stats.api_calls[name] / count:>8.1f}"
+        )
+    lines.append("")
+    lines.append(f"DB statements in handlers: {sum(stats.db_calls.values())}")
+    lines.append(
+        "Bot API calls: "
+        + ", ".join(f"{method}={count}" for method, count in sorted(session.calls.items()))
+    )
+    return "\n".join(lines)
+
+
+async def replay(
+    path: str,
+    database_url: str = REPLAY_DATABASE_URL,
+    speed: float = 1.0,
+    scale: int = 1,
+    admin_ids: set[int] | None = None,
+    api_latency: float = 0.0,
+) -> str:
+    records = load_records(path)
+    if not records:
+        return "No updates recorded."
+
+    database_path = sqlite_path(database_url)
+    if database_path:
+        os.makedirs(os.path.dirname(os.path.abspath(database_path)), exist_ok=True)
+    db.init_db(database_url)
+    await migrations.migrate(db.engine)
+    install_db_hooks(db.engine)
+
+    session = ReplaySession(latency=api_latency)
+    session.middleware(ApiCallStatsMiddleware())
+    bot = Bot(token="42:replay", session=session)
+    dp = Dispatcher()
+    dp.include_router(router)
+    stats = HandlerStats()
+    for observer in (router.message, router.callback_query, router.inline_query):
+        observer.middleware(stats)
+
+    gate = ProcessGate()
+    events = EventBus()
+    inline_cache = InlineResultCache()
+    debouncer = ResponseDebouncer(bot, gate, db.session_factory)
+    subscribe_notifications(events, bot, debouncer, db.session_factory)
+    subscribe_cache_invalidation(events, inline_cache)
+    admins = {admin_id + i * ID_STRIDE for admin_id in admin_ids or set() for i in range(scale)}
+    context = {
+        "gate": gate,
+        "carousels": CarouselStore(),
+        "albums": AlbumBuffer(),
+        "inline_cache": inline_cache,
+        "events": events,
+        "admin_ids": admins,
+        "profiler": None,
+        "snapshotter": None,
+    }
+    write_buffer = db.get_write_buffer()
+    stop_workers = asyncio.Event()
+    background = [
+        asyncio.create_task(write_buffer.run()),
+        asyncio.create_task(events.run()),
+        asyncio.create_task(outbox_worker(bot, gate, db.session_factory, stop=stop_workers)),
+    ]
+
+    loop = asyncio.get_running_loop()
+    first_ts = records[0][0]
+    started = loop.time()
+    # One queue per user keeps each user's updates in order, as a real client
+    # would send them; only different users are handled concurrently.
+    queues: dict[int, asyncio.Queue] = {}
+    tasks: list[asyncio.Task] = []
+    updates = 0
+    for ts, raw in records:
+        if speed > 0 and ts:
+            delay = started + (ts - first_ts) / speed - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        for copy_index in range(scale):
+            data = remap_ids(raw, copy_index)
+            data["update_id"] = raw["update_id"] * scale + copy_index
+            update = Update.model_validate(data, context={"bot": bot})
+            user_id = _user_id(update)
+            if user_id is None:
+                tasks.append(asyncio.create_task(dp.feed_update(bot, update, **context)))
+            else:
+                queue = queues.get(user_id)
+                if queue is None:
+                    queue = queues[user_id] = asyncio.Queue()
+                    tasks.append(asyncio.create_task(_feed_user_updates(dp, bot, queue, context)))
+                queue.put_nowait(update)
+            updates += 1
+    for queue in queues.values():
+        queue.put_nowait(None)
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await events.drain(30)
+    await debouncer.close()
+    elapsed = loop.time() - started
+
+    stop_workers.set()
+    await asyncio.wait(background[2:], timeout=30)
+    background[0].cancel()
+    background[1].cancel()
+    await asyncio.gather(*background, return_exceptions=True)
+    await write_buffer.flush()
+    await db.engine.dispose()
+    return format_report(stats, session, updates, elapsed)
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Replay recorded updates against the dispatcher.")
+    parser.add_argument("path", help="JSONL file written with RECORD_UPDATES_PATH")
+    parser.add_argument("--database-url", default=REPLAY_DATABASE_URL)
+    parser.add_argument("--speed", type=float, default=1.0, help="time compression, 0 = no pauses")
+    parser.add_argument("--scale", type=int, default=1, help="copies of every user")
+    parser.add_argument("--admin-ids", default="", help="comma separated admin tg ids")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="fake Bot API latency, s")
+    return parser.parse_args()
+
+
+async def main() -> None:
+    logging.basicConfig(level=logging.WARNING)
+    args = _parse_args()
+    admin_ids = {int(value) for value in args.admin_ids.split(",") if value.strip().isdigit()}
+    report = await replay(
+        args.path,
+        database_url=args.database_url,
+        speed=args.speed,
+        scale=max(1, args.scale),
+        admin_ids=admin_ids,
+        api_latency=args.api_latency,
+    )
+    print(report)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
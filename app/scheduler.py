@@ -0,0 +1,137 @@
+import asyncio
+import contextlib
+from collections import deque
+from collections.abc import Iterator
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Any
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+
+
+class Lane(IntEnum):
+    INTERACTIVE = 0
+    DIRECT = 1
+    FANOUT = 2
+    BROADCAST = 3
+
+
+DEFAULT_LANE_WEIGHTS = {
+    Lane.INTERACTIVE: 16,
+    Lane.DIRECT: 8,
+    Lane.FANOUT: 4,
+    Lane.BROADCAST: 1,
+}
+
+THROTTLED_PREFIXES = ("send", "copy", "forward", "edit")
+
+_current_lane: ContextVar[Lane] = ContextVar("send_lane", default=Lane.INTERACTIVE)
+
+
+@contextlib.contextmanager
+def send_lane(lane: Lane) -> Iterator[None]:
+    token = _current_lane.set(lane)
+    try:
+        yield
+    finally:
+        _current_lane.reset(token)
+
+
+def current_lane() -> Lane:
+    return _current_lane.get()
+
+
+class SendScheduler:
+    def __init__(
+        self,
+        rate: float = 30.0,
+        burst: float = 30.0,
+        weights: dict[Lane, int] | None = None,
+    ) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.weights = weights or DEFAULT_LANE_WEIGHTS
+        self._tokens = burst
+        self._updated: float | None = None
+        self._queues: dict[Lane, deque[asyncio.Future]] = {lane: deque() for lane in Lane}
+        self._credits = dict(self.weights)
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def _refill(self, now: float) -> None:
+        if self._updated is not None:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _next_lane(self) -> Lane | None:
+        for queue in self._queues.values():
+            while queue and queue[0].done():
+                queue.popleft()
+        waiting = [lane for lane in Lane if self._queues[lane]]
+        if not waiting:
+            return None
+        for lane in waiting:
+            if self._credits[lane] > 0:
+                return lane
+        # Every waiting lane used up its share: start a new round.
+        for lane in Lane:
+            self._credits[lane] = self.weights[lane]
+        return waiting[0]
+
+    def queued(self) -> dict[Lane, int]:
+        return {lane: len(queue) for lane, queue in self._queues.items()}
+
+    async def acquire(self, lane: Lane) -> None:
+        loop = asyncio.get_running_loop()
+        self._refill(loop.time())
+        if self._tokens >= 1 and self._next_lane() is None:
+            self._tokens -= 1
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        future = loop.create_future()
+        self._queues[lane].append(future)
+        self._wakeup.set()
+        await future
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            lane = self._next_lane()
+            if lane is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            self._refill(loop.time())
+            if self._tokens < 1:
+                # Re-pick the lane after sleeping so newly queued interactive sends go first.
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                continue
+            self._tokens -= 1
+            self._credits[lane] -= 1
+            self._queues[lane].popleft().set_result(None)
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+
+class PrioritySendMiddleware(BaseRequestMiddleware):
+    def __init__(self, scheduler: SendScheduler) -> None:
+        self.scheduler = scheduler
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Any:
+        if method.__api_method__.startswith(THROTTLED_PREFIXES):
+            await self.scheduler.acquire(current_lane())
+        return await make_request(bot, method)
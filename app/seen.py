@@ -0,0 +1,45 @@
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+
+
+MAX_EXTRA = 256
+
+
+@dataclass
+class SeenSet:
+    watermark: int = 0
+    extra: set[int] = field(default_factory=set)
+
+    @classmethod
+    def unpack(cls, watermark: int, raw: str | None) -> "SeenSet":
+        extra = {int(item) for item in raw.split(",")} if raw else set()
+        return cls(watermark, {item for item in extra if item > watermark})
+
+    def pack(self) -> str | None:
+        return ",".join(str(item) for item in sorted(self.extra)) or None
+
+    def __contains__(self, request_id: int) -> bool:
+        return request_id <= self.watermark or request_id in self.extra
+
+    def add(self, request_ids: Iterable[int]) -> None:
+        self.extra.update(item for item in request_ids if item > self.watermark)
+        self._compact()
+
+    def raise_watermark(self, request_id: int) -> None:
+        if request_id <= self.watermark:
+            return
+        self.watermark = request_id
+        self.extra = {item for item in self.extra if item > request_id}
+        self._compact()
+
+    def merge(self, other: "SeenSet") -> None:
+        self.raise_watermark(other.watermark)
+        self.add(other.extra)
+
+    def _compact(self) -> None:
+        while self.watermark + 1 in self.extra:
+            self.watermark += 1
+            self.extra.remove(self.watermark)
+        if len(self.extra) > MAX_EXTRA:
+            # Keeps the row small: the oldest gaps are given up and count as seen.
+            self.raise_watermark(sorted(self.extra)[-MAX_EXTRA - 1])
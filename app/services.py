@@ -1,15 +1,42 @@
 import asyncio
-import json
+import contextlib
+import hashlib
+import logging
+from collections.abc import AsyncIterator
 from dataclasses import dataclass
 from datetime import datetime, timedelta
+from functools import partial
 
 from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramRetryAfter,
+)
 from aiogram.types import InputMediaDocument, InputMediaPhoto
-from sqlalchemy import select
+from sqlalchemy import ColumnElement, and_, delete, insert, or_, select, update
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm.attributes import set_committed_value
 
-from app import keyboards
-from app.models import SupplierResponse, SupplyRequest, User
+from app import codec, db, keyboards
+from app.events import EventBus, ResponseCreated, ResponseSelected
+from app.models import OutboxMessage, SupplierResponse, SupplyRequest, User
+from app.scheduler import Lane, send_lane
+from app.tracing import span
+
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_CLAIM_TIMEOUT = 600
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_RETRY_DELAY = 30
+OUTBOX_RETRY_MAX_DELAY = 3600
+OUTBOX_RETENTION = 7 * 24 * 3600
+OUTBOX_PURGE_INTERVAL = 3600
+BLOCKED_REPROBE_INTERVAL = 7 * 24 * 3600
+CAPTION_LIMIT = 1024
+RESPONSE_DEBOUNCE_WINDOW = 10.0
+RESPONSE_DEBOUNCE_MAX_DELAY = 60.0
 
 
 def normalize_phone(raw: str) -> str:
@@ -18,18 +45,28 @@ def normalize_phone(raw: str) -> str:
 
 
 def pack_media(items: list[dict]) -> str:
-    return json.dumps(items, ensure_ascii=False)
+    return codec.dumps(items)
 
 
 def unpack_media(raw: str | None) -> list[dict]:
     if not raw:
         return []
     try:
-        return json.loads(raw)
-    except json.JSONDecodeError:
+        return codec.loads(raw)
+    except ValueError:
         return []
 
 
+def draft_idempotency_key(tg_id: int, draft: dict) -> str:
+    parts = [
+        str(tg_id),
+        str(draft.get("draft_id", "")),
+        draft.get("request_text", ""),
+        *(item.get("file_id", "") for item in draft.get("request_photos", [])),
+    ]
+    return hashlib.sha256("\x1f".join(parts).encode()).hexdigest()
+
+
 def request_text_view(request: SupplyRequest) -> str:
     return (
         f"Заявка #{request.id}\n"
@@ -56,27 +93,84 @@ def user_contact_view(user: User) -> str:
     return f"tg://user?id={user.tg_id}"
 
 
+async def send_media_group(
+    bot: Bot,
+    chat_id: int,
+    media_items: list[dict],
+    caption: str | None = None,
+) -> None:
+    with span("send_media_group", items=len(media_items)):
+        await _send_media_group(bot, chat_id, media_items, caption)
+
+
+async def _send_media_group(
+    bot: Bot,
+    chat_id: int,
+    media_items: list[dict],
+    caption: str | None,
+) -> None:
+    if len(media_items) == 1:
+        await send_media_item(bot, chat_id, media_items[0], caption)
+        return
+    media_group = []
+    for idx, item in enumerate(media_items):
+        item_caption = caption if idx == 0 else None
+        if item.get("type") == "document":
+            media_group.append(InputMediaDocument(media=item["file_id"], caption=item_caption))
+        else:
+            media_group.append(InputMediaPhoto(media=item["file_id"], caption=item_caption))
+    await bot.send_media_group(chat_id=chat_id, media=media_group)
+
+
+async def send_media_item(
+    bot: Bot,
+    chat_id: int,
+    item: dict,
+    caption: str | None = None,
+    reply_markup=None,
+) -> None:
+    if item.get("type") == "document":
+        await bot.send_document(
+            chat_id=chat_id, document=item["file_id"], caption=caption, reply_markup=reply_markup
+        )
+    else:
+        await bot.send_photo(
+            chat_id=chat_id, photo=item["file_id"], caption=caption, reply_markup=reply_markup
+        )
+
+
+def fits_caption(text: str) -> bool:
+    # Telegram counts caption length in UTF-16 code units.
+    return len(text.encode("utf-16-le")) // 2 <= CAPTION_LIMIT
+
+
 async def send_media_and_text(
     bot: Bot,
     chat_id: int,
     text: str,
     media_items: list[dict] | None = None,
     reply_markup=None,
+    album_markup=None,
 ) -> None:
     media_items = media_items or []
-    if media_items:
-        media_group = []
-        for idx, item in enumerate(media_items):
-            caption = text if idx == 0 else None
-            if item.get("type") == "document":
-                media_group.append(InputMediaDocument(media=item["file_id"], caption=caption))
-            else:
-                media_group.append(InputMediaPhoto(media=item["file_id"], caption=caption))
-        await bot.send_media_group(chat_id=chat_id, media=media_group)
-        if reply_markup:
-            await bot.send_message(chat_id=chat_id, text="Действия:", reply_markup=reply_markup)
-    else:
+    if not media_items:
+        await bot.send_message(chat_id=chat_id, text=text, reply_markup=reply_markup)
+        return
+    if not fits_caption(text):
+        await send_media_group(bot, chat_id, media_items)
         await bot.send_message(chat_id=chat_id, text=text, reply_markup=reply_markup)
+        return
+    if len(media_items) == 1:
+        await send_media_item(bot, chat_id, media_items[0], text, reply_markup)
+        return
+    if album_markup is not None:
+        # A media group cannot carry a keyboard: send the first item with the
+        # actions and an "all attachments" button instead of album + "Действия:".
+        await send_media_item(bot, chat_id, media_items[0], text, album_markup)
+        return
+    await send_media_group(bot, chat_id, media_items, caption=text)
+    if reply_markup:
+        await bot.send_message(chat_id=chat_id, text="Действия:", reply_markup=reply_markup)
 
 
 @dataclass
@@ -92,13 +186,22 @@ class ProcessGate:
         self.pending: dict[int, list[QueuedEvent]] = {}
         self._lock = asyncio.Lock()
 
+    @contextlib.asynccontextmanager
+    async def _locked(self) -> AsyncIterator[None]:
+        with span("gate lock wait"):
+            await self._lock.acquire()
+        try:
+            yield
+        finally:
+            self._lock.release()
+
     async def set_busy(self, tg_id: int, reason: str, timeout_seconds: int) -> None:
-        async with self._lock:
+        async with self._locked():
             self.busy_until[tg_id] = datetime.utcnow() + timedelta(seconds=timeout_seconds)
             self.busy_reason[tg_id] = reason
 
     async def is_busy(self, tg_id: int) -> bool:
-        async with self._lock:
+        async with self._locked():
             expires = self.busy_until.get(tg_id)
             if not expires:
                 return False
@@ -109,19 +212,43 @@ class ProcessGate:
             return True
 
     async def clear_busy(self, tg_id: int) -> list[QueuedEvent]:
-        async with self._lock:
+        async with self._locked():
             self.busy_until.pop(tg_id, None)
             self.busy_reason.pop(tg_id, None)
             queued = self.pending.pop(tg_id, [])
         return queued
 
     async def queue(self, tg_id: int, event: QueuedEvent) -> None:
-        async with self._lock:
+        async with self._locked():
             self.pending.setdefault(tg_id, []).append(event)
 
+    async def snapshot(self) -> dict:
+        async with self._locked():
+            return {
+                "busy": {
+                    str(tg_id): [expires.isoformat(), self.busy_reason.get(tg_id, "")]
+                    for tg_id, expires in self.busy_until.items()
+                },
+                "pending": {
+                    str(tg_id): [[event.kind, event.payload] for event in events]
+                    for tg_id, events in self.pending.items()
+                    if events
+                },
+            }
+
+    async def restore(self, data: dict) -> None:
+        async with self._locked():
+            for raw_id, (expires, reason) in data.get("busy", {}).items():
+                tg_id = int(raw_id)
+                self.busy_until[tg_id] = datetime.fromisoformat(expires)
+                self.busy_reason[tg_id] = reason
+            for raw_id, events in data.get("pending", {}).items():
+                queue = self.pending.setdefault(int(raw_id), [])
+                queue.extend(QueuedEvent(kind=kind, payload=payload) for kind, payload in events)
+
     async def expired_ids(self) -> list[int]:
         now = datetime.utcnow()
-        async with self._lock:
+        async with self._locked():
             items = [(uid, dt) for uid, dt in self.busy_until.items() if dt < now]
             ids = [uid for uid, _ in items]
             for uid in ids:
@@ -130,49 +257,238 @@ class ProcessGate:
         return ids
 
 
+async def _send_request_notice(bot: Bot, chat_id: int, request: SupplyRequest) -> None:
+    media_items = unpack_media(request.photos_json)
+    await send_media_and_text(
+        bot=bot,
+        chat_id=chat_id,
+        text=f"Новая заявка!\n\n{request_text_view(request)}",
+        media_items=media_items,
+        reply_markup=keyboards.supplier_request_kb(request.id),
+        album_markup=keyboards.supplier_request_kb(request.id, len(media_items)),
+    )
+
+
+async def _send_response_notice(
+    bot: Bot,
+    chat_id: int,
+    request: SupplyRequest,
+    response: SupplierResponse,
+) -> None:
+    media_items = unpack_media(response.photos_json)
+    await send_media_and_text(
+        bot=bot,
+        chat_id=chat_id,
+        text=(
+            f"По вашей заявке пришел отклик.\n\n{request_text_view(request)}\n\n"
+            f"{response_text_view(response)}"
+        ),
+        media_items=media_items,
+        reply_markup=keyboards.response_item_kb(response.id, request.id),
+        album_markup=keyboards.response_item_kb(response.id, request.id, len(media_items)),
+    )
+
+
 async def notify_supplier_about_request(
     bot: Bot,
     gate: ProcessGate,
     supplier_tg_id: int,
     request: SupplyRequest,
-) -> None:
+) -> bool:
     event = QueuedEvent(kind="new_request", payload={"request_id": request.id})
     if await gate.is_busy(supplier_tg_id):
         await gate.queue(supplier_tg_id, event)
-        return
-    await send_media_and_text(
-        bot=bot,
-        chat_id=supplier_tg_id,
-        text=f"Новая заявка!\n\n{request_text_view(request)}",
-        media_items=unpack_media(request.photos_json),
-        reply_markup=keyboards.supplier_request_kb(request.id),
+        return False
+    await _send_request_notice(bot, supplier_tg_id, request)
+    return True
+
+
+async def _send_responses(
+    bot: Bot,
+    session: AsyncSession,
+    chat_id: int,
+    pairs: list[tuple[int, int]],
+) -> bool:
+    counts: dict[int, int] = {}
+    single: tuple[SupplyRequest, int] | None = None
+    for request_id, response_id in pairs:
+        req = await session.get(SupplyRequest, request_id)
+        if not req or req.status != "open":
+            continue
+        counts[request_id] = counts.get(request_id, 0) + 1
+        single = (req, response_id)
+    if single is None:
+        return False
+    if sum(counts.values()) == 1:
+        resp = await session.get(SupplierResponse, single[1])
+        if not resp:
+            return False
+        await _send_response_notice(bot, chat_id, single[0], resp)
+        return True
+    lines = "\n".join(f"Заявка #{request_id}: {count}" for request_id, count in counts.items())
+    await bot.send_message(
+        chat_id=chat_id,
+        text=f"Новые отклики по вашим заявкам: {sum(counts.values())}\n\n{lines}",
+        reply_markup=keyboards.responses_digest_kb(tuple(counts.items())),
     )
+    return True
 
 
-async def notify_consumer_about_response(
+async def notify_consumer_about_responses(
     bot: Bot,
     gate: ProcessGate,
+    session_factory: async_sessionmaker[AsyncSession],
     consumer_tg_id: int,
-    request: SupplyRequest,
-    response: SupplierResponse,
-) -> None:
-    event = QueuedEvent(
-        kind="new_response",
-        payload={"request_id": request.id, "response_id": response.id},
-    )
+    pairs: list[tuple[int, int]],
+) -> bool:
     if await gate.is_busy(consumer_tg_id):
-        await gate.queue(consumer_tg_id, event)
+        for request_id, response_id in pairs:
+            await gate.queue(
+                consumer_tg_id,
+                QueuedEvent(
+                    kind="new_response",
+                    payload={"request_id": request_id, "response_id": response_id},
+                ),
+            )
+        return False
+    async with session_factory() as session:
+        return await _send_responses(bot, session, consumer_tg_id, pairs)
+
+
+@dataclass
+class _ResponseBatch:
+    first_at: float
+    last_at: float
+    pairs: list[tuple[int, int]]
+
+
+class ResponseDebouncer:
+    def __init__(
+        self,
+        bot: Bot,
+        gate: ProcessGate,
+        session_factory: async_sessionmaker[AsyncSession],
+        window: float = RESPONSE_DEBOUNCE_WINDOW,
+        max_delay: float = RESPONSE_DEBOUNCE_MAX_DELAY,
+    ) -> None:
+        self.bot = bot
+        self.gate = gate
+        self.session_factory = session_factory
+        self.window = window
+        self.max_delay = max_delay
+        self._batches: dict[int, _ResponseBatch] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self._closing = asyncio.Event()
+
+    @property
+    def pending(self) -> int:
+        return sum(len(batch.pairs) for batch in self._batches.values())
+
+    async def add(self, consumer_tg_id: int, request_id: int, response_id: int) -> None:
+        if self.window <= 0 or self._closing.is_set():
+            await self._deliver(consumer_tg_id, [(request_id, response_id)])
+            return
+        now = asyncio.get_running_loop().time()
+        batch = self._batches.get(consumer_tg_id)
+        if batch is None:
+            batch = self._batches[consumer_tg_id] = _ResponseBatch(now, now, [])
+            task = asyncio.create_task(self._flush_later(consumer_tg_id, batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        batch.pairs.append((request_id, response_id))
+        batch.last_at = now
+
+    async def _flush_later(self, consumer_tg_id: int, batch: _ResponseBatch) -> None:
+        loop = asyncio.get_running_loop()
+        # Every new response extends the window, but never past max_delay
+        # after the first one.
+        while not self._closing.is_set():
+            due = min(batch.last_at + self.window, batch.first_at + self.max_delay)
+            delay = due - loop.time()
+            if delay <= 0:
+                break
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._closing.wait(), delay)
+        if self._batches.get(consumer_tg_id) is not batch:
+            # close() already moved the batch to the outbox.
+            return
+        self._batches.pop(consumer_tg_id)
+        try:
+            await self._deliver(consumer_tg_id, batch.pairs)
+        except Exception:
+            logger.exception("Failed to notify %s about %s responses", consumer_tg_id, len(batch.pairs))
+
+    async def _deliver(self, consumer_tg_id: int, pairs: list[tuple[int, int]]) -> None:
+        with send_lane(Lane.DIRECT):
+            await notify_consumer_about_responses(
+                self.bot, self.gate, self.session_factory, consumer_tg_id, pairs
+            )
+
+    async def close(self) -> None:
+        # Batches still waiting for their window go to the outbox, which
+        # survives a restart, instead of being sent against the shutdown deadline.
+        self._closing.set()
+        batches, self._batches = self._batches, {}
+        if batches:
+            async with self.session_factory() as session:
+                for consumer_tg_id, batch in batches.items():
+                    await enqueue_outbox(
+                        session, "responses", [consumer_tg_id], {"pairs": batch.pairs}
+                    )
+                await session.commit()
+            logger.info("Moved response notifications for %s consumers to the outbox", len(batches))
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+async def _on_response_created(
+    debouncer: ResponseDebouncer,
+    session_factory: async_sessionmaker[AsyncSession],
+    event: ResponseCreated,
+) -> None:
+    async with session_factory() as session:
+        req = await session.get(SupplyRequest, event.request_id)
+        consumer = await session.get(User, req.consumer_id) if req else None
+    if consumer:
+        await debouncer.add(consumer.tg_id, event.request_id, event.response_id)
+
+
+async def _on_response_selected(
+    bot: Bot,
+    session_factory: async_sessionmaker[AsyncSession],
+    event: ResponseSelected,
+) -> None:
+    async with session_factory() as session:
+        req = await session.get(SupplyRequest, event.request_id)
+        response = await session.get(SupplierResponse, event.response_id)
+        if not req or not response:
+            return
+        consumer = await session.get(User, req.consumer_id)
+        supplier = await session.get(User, response.supplier_id)
+    if not consumer or not supplier:
         return
-    text = (
-        f"По вашей заявке пришел отклик.\n\n{request_text_view(request)}\n\n"
-        f"{response_text_view(response)}"
+    with send_lane(Lane.DIRECT):
+        await bot.send_message(
+            chat_id=supplier.tg_id,
+            text=(
+                "Ваш отклик выбрали!\n\n"
+                f"{request_text_view(req)}\n\n{response_text_view(response)}\n\n"
+                f"Контакт потребителя: {user_contact_view(consumer)}"
+            ),
+        )
+
+
+def subscribe_notifications(
+    events: EventBus,
+    bot: Bot,
+    debouncer: ResponseDebouncer,
+    session_factory: async_sessionmaker[AsyncSession],
+    workers: int = 1,
+) -> None:
+    events.subscribe(
+        ResponseCreated, partial(_on_response_created, debouncer, session_factory), workers=workers
     )
-    await send_media_and_text(
-        bot=bot,
-        chat_id=consumer_tg_id,
-        text=text,
-        media_items=unpack_media(response.photos_json),
-        reply_markup=keyboards.response_item_kb(response.id, request.id),
+    events.subscribe(
+        ResponseSelected, partial(_on_response_selected, bot, session_factory), workers=workers
     )
 
 
@@ -186,31 +502,26 @@ async def flush_user_queue(
     if not events:
         return
 
-    for event in events:
-        if event.kind == "new_request":
-            req = await session.get(SupplyRequest, event.payload["request_id"])
-            if req and req.status == "open":
-                await send_media_and_text(
-                    bot=bot,
-                    chat_id=tg_id,
-                    text=f"Новая заявка!\n\n{request_text_view(req)}",
-                    media_items=unpack_media(req.photos_json),
-                    reply_markup=keyboards.supplier_request_kb(req.id),
-                )
-        elif event.kind == "new_response":
-            req = await session.get(SupplyRequest, event.payload["request_id"])
-            resp = await session.get(SupplierResponse, event.payload["response_id"])
-            if req and resp and req.status == "open":
-                await send_media_and_text(
-                    bot=bot,
-                    chat_id=tg_id,
-                    text=(
-                        f"По вашей заявке пришел отклик.\n\n"
-                        f"{request_text_view(req)}\n\n{response_text_view(resp)}"
-                    ),
-                    media_items=unpack_media(resp.photos_json),
-                    reply_markup=keyboards.response_item_kb(resp.id, req.id),
-                )
+    seen = None
+    if any(event.kind == "new_request" for event in events):
+        user = (await session.execute(select(User).where(User.tg_id == tg_id))).scalar_one_or_none()
+        if user is not None:
+            seen = db.get_write_buffer().seen_requests(user)
+    responses: list[tuple[int, int]] = []
+    with send_lane(Lane.DIRECT):
+        for event in events:
+            if event.kind == "new_request":
+                # Requests already shown in the feed while the user was busy are skipped.
+                if seen is not None and event.payload["request_id"] in seen:
+                    continue
+                req = await session.get(SupplyRequest, event.payload["request_id"])
+                if req and req.status == "open":
+                    await _send_request_notice(bot, tg_id, req)
+            elif event.kind == "new_response":
+                responses.append((event.payload["request_id"], event.payload["response_id"]))
+        # Responses that piled up while the user was busy go out as one digest.
+        if responses:
+            await _send_responses(bot, session, tg_id, responses)
 
 
 async def timeout_watcher(
@@ -222,21 +533,257 @@ async def timeout_watcher(
         await asyncio.sleep(5)
         expired = await gate.expired_ids()
         for tg_id in expired:
+            try:
+                async with session_factory() as session:
+                    with send_lane(Lane.DIRECT):
+                        await bot.send_message(
+                            chat_id=tg_id,
+                            text="Ошибка, повторите действие позже. Вы возвращены в обычный режим.",
+                        )
+                    await flush_user_queue(bot, gate, session, tg_id)
+            except TelegramForbiddenError:
+                logger.info("User %s blocked the bot before the process timed out", tg_id)
+            except Exception:
+                logger.exception("Failed to notify %s about the process timeout", tg_id)
+
+
+def reachable_users() -> ColumnElement[bool]:
+    # Users who blocked the bot are skipped, but retried once per reprobe interval.
+    reprobe_before = datetime.utcnow() - timedelta(seconds=BLOCKED_REPROBE_INTERVAL)
+    return or_(User.blocked_at.is_(None), User.blocked_at < reprobe_before)
+
+
+async def enqueue_outbox(
+    session: AsyncSession,
+    kind: str,
+    tg_ids: list[int],
+    payload: dict,
+) -> int:
+    if not tg_ids:
+        return 0
+    payload_json = codec.dumps(payload)
+    now = datetime.utcnow()
+    await session.execute(
+        insert(OutboxMessage),
+        [
+            {
+                "kind": kind,
+                "tg_id": tg_id,
+                "payload_json": payload_json,
+                "status": "pending",
+                "attempts": 0,
+                "created_at": now,
+            }
+            for tg_id in tg_ids
+        ],
+    )
+    return len(tg_ids)
+
+
+async def claim_outbox(session: AsyncSession, limit: int) -> list[OutboxMessage]:
+    now = datetime.utcnow()
+    claimable = or_(
+        and_(
+            OutboxMessage.status == "pending",
+            or_(
+                OutboxMessage.next_attempt_at.is_(None),
+                OutboxMessage.next_attempt_at <= now,
+            ),
+        ),
+        and_(
+            OutboxMessage.status == "processing",
+            OutboxMessage.claimed_at < now - timedelta(seconds=OUTBOX_CLAIM_TIMEOUT),
+        ),
+    )
+    candidates = (
+        select(OutboxMessage.id)
+        .where(claimable)
+        .order_by(OutboxMessage.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    # SQLite ignores FOR UPDATE, so the UPDATE re-checks the claim condition:
+    # a row another worker took in the meantime is not returned twice.
+    stmt = (
+        update(OutboxMessage)
+        .where(OutboxMessage.id.in_(candidates.scalar_subquery()), claimable)
+        .values(status="processing", claimed_at=now, attempts=OutboxMessage.attempts + 1)
+        .returning(OutboxMessage)
+        .execution_options(synchronize_session=False)
+    )
+    messages = sorted((await session.execute(stmt)).scalars().all(), key=lambda item: item.id)
+    await session.commit()
+    return messages
+
+
+async def deliver_outbox_message(
+    bot: Bot,
+    gate: ProcessGate,
+    session_factory: async_sessionmaker[AsyncSession],
+    message: OutboxMessage,
+    requests: dict[int, SupplyRequest | None],
+) -> bool:
+    # Returns whether anything reached the Bot API: closed requests are skipped
+    # and notices for busy users are parked on the gate.
+    payload = codec.loads(message.payload_json)
+    if message.kind == "new_request":
+        req = requests.get(payload["request_id"])
+        if req and req.status == "open":
+            with send_lane(Lane.FANOUT):
+                return await notify_supplier_about_request(bot, gate, message.tg_id, req)
+    elif message.kind == "broadcast":
+        with send_lane(Lane.BROADCAST):
+            await bot.send_message(chat_id=message.tg_id, text=f"Рассылка:\n\n{payload['text']}")
+        return True
+    elif message.kind == "responses":
+        pairs = [(request_id, response_id) for request_id, response_id in payload["pairs"]]
+        with send_lane(Lane.DIRECT):
+            return await notify_consumer_about_responses(
+                bot, gate, session_factory, message.tg_id, pairs
+            )
+    return False
+
+
+def outbox_retry_delay(attempts: int, exc: Exception) -> float:
+    if isinstance(exc, TelegramRetryAfter):
+        return exc.retry_after
+    return min(OUTBOX_RETRY_MAX_DELAY, OUTBOX_RETRY_DELAY * 2 ** (attempts - 1))
+
+
+async def outbox_worker(
+    bot: Bot,
+    gate: ProcessGate,
+    session_factory: async_sessionmaker[AsyncSession],
+    batch_size: int = 50,
+    idle_delay: float = 1.0,
+    stop: asyncio.Event | None = None,
+    max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+) -> None:
+    stop = stop or asyncio.Event()
+    while not stop.is_set():
+        async with session_factory() as session:
+            messages = await claim_outbox(session, batch_size)
+            request_ids = {
+                codec.loads(m.payload_json)["request_id"] for m in messages if m.kind == "new_request"
+            }
+            requests: dict[int, SupplyRequest | None] = {}
+            if request_ids:
+                stmt = select(SupplyRequest).where(SupplyRequest.id.in_(request_ids))
+                requests = {req.id: req for req in (await session.execute(stmt)).scalars()}
+            reprobed: set[int] = set()
+            if messages:
+                stmt = select(User.tg_id).where(
+                    User.tg_id.in_({m.tg_id for m in messages}), User.blocked_at.is_not(None)
+                )
+                reprobed = set((await session.execute(stmt)).scalars())
+        if not messages:
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(stop.wait(), timeout=idle_delay)
+            continue
+
+        write_buffer = db.get_write_buffer()
+        results: list[dict] = []
+        try:
+            for message in messages:
+                status = "sent"
+                next_attempt_at = None
+                try:
+                    delivered = await deliver_outbox_message(
+                        bot, gate, session_factory, message, requests
+                    )
+                except TelegramForbiddenError:
+                    # BlockedChatMiddleware has already recorded users.blocked_at.
+                    status = "blocked"
+                except TelegramBadRequest:
+                    logger.exception("Outbox delivery %s to %s rejected", message.id, message.tg_id)
+                    status = "failed"
+                except Exception as exc:
+                    # Flood waits, network errors, 5xx answers and anything unexpected are retried.
+                    if message.attempts >= max_attempts:
+                        logger.exception(
+                            "Outbox delivery %s to %s failed after %s attempts",
+                            message.id,
+                            message.tg_id,
+                            message.attempts,
+                        )
+                        status = "failed"
+                    else:
+                        delay = outbox_retry_delay(message.attempts, exc)
+                        logger.warning(
+                            "Outbox delivery %s to %s failed (%s), retrying in %ss",
+                            message.id,
+                            message.tg_id,
+                            exc,
+                            delay,
+                        )
+                        status = "pending"
+                        next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+                else:
+                    if delivered and message.tg_id in reprobed:
+                        reprobed.discard(message.tg_id)
+                        write_buffer.set_blocked(message.tg_id, None)
+                results.append({"id": message.id, "status": status, "next_attempt_at": next_attempt_at})
+        finally:
+            # Messages not reached before cancellation go back to the queue.
+            done_ids = {result["id"] for result in results}
+            results.extend(
+                {"id": message.id, "status": "pending", "next_attempt_at": None}
+                for message in messages
+                if message.id not in done_ids
+            )
             async with session_factory() as session:
-                await bot.send_message(
-                    chat_id=tg_id,
-                    text="Ошибка, повторите действие позже. Вы возвращены в обычный режим.",
+                await session.execute(update(OutboxMessage), results)
+                await session.commit()
+
+
+async def purge_outbox(
+    session_factory: async_sessionmaker[AsyncSession],
+    retention: float = OUTBOX_RETENTION,
+    interval: float = OUTBOX_PURGE_INTERVAL,
+) -> None:
+    while True:
+        cutoff = datetime.utcnow() - timedelta(seconds=retention)
+        try:
+            async with session_factory() as session:
+                result = await session.execute(
+                    delete(OutboxMessage).where(
+                        OutboxMessage.status.in_(("sent", "failed", "blocked")),
+                        OutboxMessage.created_at < cutoff,
+                    )
                 )
-                await flush_user_queue(bot, gate, session, tg_id)
+                await session.commit()
+            if result.rowcount:
+                logger.info("Purged %s old outbox messages", result.rowcount)
+        except Exception:
+            logger.exception("Outbox purge failed")
+        await asyncio.sleep(interval)
+
+
+async def has_responded(session: AsyncSession, request_id: int, supplier_id: int) -> bool:
+    stmt = select(SupplierResponse.id).where(
+        SupplierResponse.request_id == request_id,
+        SupplierResponse.supplier_id == supplier_id,
+    )
+    return (await session.execute(stmt)).first() is not None
 
 
 async def get_or_create_user(session: AsyncSession, tg_user) -> User:
+    with span("get_or_create_user"):
+        return await _get_or_create_user(session, tg_user)
+
+
+async def _get_or_create_user(session: AsyncSession, tg_user) -> User:
     stmt = select(User).where(User.tg_id == tg_user.id)
     user = (await session.execute(stmt)).scalar_one_or_none()
     if user:
-        user.username = tg_user.username
-        user.full_name = tg_user.full_name
-        await session.commit()
+        if user.username != tg_user.username or user.full_name != tg_user.full_name:
+            set_committed_value(user, "username", tg_user.username)
+            set_committed_value(user, "full_name", tg_user.full_name)
+            db.get_write_buffer().touch_profile(tg_user.id, tg_user.username, tg_user.full_name)
+        if user.blocked_at is not None:
+            # An update from the user means the chat is reachable again.
+            set_committed_value(user, "blocked_at", None)
+            db.get_write_buffer().set_blocked(tg_user.id, None)
         return user
 
     role = "consumer"
@@ -0,0 +1,88 @@
+from datetime import datetime
+from typing import Any
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.session.middlewares.base import (
+    BaseRequestMiddleware,
+    NextRequestMiddlewareType,
+)
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.exceptions import TelegramForbiddenError
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import InputFile
+from aiohttp import FormData
+
+from app import codec
+from app.keyboards import markup_payload
+from app.writebehind import WriteBehindBuffer
+
+
+class BotSession(AiohttpSession):
+    def __init__(
+        self,
+        limit: int = 100,
+        keepalive_timeout: float = 30.0,
+        dns_cache_ttl: int = 3600,
+        timeout: float = 60.0,
+        api_url: str = "",
+        api_local: bool = False,
+        **kwargs: Any,
+    ) -> None:
+        if api_url:
+            kwargs["api"] = TelegramAPIServer.from_base(api_url, is_local=api_local)
+        kwargs.setdefault("json_loads", codec.loads)
+        kwargs.setdefault("json_dumps", codec.dumps)
+        super().__init__(limit=limit, timeout=timeout, **kwargs)
+        if keepalive_timeout > 0:
+            self._connector_init["keepalive_timeout"] = keepalive_timeout
+        else:
+            self._connector_init["force_close"] = True
+        if dns_cache_ttl > 0:
+            self._connector_init["ttl_dns_cache"] = dns_cache_ttl
+        else:
+            self._connector_init.pop("ttl_dns_cache", None)
+            self._connector_init["use_dns_cache"] = False
+
+    def build_form_data(self, bot: Bot, method: TelegramMethod[TelegramType]) -> FormData:
+        payload = markup_payload(getattr(method, "reply_markup", None))
+        if payload is None:
+            return super().build_form_data(bot, method)
+
+        form = FormData(quote_fields=False)
+        files: dict[str, InputFile] = {}
+        for key, value in method.model_dump(warnings=False, exclude={"reply_markup"}).items():
+            value = self.prepare_value(value, bot=bot, files=files)
+            if not value:
+                continue
+            form.add_field(key, value)
+        form.add_field("reply_markup", payload)
+        for key, value in files.items():
+            form.add_field(
+                key,
+                value.read(bot),
+                filename=value.filename or key,
+            )
+        return form
+
+
+class BlockedChatMiddleware(BaseRequestMiddleware):
+    # Every send path goes through here, so a Forbidden answer marks the user
+    # as blocked no matter which feature sent the message.
+    def __init__(self, write_buffer: WriteBehindBuffer) -> None:
+        self.write_buffer = write_buffer
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Any:
+        try:
+            return await make_request(bot, method)
+        except TelegramForbiddenError:
+            chat_id = getattr(method, "chat_id", None)
+            if isinstance(chat_id, int) and chat_id > 0:
+                self.write_buffer.set_blocked(chat_id, datetime.utcnow())
+            raise
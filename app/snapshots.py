@@ -0,0 +1,104 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from collections.abc import Callable
+
+from sqlalchemy.engine import make_url
+
+
+logger = logging.getLogger(__name__)
+
+MAX_STEP_FACTOR = 3
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def sqlite_path(database_url: str) -> str | None:
+    url = make_url(database_url)
+    if url.get_backend_name() != "sqlite" or not url.database or url.database == ":memory:":
+        return None
+    return url.database
+
+
+class SqliteSnapshotter:
+    def __init__(
+        self,
+        database_path: str,
+        replica_path: str,
+        interval: float = 300.0,
+        pages_per_step: int = 256,
+        step_pause: float = 0.01,
+    ) -> None:
+        self.database_path = database_path
+        self.replica_path = replica_path
+        self.interval = interval
+        self.pages_per_step = pages_per_step
+        self.step_pause = step_pause
+        self.last_snapshot_at: float | None = None
+        self.last_duration = 0.0
+
+    @property
+    def age(self) -> float | None:
+        if self.last_snapshot_at is None:
+            return None
+        return time.time() - self.last_snapshot_at
+
+    def _step_limit(self) -> Callable[[int, int, int], None]:
+        steps = 0
+
+        def progress(status: int, remaining: int, total: int) -> None:
+            nonlocal steps
+            steps += 1
+            if steps > MAX_STEP_FACTOR * (total // self.pages_per_step + 1):
+                raise _TooManyRestarts
+
+        return progress
+
+    def _backup(self) -> None:
+        directory = os.path.dirname(self.replica_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.replica_path}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        source = sqlite3.connect(f"file:{self.database_path}?mode=ro", uri=True)
+        target = sqlite3.connect(tmp_path)
+        try:
+            try:
+                # Copying a few pages per step releases the source between steps,
+                # so bot commits are never held up for the whole copy.
+                source.backup(
+                    target,
+                    pages=self.pages_per_step,
+                    sleep=self.step_pause,
+                    progress=self._step_limit(),
+                )
+            except _TooManyRestarts:
+                # Every write to the source restarts an incremental copy. Under steady
+                # writes fall back to one pass, which in WAL mode only holds a read snapshot.
+                logger.info("Incremental snapshot kept restarting, copying in one pass")
+                source.backup(target)
+            target.execute("PRAGMA journal_mode=DELETE")
+        finally:
+            target.close()
+            source.close()
+        os.chmod(tmp_path, 0o444)
+        os.replace(tmp_path, self.replica_path)
+
+    async def snapshot(self) -> None:
+        started = time.perf_counter()
+        await asyncio.to_thread(self._backup)
+        self.last_duration = time.perf_counter() - started
+        self.last_snapshot_at = time.time()
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.snapshot()
+            except Exception:
+                logger.exception("SQLite snapshot to %s failed", self.replica_path)
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,207 @@
+import contextlib
+import json
+import logging
+import os
+import random
+import time
+from collections.abc import Awaitable, Callable, Iterator
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import CallbackQuery, InlineQuery, Message, TelegramObject, Update
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.callbacks import handler_name
+
+
+logger = logging.getLogger(__name__)
+
+STATEMENT_LIMIT = 300
+
+
+@dataclass
+class Span:
+    trace: "Trace"
+    span_id: str
+    parent_id: str | None
+    name: str
+    attributes: dict[str, Any]
+    start_ns: int = field(default_factory=time.time_ns)
+    end_ns: int = 0
+
+    def set(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def to_dict(self) -> dict:
+        return {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "attributes": self.attributes,
+        }
+
+
+@dataclass
+class Trace:
+    trace_id: str
+    sampled: bool
+    spans: list[Span] = field(default_factory=list)
+
+
+_current_span: ContextVar[Span | None] = ContextVar("tracing_span", default=None)
+
+
+def _new_id(bits: int) -> str:
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+@contextlib.contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span | None]:
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(parent.trace, _new_id(64), parent.span_id, name, attributes)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as exc:
+        child.set("error", type(exc).__name__)
+        raise
+    finally:
+        _current_span.reset(token)
+        child.end_ns = time.time_ns()
+        parent.trace.spans.append(child)
+
+
+class JsonlExporter:
+    def __init__(self, path: str) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._fh = open(path, "a", encoding="utf-8")
+
+    def export(self, spans: list[Span]) -> None:
+        for item in spans:
+            self._fh.write(json.dumps(item.to_dict(), ensure_ascii=False, default=str) + "\n")
+        self._fh.flush()
+
+    def close(self) -> None:
+        self._fh.close()
+
+
+def _describe(event: TelegramObject) -> dict[str, Any]:
+    if isinstance(event, Update):
+        event = event.event
+    if isinstance(event, CallbackQuery):
+        return {"event": "callback_query", "callback_data": event.data}
+    if isinstance(event, Message):
+        return {"event": "message", "content_type": event.content_type}
+    if isinstance(event, InlineQuery):
+        return {"event": "inline_query"}
+    return {"event": type(event).__name__}
+
+
+class Tracer(BaseMiddleware):
+    def __init__(self, exporter: JsonlExporter, sample_rate: float = 0.01, slow_ms: int = 0) -> None:
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.slow_ns = slow_ms * 1_000_000
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        sampled = random.random() < self.sample_rate
+        if not sampled and not self.slow_ns:
+            return await handler(event, data)
+
+        # With a slow threshold every update is recorded, but only sampled
+        # or slow ones are written out.
+        trace = Trace(_new_id(128), sampled)
+        root = Span(trace, _new_id(64), None, "update", _describe(event))
+        token = _current_span.set(root)
+        try:
+            return await handler(event, data)
+        except BaseException as exc:
+            root.set("error", type(exc).__name__)
+            raise
+        finally:
+            _current_span.reset(token)
+            root.end_ns = time.time_ns()
+            if trace.sampled or root.end_ns - root.start_ns >= self.slow_ns:
+                try:
+                    self.exporter.export([root, *trace.spans])
+                except OSError:
+                    logger.exception("Failed to export trace %s", trace.trace_id)
+
+
+class HandlerSpanMiddleware(BaseMiddleware):
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        with span(f"handler {handler_name(data)}"):
+            return await handler(event, data)
+
+
+class ApiSpanMiddleware(BaseRequestMiddleware):
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Any:
+        with span(f"api {method.__api_method__}"):
+            return await make_request(bot, method)
+
+
+def install_db_tracing(engine: AsyncEngine) -> None:
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany) -> None:
+        stack = conn.info.setdefault("tracing_spans", [])
+        parent = _current_span.get()
+        if parent is None:
+            stack.append(None)
+            return
+        stack.append(
+            Span(
+                parent.trace,
+                _new_id(64),
+                parent.span_id,
+                "sql",
+                {"statement": statement[:STATEMENT_LIMIT], "executemany": executemany},
+            )
+        )
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany) -> None:
+        item = conn.info["tracing_spans"].pop()
+        if item is not None:
+            item.end_ns = time.time_ns()
+            item.trace.spans.append(item)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(context) -> None:
+        stack = context.connection.info.get("tracing_spans") if context.connection else None
+        if stack:
+            item = stack.pop()
+            if item is not None:
+                item.set("error", type(context.original_exception).__name__)
+                item.end_ns = time.time_ns()
+                item.trace.spans.append(item)
@@ -0,0 +1,156 @@
+import asyncio
+import contextlib
+import logging
+from datetime import datetime
+
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.models import User
+from app.seen import SeenSet
+
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession],
+        flush_interval: float = 2.0,
+        max_pending: int = 500,
+    ) -> None:
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._profiles: dict[int, tuple[str | None, str | None]] = {}
+        self._sent_requests: dict[int, int] = {}
+        self._blocked: dict[int, datetime | None] = {}
+        self._seen: dict[int, SeenSet] = {}
+        self._seen_flushing: dict[int, SeenSet] = {}
+        self._flush_requested = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+
+    @property
+    def pending(self) -> int:
+        return len(self._profiles) + len(self._sent_requests) + len(self._blocked) + len(self._seen)
+
+    def _check_size(self) -> None:
+        if self.pending >= self.max_pending:
+            self._flush_requested.set()
+
+    def touch_profile(self, tg_id: int, username: str | None, full_name: str | None) -> None:
+        self._profiles[tg_id] = (username, full_name)
+        self._check_size()
+
+    def add_sent_requests(self, user_id: int, delta: int = 1) -> None:
+        self._sent_requests[user_id] = self._sent_requests.get(user_id, 0) + delta
+        self._check_size()
+
+    def set_blocked(self, tg_id: int, blocked_at: datetime | None) -> None:
+        self._blocked[tg_id] = blocked_at
+        self._check_size()
+
+    def mark_seen(self, tg_id: int, request_ids: list[int] | None = None, up_to: int = 0) -> None:
+        pending = self._seen.setdefault(tg_id, SeenSet())
+        pending.raise_watermark(up_to)
+        pending.add(request_ids or [])
+        self._check_size()
+
+    def seen_requests(self, user: User) -> SeenSet:
+        seen = SeenSet.unpack(user.seen_request_id, user.seen_request_extra)
+        for pending in (self._seen_flushing.get(user.tg_id), self._seen.get(user.tg_id)):
+            if pending is not None:
+                seen.merge(pending)
+        return seen
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            profiles, self._profiles = self._profiles, {}
+            sent_requests, self._sent_requests = self._sent_requests, {}
+            blocked, self._blocked = self._blocked, {}
+            seen, self._seen = self._seen, {}
+            if not profiles and not sent_requests and not blocked and not seen:
+                return
+            self._seen_flushing = seen
+
+            users = User.__table__
+            try:
+                async with self.session_factory() as session:
+                    if profiles:
+                        await session.execute(
+                            update(users)
+                            .where(users.c.tg_id == bindparam("b_tg_id"))
+                            .values(username=bindparam("b_username"), full_name=bindparam("b_full_name")),
+                            [
+                                {"b_tg_id": tg_id, "b_username": username, "b_full_name": full_name}
+                                for tg_id, (username, full_name) in profiles.items()
+                            ],
+                        )
+                    if sent_requests:
+                        await session.execute(
+                            update(users)
+                            .where(users.c.id == bindparam("b_id"))
+                            .values(sent_requests_count=users.c.sent_requests_count + bindparam("b_delta")),
+                            [
+                                {"b_id": user_id, "b_delta": delta}
+                                for user_id, delta in sent_requests.items()
+                            ],
+                        )
+                    if blocked:
+                        await session.execute(
+                            update(users)
+                            .where(users.c.tg_id == bindparam("b_tg_id"))
+                            .values(blocked_at=bindparam("b_blocked_at")),
+                            [
+                                {"b_tg_id": tg_id, "b_blocked_at": blocked_at}
+                                for tg_id, blocked_at in blocked.items()
+                            ],
+                        )
+                    if seen:
+                        await self._flush_seen(session, seen)
+                    await session.commit()
+            except Exception:
+                for tg_id, values in profiles.items():
+                    self._profiles.setdefault(tg_id, values)
+                for user_id, delta in sent_requests.items():
+                    self._sent_requests[user_id] = self._sent_requests.get(user_id, 0) + delta
+                for tg_id, blocked_at in blocked.items():
+                    self._blocked.setdefault(tg_id, blocked_at)
+                for tg_id, pending in seen.items():
+                    self._seen.setdefault(tg_id, SeenSet()).merge(pending)
+                raise
+            finally:
+                self._seen_flushing = {}
+
+    async def _flush_seen(self, session: AsyncSession, seen: dict[int, SeenSet]) -> None:
+        # The stored set is merged with pending ids rather than overwritten,
+        # so concurrent marks from handlers and the outbox are not lost.
+        users = User.__table__
+        rows = await session.execute(
+            select(users.c.tg_id, users.c.seen_request_id, users.c.seen_request_extra).where(
+                users.c.tg_id.in_(list(seen))
+            )
+        )
+        params = []
+        for tg_id, watermark, raw_extra in rows:
+            merged = SeenSet.unpack(watermark, raw_extra)
+            merged.merge(seen[tg_id])
+            params.append({"b_tg_id": tg_id, "b_seen_id": merged.watermark, "b_seen_extra": merged.pack()})
+        if params:
+            await session.execute(
+                update(users)
+                .where(users.c.tg_id == bindparam("b_tg_id"))
+                .values(seen_request_id=bindparam("b_seen_id"), seen_request_extra=bindparam("b_seen_extra")),
+                params,
+            )
+
+    async def run(self) -> None:
+        while True:
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._flush_requested.wait(), timeout=self.flush_interval)
+            self._flush_requested.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Write-behind flush failed, %s updates kept", self.pending)
@@ -0,0 +1,59 @@
+import datetime
+
+import pytest
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.types import Chat, Message
+
+from app import db, migrations
+
+
+class StubSession(BaseSession):
+    def __init__(self) -> None:
+        super().__init__()
+        self.calls: list = []
+        self.errors: dict[int, list[Exception]] = {}
+        self.before_send = None
+
+    async def make_request(self, bot, method, timeout=None):
+        chat_id = getattr(method, "chat_id", None)
+        if self.before_send is not None:
+            await self.before_send(method)
+        errors = self.errors.get(chat_id)
+        if errors:
+            raise errors.pop(0)
+        self.calls.append(method)
+        message = Message(
+            message_id=len(self.calls),
+            date=datetime.datetime.now(),
+            chat=Chat(id=chat_id or 1, type="private"),
+        )
+        if method.__returning__ is Message:
+            return message
+        if getattr(method.__returning__, "__origin__", None) is list:
+            return [message]
+        return True
+
+    async def close(self) -> None:
+        pass
+
+    async def stream_content(self, *args, **kwargs):
+        yield b""
+
+
+@pytest.fixture
+def bot():
+    return Bot(token="42:TEST", session=StubSession())
+
+
+@pytest.fixture
+def database(tmp_path):
+    async def setup() -> None:
+        db.init_db(f"sqlite+aiosqlite:///{tmp_path / 'bot.db'}")
+        await migrations.migrate(db.engine)
+        await db.check_schema()
+
+    yield setup
+    db.engine = None
+    db.session_factory = None
+    db.write_buffer = None
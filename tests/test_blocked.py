@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+from aiogram.exceptions import TelegramForbiddenError
+from aiogram.methods import SendMessage
+from sqlalchemy import select
+
+from app import db
+from app.models import OutboxMessage, SupplierResponse, SupplyRequest, User
+from app.services import ProcessGate, ResponseDebouncer, enqueue_outbox, outbox_worker
+from app.session import BlockedChatMiddleware
+
+
+def _forbidden() -> TelegramForbiddenError:
+    return TelegramForbiddenError(SendMessage(chat_id=1, text="x"), "bot was blocked by the user")
+
+
+async def _blocked_users() -> set[int]:
+    await db.get_write_buffer().flush()
+    async with db.session_factory() as session:
+        stmt = select(User.tg_id).where(User.blocked_at.is_not(None))
+        return set((await session.execute(stmt)).scalars())
+
+
+async def _seed() -> tuple[SupplyRequest, SupplierResponse]:
+    async with db.session_factory() as session:
+        consumer = User(tg_id=100, role="consumer", is_registered=1)
+        supplier = User(tg_id=200, role="supplier", is_registered=1)
+        session.add_all([consumer, supplier])
+        await session.flush()
+        request = SupplyRequest(consumer_id=consumer.id, text="Нужен цемент", status="open")
+        session.add(request)
+        await session.flush()
+        response = SupplierResponse(
+            request_id=request.id,
+            supplier_id=supplier.id,
+            price_text="1000 тг",
+            eta_text="2 дня",
+            description="Есть",
+        )
+        session.add(response)
+        await session.commit()
+    return request, response
+
+
+def test_response_notice_marks_blocked_consumer(database, bot):
+    async def scenario() -> set[int]:
+        await database()
+        bot.session.middleware(BlockedChatMiddleware(db.get_write_buffer()))
+        request, response = await _seed()
+        bot.session.errors = {100: [_forbidden()]}
+        debouncer = ResponseDebouncer(bot, ProcessGate(), db.session_factory, window=0)
+        with pytest.raises(TelegramForbiddenError):
+            await debouncer.add(100, request.id, response.id)
+        blocked = await _blocked_users()
+        await db.engine.dispose()
+        return blocked
+
+    assert asyncio.run(scenario()) == {100}
+
+
+def test_outbox_fanout_marks_blocked_supplier(database, bot):
+    async def scenario() -> tuple[set[int], str]:
+        await database()
+        bot.session.middleware(BlockedChatMiddleware(db.get_write_buffer()))
+        request, _ = await _seed()
+        async with db.session_factory() as session:
+            await enqueue_outbox(session, "new_request", [200], {"request_id": request.id})
+            await session.commit()
+        bot.session.errors = {200: [_forbidden()]}
+        stop = asyncio.Event()
+        task = asyncio.create_task(
+            outbox_worker(bot, ProcessGate(), db.session_factory, idle_delay=0.01, stop=stop)
+        )
+        await asyncio.sleep(0.3)
+        stop.set()
+        await task
+        blocked = await _blocked_users()
+        async with db.session_factory() as session:
+            status = (await session.execute(select(OutboxMessage.status))).scalar_one()
+        await db.engine.dispose()
+        return blocked, status
+
+    assert asyncio.run(scenario()) == ({200}, "blocked")
@@ -0,0 +1,90 @@
+import asyncio
+import time
+
+from aiogram import Dispatcher, F, Router
+from aiogram.types import CallbackQuery, Update, User
+
+from app.callbacks import CallbackTable, RequestCb
+
+
+ROUTES = 32
+FEEDS = 200
+
+
+def _linear_router(routes: int) -> Router:
+    router = Router()
+
+    async def noop(callback: CallbackQuery) -> None:
+        pass
+
+    for index in range(routes - 1):
+        router.callback_query.register(noop, F.data == f"fill:{index}")
+
+    @router.callback_query(F.data.startswith("req:view:"))
+    async def view(callback: CallbackQuery) -> bool:
+        return int(callback.data.split(":")[2]) == 42
+
+    return router
+
+
+def _table_router(routes: int) -> Router:
+    router = Router()
+    table = CallbackTable()
+
+    async def noop(callback: CallbackQuery) -> None:
+        pass
+
+    for index in range(routes - 1):
+        table.exact(f"fill:{index}")(noop)
+
+    @table.data(RequestCb, "view")
+    async def view(callback: CallbackQuery, callback_data: RequestCb) -> bool:
+        return callback_data.request_id == 42
+
+    @router.callback_query(table)
+    async def dispatch(callback: CallbackQuery, callback_target, **data) -> bool:
+        return await callback_target.call(callback, **data)
+
+    return router
+
+
+def _dispatch_seconds(bot, router: Router) -> float:
+    dispatcher = Dispatcher()
+    dispatcher.include_router(router)
+    update = Update(
+        update_id=1,
+        callback_query=CallbackQuery(
+            id="1",
+            from_user=User(id=1, is_bot=False, first_name="User"),
+            chat_instance="1",
+            data=RequestCb(action="view", request_id=42).pack(),
+        ),
+    )
+
+    async def run() -> float:
+        assert await dispatcher.feed_update(bot, update) is True
+        started = time.perf_counter()
+        for _ in range(FEEDS):
+            await dispatcher.feed_update(bot, update)
+        return (time.perf_counter() - started) / FEEDS
+
+    return asyncio.run(run())
+
+
+def test_dispatch_cost_benchmark(bot):
+    # Cost of routing one callback when its handler is registered last.
+    results = {}
+    for routes in (ROUTES, ROUTES * 5):
+        results[routes] = (
+            _dispatch_seconds(bot, _linear_router(routes)),
+            _dispatch_seconds(bot, _table_router(routes)),
+        )
+
+    print()
+    for routes, (linear, table) in results.items():
+        print(f"{routes:>3} routes: linear {linear * 1e6:7.1f} us, table {table * 1e6:6.1f} us")
+    linear_1x, table_1x = results[ROUTES]
+    linear_5x, table_5x = results[ROUTES * 5]
+    assert table_1x < linear_1x
+    assert table_5x < 2 * table_1x
+    assert linear_5x > 2 * linear_1x
@@ -0,0 +1,15 @@
+from app.carousel import VIEW_MY_REQUESTS, CarouselItem, CarouselView, _render
+
+
+def _view(text: str) -> CarouselView:
+    item = CarouselItem(text=text, media_items=[{"type": "photo", "file_id": "p1"}])
+    return CarouselView(view=VIEW_MY_REQUESTS, context=0, item_ids=[1], items={1: item})
+
+
+def test_caption_limit_counts_utf16_units():
+    # 600 emoji are 600 characters but 1200 UTF-16 units, over the 1024 caption limit.
+    _, media, _ = _render(_view("🧱" * 600), 0, with_exit=False)
+    assert media is None
+
+    _, media, _ = _render(_view("ц" * 1024), 0, with_exit=False)
+    assert media == {"type": "photo", "file_id": "p1"}
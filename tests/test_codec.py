@@ -0,0 +1,59 @@
+import json
+import time
+
+from app import codec
+from app.services import pack_media, unpack_media
+
+
+FEED_SIZE = 10_000
+
+
+def _feed_rows() -> list[str]:
+    return [
+        pack_media(
+            [
+                {"type": "photo", "file_id": f"AgACAgIAAxkBAAI{index:08d}{item}"}
+                for item in range(3)
+            ]
+        )
+        for index in range(FEED_SIZE)
+    ]
+
+
+def _decode_seconds(decode, rows: list[str]) -> float:
+    best = float("inf")
+    for _ in range(3):
+        started = time.perf_counter()
+        for raw in rows:
+            decode(raw)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def test_media_round_trip():
+    items = [{"type": "document", "file_id": "BQACAgIAAxkBAAI", "file_name": "Прайс.pdf"}]
+    assert unpack_media(pack_media(items)) == items
+    assert unpack_media("not json") == []
+    assert unpack_media(None) == []
+
+
+def test_feed_decode_benchmark():
+    # Decode cost of the media column across a 10k-item feed render.
+    rows = _feed_rows()
+    timings = {"json": _decode_seconds(json.loads, rows)}
+    timings[f"codec ({codec.BACKEND})"] = _decode_seconds(unpack_media, rows)
+    if codec.msgspec is not None:
+        msgspec = codec.msgspec
+
+        class MediaItem(msgspec.Struct):
+            type: str
+            file_id: str
+
+        typed = msgspec.json.Decoder(list[MediaItem])
+        timings["msgspec Struct"] = _decode_seconds(typed.decode, rows)
+
+    print()
+    for name, seconds in timings.items():
+        print(f"{name:<16} {seconds * 1000:7.1f} ms per {FEED_SIZE} rows")
+    if codec.BACKEND != "json":
+        assert timings[f"codec ({codec.BACKEND})"] < timings["json"]
@@ -0,0 +1,131 @@
+import asyncio
+
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import CallbackQuery
+from sqlalchemy import func, select
+
+from app import db
+from app.events import EventBus, RequestCreated, ResponseCreated
+from app.handlers import consumer_request_confirm, supplier_response_confirm
+from app.models import OutboxMessage, SupplierResponse, SupplyRequest, User
+from app.services import ProcessGate
+
+
+CONSUMER_ID = 100
+SUPPLIER_ID = 200
+
+
+def _callback(bot, tg_id: int, data: str) -> CallbackQuery:
+    user = {"id": tg_id, "is_bot": False, "first_name": f"U{tg_id}"}
+    return CallbackQuery.model_validate(
+        {
+            "id": f"{tg_id}-{data}",
+            "from": user,
+            "chat_instance": "chat",
+            "data": data,
+            "message": {
+                "message_id": 1,
+                "date": 0,
+                "chat": {"id": tg_id, "type": "private"},
+                "text": "preview",
+            },
+        },
+        context={"bot": bot},
+    )
+
+
+def _state(bot, tg_id: int) -> FSMContext:
+    return FSMContext(MemoryStorage(), StorageKey(bot_id=bot.id, chat_id=tg_id, user_id=tg_id))
+
+
+async def _published(events: EventBus, event_type: type) -> list:
+    received = []
+
+    async def record(event) -> None:
+        received.append(event)
+
+    events.subscribe(event_type, record)
+    return received
+
+
+async def _seed_users() -> None:
+    async with db.session_factory() as session:
+        session.add(User(tg_id=CONSUMER_ID, role="consumer", is_registered=1))
+        session.add(User(tg_id=SUPPLIER_ID, role="supplier", is_registered=1))
+        await session.commit()
+
+
+async def _count(model) -> int:
+    async with db.session_factory() as session:
+        return (await session.execute(select(func.count()).select_from(model))).scalar_one()
+
+
+def _replies(bot) -> list[str]:
+    return [call.text for call in bot.session.calls if getattr(call, "text", None)]
+
+
+def test_parallel_request_confirms_create_one_request(database, bot):
+    async def scenario() -> tuple[int, int, int]:
+        await database()
+        await _seed_users()
+        events = EventBus()
+        await _published(events, RequestCreated)
+        state = _state(bot, CONSUMER_ID)
+        await state.update_data(request_text="Нужен цемент", request_photos=[], draft_id="d1")
+        gate = ProcessGate()
+        await asyncio.gather(
+            *(
+                consumer_request_confirm(
+                    _callback(bot, CONSUMER_ID, "req:preview:confirm"), state, gate, events
+                )
+                for _ in range(2)
+            )
+        )
+        result = (await _count(SupplyRequest), await _count(OutboxMessage), events.pending)
+        await db.engine.dispose()
+        return result
+
+    assert asyncio.run(scenario()) == (1, 1, 1)
+    assert _replies(bot).count("Заявка отправлена.") == 1
+    assert _replies(bot).count("Эта заявка уже отправлена.") == 1
+
+
+def test_parallel_response_confirms_create_one_response(database, bot):
+    async def scenario() -> tuple[int, int]:
+        await database()
+        await _seed_users()
+        async with db.session_factory() as session:
+            consumer = (
+                await session.execute(select(User).where(User.tg_id == CONSUMER_ID))
+            ).scalar_one()
+            request = SupplyRequest(consumer_id=consumer.id, text="Нужен цемент", status="open")
+            session.add(request)
+            await session.commit()
+        events = EventBus()
+        await _published(events, ResponseCreated)
+        state = _state(bot, SUPPLIER_ID)
+        await state.update_data(
+            response_request_id=request.id,
+            response_price="1000 руб",
+            response_eta="2 дня",
+            response_description="Есть в наличии",
+            response_photos=[],
+        )
+        gate = ProcessGate()
+        await asyncio.gather(
+            *(
+                supplier_response_confirm(
+                    _callback(bot, SUPPLIER_ID, "sup:preview:confirm"), state, gate, events
+                )
+                for _ in range(2)
+            )
+        )
+        result = (await _count(SupplierResponse), events.pending)
+        await db.engine.dispose()
+        return result
+
+    assert asyncio.run(scenario()) == (1, 1)
+    assert _replies(bot).count("Отклик отправлен.") == 1
+    assert _replies(bot).count("Вы уже откликнулись на эту заявку.") == 1
@@ -0,0 +1,60 @@
+import asyncio
+
+from sqlalchemy import select
+
+from app import codec, db
+from app.models import OutboxMessage, SupplierResponse, SupplyRequest, User
+from app.services import ProcessGate, ResponseDebouncer, outbox_worker
+
+
+def test_close_moves_pending_batches_to_outbox(database, bot):
+    async def scenario() -> tuple[list[OutboxMessage], list]:
+        await database()
+        async with db.session_factory() as session:
+            consumer = User(tg_id=100, role="consumer")
+            suppliers = [User(tg_id=tg_id, role="supplier") for tg_id in (200, 300)]
+            session.add_all([consumer, *suppliers])
+            await session.flush()
+            request = SupplyRequest(consumer_id=consumer.id, text="Нужен цемент", status="open")
+            session.add(request)
+            await session.flush()
+            responses = [
+                SupplierResponse(
+                    request_id=request.id,
+                    supplier_id=supplier.id,
+                    price_text="1000 тг",
+                    eta_text="2 дня",
+                    description="Есть",
+                )
+                for supplier in suppliers
+            ]
+            session.add_all(responses)
+            await session.commit()
+
+        gate = ProcessGate()
+        debouncer = ResponseDebouncer(bot, gate, db.session_factory, window=60, max_delay=600)
+        for response in responses:
+            await debouncer.add(100, request.id, response.id)
+        await debouncer.close()
+        sent_on_close = list(bot.session.calls)
+
+        async with db.session_factory() as session:
+            rows = list((await session.execute(select(OutboxMessage))).scalars())
+
+        stop = asyncio.Event()
+        task = asyncio.create_task(
+            outbox_worker(bot, gate, db.session_factory, idle_delay=0.01, stop=stop)
+        )
+        await asyncio.sleep(0.3)
+        stop.set()
+        await task
+        await db.engine.dispose()
+        return rows, sent_on_close
+
+    rows, sent_on_close = asyncio.run(scenario())
+    assert sent_on_close == []
+    assert [(row.kind, row.tg_id) for row in rows] == [("responses", 100)]
+    assert len(codec.loads(rows[0].payload_json)["pairs"]) == 2
+    assert [call.text.splitlines()[0] for call in bot.session.calls] == [
+        "Новые отклики по вашим заявкам: 2"
+    ]
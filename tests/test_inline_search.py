@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+
+from app import db, migrations
+from app.inline import normalize_query, search_open_requests
+from app.models import SupplyRequest, User
+
+
+@pytest.mark.parametrize("raw", ["Цемент", "цемент", "ЦЕМЕНТ", "нужен", "НУЖЕН  цемент", "м500"])
+def test_search_matches_cyrillic_in_any_case(database, raw):
+    async def scenario() -> list[int]:
+        await database()
+        async with db.session_factory() as session:
+            user = User(tg_id=1, role="consumer")
+            session.add(user)
+            await session.flush()
+            text = "Нужен Цемент М500"
+            session.add(
+                SupplyRequest(consumer_id=user.id, text=text, search_text=normalize_query(text))
+            )
+            session.add(
+                SupplyRequest(consumer_id=user.id, text="Песок", search_text=normalize_query("Песок"))
+            )
+            await session.commit()
+            found = await search_open_requests(session, normalize_query(raw), None)
+        await db.engine.dispose()
+        return [item.text for item in found]
+
+    assert asyncio.run(scenario()) == ["Нужен Цемент М500"]
+
+
+def test_migration_backfills_search_text(database):
+    async def scenario() -> list[int]:
+        await database()
+        async with db.session_factory() as session:
+            user = User(tg_id=1, role="consumer")
+            session.add(user)
+            await session.flush()
+            session.add(SupplyRequest(consumer_id=user.id, text="Нужен Цемент М500"))
+            await session.commit()
+        async with db.engine.connect() as conn:
+            await conn.run_sync(migrations._request_search_text)
+            await conn.commit()
+        async with db.session_factory() as session:
+            found = await search_open_requests(session, normalize_query("Цемент"), None)
+        await db.engine.dispose()
+        return [item.text for item in found]
+
+    assert asyncio.run(scenario()) == ["Нужен Цемент М500"]
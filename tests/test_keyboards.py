@@ -0,0 +1,66 @@
+import time
+
+import pytest
+from aiogram import Bot
+from aiogram.methods import SendMessage
+
+from app import keyboards
+from app.session import BotSession
+
+
+FAN_OUT = 1000
+
+
+def test_cached_payload_matches_markup_after_carousel_reuse():
+    item_kb = keyboards.supplier_request_kb(7)
+    payload = keyboards.markup_payload(item_kb)
+    assert payload == item_kb.model_dump_json(exclude_none=True)
+
+    keyboards.carousel_kb(item_kb, "op", 0, 0, 3, media_callback="media", media_count=2)
+
+    assert keyboards.supplier_request_kb(7) is item_kb
+    assert keyboards.markup_payload(item_kb) == payload
+    assert item_kb.model_dump_json(exclude_none=True) == payload
+
+
+def test_uncached_markup_has_no_payload():
+    markup = keyboards.carousel_kb(None, "op", 0, 0, 3)
+    assert keyboards.markup_payload(markup) is None
+
+
+def test_cached_markup_is_read_only():
+    markup = keyboards.supplier_request_kb(8, 2)
+    with pytest.raises(TypeError):
+        markup.inline_keyboard.append([])
+    with pytest.raises(TypeError):
+        markup.inline_keyboard[0].append(markup.inline_keyboard[1][0])
+    with pytest.raises(ValueError):
+        markup.inline_keyboard[0][0].text = "Изменено"
+    with pytest.raises(ValueError):
+        markup.inline_keyboard = []
+    assert keyboards.markup_payload(markup) == markup.model_dump_json(exclude_none=True)
+
+
+def _fan_out_seconds(session: BotSession, bot: Bot, keyboard) -> float:
+    best = float("inf")
+    for _ in range(5):
+        started = time.perf_counter()
+        for chat_id in range(FAN_OUT):
+            method = SendMessage(chat_id=chat_id, text="Новая заявка #9", reply_markup=keyboard(9, 2))
+            session.build_form_data(bot, method)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def test_keyboard_fan_out_benchmark():
+    # Keyboard build and serialization cost of one request notice fan-out.
+    session = BotSession()
+    bot = Bot(token="42:TEST", session=session)
+    uncached = _fan_out_seconds(session, bot, keyboards.supplier_request_kb.__wrapped__)
+    cached = _fan_out_seconds(session, bot, keyboards.supplier_request_kb)
+
+    print()
+    for name, seconds in (("uncached", uncached), ("cached", cached)):
+        per_send = seconds / FAN_OUT * 1e6
+        print(f"{name:<9} {seconds * 1000:6.1f} ms per {FAN_OUT} sends, {per_send:5.1f} us per send")
+    assert cached < uncached
@@ -0,0 +1,60 @@
+from sqlalchemy import create_engine, text
+
+from app import migrations
+
+
+def test_request_idempotency_keeps_selected_response():
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE supply_requests (id INTEGER PRIMARY KEY, text TEXT)"))
+        conn.execute(
+            text(
+                "CREATE TABLE supplier_responses ("
+                "id INTEGER PRIMARY KEY, request_id INTEGER, supplier_id INTEGER, status TEXT)"
+            )
+        )
+        conn.execute(
+            text(
+                "INSERT INTO supplier_responses VALUES "
+                "(1, 1, 1, 'pending'), (2, 1, 1, 'selected'), (3, 1, 1, 'pending'), "
+                "(4, 1, 2, 'pending'), (5, 1, 2, 'pending'), (6, 2, 1, 'selected')"
+            )
+        )
+        migrations._request_idempotency(conn)
+        kept = conn.execute(text("SELECT id FROM supplier_responses ORDER BY id")).scalars().all()
+
+    assert kept == [2, 4, 6]
+
+
+def test_response_sort_keys_reparse():
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "CREATE TABLE supplier_responses (id INTEGER PRIMARY KEY, "
+                "price_text TEXT, eta_text TEXT, price_value BIGINT, eta_days INTEGER)"
+            )
+        )
+        rows = [
+            (1, "от 100 до 200 тыс", "3 дня"),
+            (2, "150 000тг", "30 минут"),
+            (3, "Цена уточняется", "завтра"),
+        ]
+        for row_id, price_text, eta_text in rows:
+            conn.execute(
+                text("INSERT INTO supplier_responses VALUES (:id, :price_text, :eta_text, :price, :eta)"),
+                {
+                    "id": row_id,
+                    "price_text": price_text,
+                    "eta_text": eta_text,
+                    "price": migrations._parse_price_v1(price_text),
+                    "eta": migrations._parse_eta_days_v1(eta_text),
+                },
+            )
+        select_keys = text("SELECT price_value, eta_days FROM supplier_responses ORDER BY id")
+        before = [tuple(row) for row in conn.execute(select_keys)]
+        migrations._response_sort_keys_reparse(conn)
+        after = [tuple(row) for row in conn.execute(select_keys)]
+
+    assert before == [(100, 3), (150000, 30), (None, 1)]
+    assert after == [(200000, 3), (150000, 1), (None, 1)]
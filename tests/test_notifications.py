@@ -0,0 +1,58 @@
+import asyncio
+
+from app import keyboards
+from app.models import SupplyRequest
+from app.services import (
+    ProcessGate,
+    notify_supplier_about_request,
+    pack_media,
+    request_text_view,
+    send_media_group,
+    unpack_media,
+)
+
+
+SUPPLIERS = 100
+
+
+def _request(media_count: int) -> SupplyRequest:
+    media = [{"type": "photo", "file_id": f"AgACAgIAAxkBAAI{index}"} for index in range(media_count)]
+    return SupplyRequest(id=9, text="Цемент М500, 40 мешков", status="open", photos_json=pack_media(media))
+
+
+async def _legacy_notice(bot, chat_id: int, request: SupplyRequest) -> None:
+    # The previous layout: media with the caption, then "Действия:" carrying the keyboard.
+    text = f"Новая заявка!\n\n{request_text_view(request)}"
+    markup = keyboards.supplier_request_kb(request.id)
+    media = unpack_media(request.photos_json)
+    if not media:
+        await bot.send_message(chat_id=chat_id, text=text, reply_markup=markup)
+        return
+    await send_media_group(bot, chat_id, media, caption=text)
+    await bot.send_message(chat_id=chat_id, text="Действия:", reply_markup=markup)
+
+
+def test_api_calls_per_fan_out_benchmark(bot):
+    # Bot API calls for one new-request fan-out to 100 suppliers.
+    async def count_calls(send) -> int:
+        bot.session.calls.clear()
+        for chat_id in range(1, SUPPLIERS + 1):
+            await send(chat_id)
+        return len(bot.session.calls)
+
+    results = {}
+    for media_count in (0, 1, 3):
+        request = _request(media_count)
+        gate = ProcessGate()
+        before = asyncio.run(count_calls(lambda chat_id: _legacy_notice(bot, chat_id, request)))
+        after = asyncio.run(
+            count_calls(lambda chat_id: notify_supplier_about_request(bot, gate, chat_id, request))
+        )
+        results[media_count] = (before, after)
+
+    print()
+    for media_count, (before, after) in results.items():
+        print(f"{media_count} media: {before:>4} calls before, {after:>4} after per {SUPPLIERS} suppliers")
+    assert results[0] == (SUPPLIERS, SUPPLIERS)
+    assert results[1] == (2 * SUPPLIERS, SUPPLIERS)
+    assert results[3] == (2 * SUPPLIERS, SUPPLIERS)
@@ -0,0 +1,186 @@
+import asyncio
+import contextlib
+from datetime import datetime, timedelta
+
+from aiogram.exceptions import TelegramBadRequest, TelegramNetworkError, TelegramRetryAfter
+from aiogram.methods import SendMessage
+from sqlalchemy import select, update
+
+from app import db
+from app.models import OutboxMessage, SupplyRequest, User
+from app.services import ProcessGate, enqueue_outbox, outbox_worker, purge_outbox
+
+
+async def _enqueue_broadcast(tg_ids: list[int]) -> None:
+    async with db.session_factory() as session:
+        await enqueue_outbox(session, "broadcast", tg_ids, {"text": "Привет"})
+        await session.commit()
+
+
+async def _run_worker(bot, seconds: float = 0.3, **kwargs) -> None:
+    stop = asyncio.Event()
+    task = asyncio.create_task(
+        outbox_worker(bot, ProcessGate(), db.session_factory, idle_delay=0.01, stop=stop, **kwargs)
+    )
+    await asyncio.sleep(seconds)
+    stop.set()
+    await task
+
+
+async def _outbox_rows() -> dict[int, OutboxMessage]:
+    async with db.session_factory() as session:
+        rows = (await session.execute(select(OutboxMessage))).scalars().all()
+    return {row.tg_id: row for row in rows}
+
+
+def _method() -> SendMessage:
+    return SendMessage(chat_id=1, text="x")
+
+
+def test_transient_errors_are_retried_with_backoff(database, bot):
+    async def scenario() -> dict[int, OutboxMessage]:
+        await database()
+        bot.session.errors = {
+            1: [TelegramRetryAfter(_method(), "Flood control", retry_after=42)],
+            2: [TelegramNetworkError(_method(), "timeout")],
+            3: [TelegramBadRequest(_method(), "chat not found")],
+        }
+        await _enqueue_broadcast([1, 2, 3, 4])
+        started = datetime.utcnow()
+        await _run_worker(bot)
+        rows = await _outbox_rows()
+        await db.engine.dispose()
+        for row in rows.values():
+            if row.next_attempt_at is not None:
+                row.next_attempt_at = round((row.next_attempt_at - started).total_seconds())
+        return rows
+
+    rows = asyncio.run(scenario())
+    assert (rows[1].status, rows[1].attempts, rows[1].next_attempt_at) == ("pending", 1, 42)
+    assert (rows[2].status, rows[2].attempts, rows[2].next_attempt_at) == ("pending", 1, 30)
+    assert rows[3].status == "failed"
+    assert rows[4].status == "sent"
+
+
+def test_retries_stop_after_max_attempts(database, bot):
+    async def scenario() -> OutboxMessage:
+        await database()
+        bot.session.errors = {1: [TelegramNetworkError(_method(), "timeout") for _ in range(3)]}
+        await _enqueue_broadcast([1])
+        for _ in range(3):
+            await _run_worker(bot, seconds=0.1, max_attempts=3)
+            async with db.session_factory() as session:
+                await session.execute(update(OutboxMessage).values(next_attempt_at=None))
+                await session.commit()
+        rows = await _outbox_rows()
+        await db.engine.dispose()
+        return rows[1]
+
+    row = asyncio.run(scenario())
+    assert (row.status, row.attempts) == ("failed", 3)
+    assert bot.session.calls == []
+
+
+def test_purge_removes_only_old_finished_messages(database):
+    async def scenario() -> dict[int, str]:
+        await database()
+        await _enqueue_broadcast([1, 2, 3, 4])
+        old = datetime.utcnow() - timedelta(days=30)
+        async with db.session_factory() as session:
+            for tg_id, status, created_at in [
+                (1, "sent", old),
+                (2, "failed", old),
+                (3, "pending", old),
+                (4, "sent", datetime.utcnow()),
+            ]:
+                await session.execute(
+                    update(OutboxMessage)
+                    .where(OutboxMessage.tg_id == tg_id)
+                    .values(status=status, created_at=created_at)
+                )
+            await session.commit()
+        task = asyncio.create_task(purge_outbox(db.session_factory, retention=86400))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+        rows = await _outbox_rows()
+        await db.engine.dispose()
+        return {tg_id: row.status for tg_id, row in rows.items()}
+
+    assert asyncio.run(scenario()) == {3: "pending", 4: "sent"}
+
+
+def test_blocked_mark_is_cleared_only_after_a_send(database, bot):
+    async def scenario() -> dict[int, datetime | None]:
+        await database()
+        blocked_at = datetime.utcnow() - timedelta(days=30)
+        async with db.session_factory() as session:
+            consumer = User(tg_id=100, role="consumer")
+            session.add(consumer)
+            session.add_all(
+                User(tg_id=tg_id, role="supplier", blocked_at=blocked_at) for tg_id in (1, 2, 3)
+            )
+            await session.flush()
+            opened = SupplyRequest(consumer_id=consumer.id, text="Открыта", status="open")
+            closed = SupplyRequest(consumer_id=consumer.id, text="Закрыта", status="closed")
+            session.add_all([opened, closed])
+            await session.flush()
+            await enqueue_outbox(session, "new_request", [1, 2], {"request_id": opened.id})
+            await enqueue_outbox(session, "new_request", [3], {"request_id": closed.id})
+            await session.commit()
+        gate = ProcessGate()
+        await gate.set_busy(2, "consumer_request", 300)
+        stop = asyncio.Event()
+        task = asyncio.create_task(
+            outbox_worker(bot, gate, db.session_factory, idle_delay=0.01, stop=stop)
+        )
+        await asyncio.sleep(0.3)
+        stop.set()
+        await task
+        await db.get_write_buffer().flush()
+        async with db.session_factory() as session:
+            users = (await session.execute(select(User).where(User.role == "supplier"))).scalars()
+            result = {user.tg_id: user.blocked_at for user in users}
+        await db.engine.dispose()
+        return result
+
+    result = asyncio.run(scenario())
+    assert result[1] is None
+    assert result[2] is not None
+    assert result[3] is not None
+
+
+def test_cancelled_fanout_requeues_undelivered_messages(database, bot):
+    async def scenario() -> dict[int, str]:
+        await database()
+        await _enqueue_broadcast([1, 2, 3, 4, 5, 6])
+        stalled = asyncio.Event()
+
+        async def before_send(method) -> None:
+            if method.chat_id == 3:
+                stalled.set()
+                await asyncio.Event().wait()
+
+        bot.session.before_send = before_send
+        task = asyncio.create_task(
+            outbox_worker(bot, ProcessGate(), db.session_factory, idle_delay=0.01)
+        )
+        await asyncio.wait_for(stalled.wait(), 5)
+        # What SIGTERM does after the shutdown deadline: the worker is cancelled mid-batch.
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+        rows = await _outbox_rows()
+        await db.engine.dispose()
+        return {tg_id: row.status for tg_id, row in rows.items()}
+
+    assert asyncio.run(scenario()) == {
+        1: "sent",
+        2: "sent",
+        3: "pending",
+        4: "pending",
+        5: "pending",
+        6: "pending",
+    }
+    assert [call.chat_id for call in bot.session.calls] == [1, 2]
@@ -0,0 +1,80 @@
+import asyncio
+import os
+import time
+
+import pytest
+from sqlalchemy import func, select, text
+
+from app import db, migrations
+from app.models import OutboxMessage
+from app.services import ProcessGate, enqueue_outbox, outbox_worker
+
+
+FANOUT_SIZE = 2000
+WORKERS = 4
+
+# A disposable Postgres database: the test drops and recreates its public schema.
+POSTGRES_URL = os.getenv("TEST_POSTGRES_URL", "")
+
+
+@pytest.fixture(params=["sqlite", "postgresql"])
+def backend(request, tmp_path):
+    if request.param == "sqlite":
+        url = f"sqlite+aiosqlite:///{tmp_path / 'bot.db'}"
+    elif POSTGRES_URL:
+        url = POSTGRES_URL
+    else:
+        pytest.skip("TEST_POSTGRES_URL is not set")
+
+    async def setup() -> None:
+        db.init_db(url)
+        if db.is_postgres(url):
+            async with db.engine.begin() as conn:
+                await conn.execute(text("DROP SCHEMA public CASCADE"))
+                await conn.execute(text("CREATE SCHEMA public"))
+        await migrations.migrate(db.engine)
+
+    yield request.param, setup
+    db.engine = None
+    db.session_factory = None
+    db.write_buffer = None
+
+
+async def _remaining() -> int:
+    async with db.session_factory() as session:
+        stmt = select(func.count()).where(OutboxMessage.status.in_(("pending", "processing")))
+        return (await session.execute(stmt)).scalar_one()
+
+
+def test_parallel_workers_send_each_message_once(backend, bot):
+    name, setup = backend
+
+    async def scenario() -> float:
+        await setup()
+        async with db.session_factory() as session:
+            await enqueue_outbox(
+                session, "broadcast", list(range(1, FANOUT_SIZE + 1)), {"text": "Привет"}
+            )
+            await session.commit()
+        stop = asyncio.Event()
+        gate = ProcessGate()
+        started = time.perf_counter()
+        workers = [
+            asyncio.create_task(
+                outbox_worker(bot, gate, db.session_factory, idle_delay=0.01, stop=stop)
+            )
+            for _ in range(WORKERS)
+        ]
+        while await _remaining():
+            await asyncio.sleep(0.01)
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await asyncio.gather(*workers)
+        await db.engine.dispose()
+        return elapsed
+
+    elapsed = asyncio.run(scenario())
+    chat_ids = [call.chat_id for call in bot.session.calls]
+    print(f"\n{name}: {FANOUT_SIZE} messages, {WORKERS} workers: {FANOUT_SIZE / elapsed:.0f} msg/s")
+    assert len(chat_ids) == FANOUT_SIZE
+    assert len(set(chat_ids)) == FANOUT_SIZE
@@ -0,0 +1,54 @@
+import pytest
+
+from app.parsing import PRICE_TBD, parse_eta_days, parse_price
+
+
+@pytest.mark.parametrize(
+    ("raw", "expected"),
+    [
+        ("15000", 15000),
+        ("150 000 тг", 150000),
+        ("20к", 20000),
+        ("20 тыс", 20000),
+        ("1,5 млн", 1500000),
+        ("от 5000", 5000),
+        ("до 200к", 200000),
+        ("от 100 до 200 тыс", 200000),
+        ("100-200 тыс", 200000),
+        ("100 – 200 тыс.", 200000),
+        ("100 тыс - 1,2 млн", 1200000),
+        ("5 000 - 7 000 тг", 7000),
+        ("от 10 до 15к за тонну", 15000),
+        ("200 тг за 10 мешков", 200),
+        ("150000тг", 150000),
+        ("3000тенге", 3000),
+        ("150 000тг", 150000),
+        ("150 000₸", 150000),
+        ("12 500 тенге за тонну", 12500),
+        ("от 100 тыс тг до 1,2 млн тг", 1200000),
+        ("от 100 000тг до 120 000тг", 120000),
+        (PRICE_TBD, None),
+        ("договорная", None),
+    ],
+)
+def test_parse_price(raw, expected):
+    assert parse_price(raw) == expected
+
+
+@pytest.mark.parametrize(
+    ("raw", "expected"),
+    [
+        ("3 дня", 3),
+        ("3-5 дней", 5),
+        ("2 недели", 14),
+        ("36 часов", 2),
+        ("5 часов", 1),
+        ("30 минут", 1),
+        ("90 мин", 1),
+        ("завтра", 1),
+        ("послезавтра", 2),
+        ("по договоренности", None),
+    ],
+)
+def test_parse_eta_days(raw, expected):
+    assert parse_eta_days(raw) == expected
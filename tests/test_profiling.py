@@ -0,0 +1,34 @@
+import asyncio
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.profiling import install_db_hooks
+
+
+def test_failed_statement_does_not_leak_start_time():
+    async def scenario() -> list:
+        engine = create_async_engine("sqlite+aiosqlite://")
+        install_db_hooks(engine)
+        async with engine.connect() as conn:
+            with pytest.raises(OperationalError):
+                await conn.execute(text("SELECT * FROM missing_table"))
+            await conn.execute(text("SELECT 1"))
+            stack = (await conn.get_raw_connection()).info["profiling_started"]
+        await engine.dispose()
+        return stack
+
+    assert asyncio.run(scenario()) == []
+
+
+def test_tracing_does_not_load_profiling():
+    code = "import sys, app.main, app.tracing; print('app.profiling' in sys.modules)"
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True, cwd=Path(__file__).parents[1]
+    )
+    assert result.stdout.strip() == "False"
@@ -0,0 +1,57 @@
+import asyncio
+import time
+
+from app.scheduler import Lane, PrioritySendMiddleware, SendScheduler, send_lane
+
+
+RATE = 500.0
+BROADCAST_SIZE = 500
+INTERACTIVE_SENDS = 50
+
+
+def _p99(samples: list[float]) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+
+
+async def _interactive_latencies(bot, interactive_lane: Lane) -> list[float]:
+    async def broadcast(chat_id: int) -> None:
+        with send_lane(Lane.BROADCAST):
+            await bot.send_message(chat_id, "Рассылка")
+
+    broadcast_tasks = [
+        asyncio.create_task(broadcast(chat_id)) for chat_id in range(1000, 1000 + BROADCAST_SIZE)
+    ]
+    await asyncio.sleep(0)
+    latencies = []
+    for _ in range(INTERACTIVE_SENDS):
+        await asyncio.sleep(0.01)
+        started = time.perf_counter()
+        with send_lane(interactive_lane):
+            await bot.send_message(1, "Ваш отклик выбрали!")
+        latencies.append(time.perf_counter() - started)
+    await asyncio.gather(*broadcast_tasks)
+    return latencies
+
+
+def test_interactive_p99_under_broadcast_benchmark(bot):
+    # Interactive replies sent while a broadcast saturates the send budget,
+    # with priority lanes and with everything in one FIFO lane.
+    middleware = PrioritySendMiddleware(SendScheduler(rate=RATE, burst=5))
+    bot.session.middleware(middleware)
+
+    async def scenario(interactive_lane: Lane) -> list[float]:
+        middleware.scheduler = SendScheduler(rate=RATE, burst=5)
+        try:
+            return await _interactive_latencies(bot, interactive_lane)
+        finally:
+            await middleware.scheduler.close()
+
+    prioritized = _p99(asyncio.run(scenario(Lane.INTERACTIVE)))
+    fifo = _p99(asyncio.run(scenario(Lane.BROADCAST)))
+
+    print()
+    print(f"interactive p99 with lanes {prioritized * 1000:7.1f} ms")
+    print(f"interactive p99 FIFO       {fifo * 1000:7.1f} ms")
+    assert prioritized < 0.05
+    assert prioritized * 5 < fifo
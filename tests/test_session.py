@@ -0,0 +1,52 @@
+import asyncio
+import time
+
+from aiogram import Bot
+from aiohttp import web
+
+from app.session import BotSession
+
+
+API_LATENCY = 0.05
+SENDS = 300
+POOL_SIZES = (10, 25, 100)
+
+
+async def _fake_api(request: web.Request) -> web.Response:
+    await asyncio.sleep(API_LATENCY)
+    return web.json_response(
+        {"ok": True, "result": {"message_id": 1, "date": 0, "chat": {"id": 1, "type": "private"}}}
+    )
+
+
+async def _throughput(api_url: str, pool_size: int) -> float:
+    bot = Bot(token="42:TEST", session=BotSession(limit=pool_size, api_url=api_url))
+    try:
+        started = time.perf_counter()
+        await asyncio.gather(*(bot.send_message(chat_id, "Новая заявка") for chat_id in range(SENDS)))
+        return SENDS / (time.perf_counter() - started)
+    finally:
+        await bot.session.close()
+
+
+def test_pool_size_throughput_benchmark():
+    # Send throughput against a local fake Bot API that answers in 50 ms.
+    async def scenario() -> dict[int, float]:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", _fake_api)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = runner.addresses[0][1]
+        try:
+            return {size: await _throughput(f"http://127.0.0.1:{port}", size) for size in POOL_SIZES}
+        finally:
+            await runner.cleanup()
+
+    results = asyncio.run(scenario())
+
+    print()
+    for size, rate in results.items():
+        print(f"pool {size:>3}: {rate:7.1f} msg/s")
+    assert results[POOL_SIZES[-1]] > 2 * results[POOL_SIZES[0]]
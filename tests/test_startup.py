@@ -0,0 +1,92 @@
+import asyncio
+import datetime
+import time
+
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import GetMe, GetUpdates
+from aiogram.types import Chat, Message, Update, User
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app import db, main as app_main, migrations
+from app.lifecycle import ReadinessGate
+
+
+FIRST_UPDATE_BUDGET = 1.0
+
+
+class PollingSession(BaseSession):
+    def __init__(self) -> None:
+        super().__init__()
+        self.delivered = False
+
+    async def make_request(self, bot, method, timeout=None):
+        if isinstance(method, GetMe):
+            return User(id=42, is_bot=True, first_name="Bot", username="bot")
+        if isinstance(method, GetUpdates):
+            if self.delivered:
+                await asyncio.sleep(0.05)
+                return []
+            self.delivered = True
+            message = Message(
+                message_id=1,
+                date=datetime.datetime.now(),
+                chat=Chat(id=1, type="private"),
+                from_user=User(id=1, is_bot=False, first_name="User"),
+                text="/start",
+            )
+            return [Update(update_id=1, message=message)]
+        return True
+
+    async def close(self) -> None:
+        pass
+
+    async def stream_content(self, *args, **kwargs):
+        yield b""
+
+
+class TimedGate(ReadinessGate):
+    opened_at: float | None = None
+    first_update_at: float | None = None
+
+    def open(self) -> None:
+        TimedGate.opened_at = time.perf_counter()
+        super().open()
+
+    async def __call__(self, handler, event, data):
+        async def first_update(event, data):
+            TimedGate.first_update_at = time.perf_counter()
+            await data["dispatcher"].stop_polling()
+
+        return await super().__call__(first_update, event, data)
+
+
+def test_time_to_first_update(tmp_path, monkeypatch):
+    database_url = f"sqlite+aiosqlite:///{tmp_path / 'bot.db'}"
+
+    async def prepare() -> None:
+        engine = create_async_engine(database_url)
+        await migrations.migrate(engine)
+        await engine.dispose()
+
+    asyncio.run(prepare())
+    monkeypatch.setenv("BOT_TOKEN", "42:TEST")
+    monkeypatch.setenv("DATABASE_URL", database_url)
+    monkeypatch.setenv("STATE_PATH", str(tmp_path / "state.json"))
+    monkeypatch.setenv("SHUTDOWN_TIMEOUT", "1")
+    monkeypatch.setattr(app_main, "BotSession", lambda **kwargs: PollingSession())
+    monkeypatch.setattr(app_main, "ReadinessGate", TimedGate)
+
+    TimedGate.opened_at = TimedGate.first_update_at = None
+    started = time.perf_counter()
+    try:
+        asyncio.run(asyncio.wait_for(app_main.main(), 10))
+    finally:
+        db.engine = None
+        db.session_factory = None
+        db.write_buffer = None
+
+    assert TimedGate.opened_at is not None and TimedGate.first_update_at is not None
+    ready = TimedGate.opened_at - started
+    first_update = TimedGate.first_update_at - started
+    print(f"\nschema ready {ready * 1000:.1f} ms, first update {first_update * 1000:.1f} ms")
+    assert first_update < FIRST_UPDATE_BUDGET